@@ -1,198 +1,304 @@
 import os
-from flask import Flask, request, jsonify
+import time
+import threading
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
-from models import Session, Interview, init_db
+from werkzeug.exceptions import RequestEntityTooLarge
+from models import Session, init_db, pool_status
+from persistence import get_writer
 from utils import AudioProcessor
+from clients import get_pool
+from tts_cache import get_tts_cache, prewarm
+from llm_cache import get_reply_cache
+from transcription import get_tracker
+from metrics import span, set_request_id, start_timings, server_timing, render, REGISTRY, REQUESTS, REQUEST_SECONDS
+from conversation import get_session_store, SessionNotFound
+from interview import run_interview, InterviewFailed
+from jobs import get_job_queue, QueueFull
+from history import fetch_page, stream_page, parse_fields, decode_cursor, InvalidQuery
 from config import Config
-import uuid
-import subprocess
-import wave
+from audio import normalize, AudioDecodeError
+from uploads import SpooledRequest, get_janitor
+from readiness import get_warmup
+import resilience
 
 app = Flask(__name__)
-CORS(app)
+# 上传的音频在内存中缓冲后直接解码，不写data/my_voice
+app.request_class = SpooledRequest
+app.config['MAX_CONTENT_LENGTH'] = Config.UPLOAD_MAX_BYTES
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Request-ID', 'Retry-After', 'Location', 'Server-Timing'])
 
-# 确保上传目录存在
-os.makedirs(Config.VOICE_UPLOAD_FOLDER, exist_ok=True)
+@app.before_request
+def start_request():
+    g.request_started = time.perf_counter()
+    g.request_id = set_request_id(request.headers.get('X-Request-ID'))
+    g.timings = start_timings()
+
+@app.after_request
+def finish_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    elapsed = time.perf_counter() - g.request_started
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+    response.headers['X-Request-ID'] = g.request_id
+    # 各阶段耗时，浏览器开发者工具和压测脚本都能直接读取
+    response.headers['Server-Timing'] = server_timing(g.timings, elapsed)
+    return response
+
+UPLOAD_TOO_LARGE = f'Audio file is larger than {Config.UPLOAD_MAX_BYTES // (1024 * 1024)}MB'
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    return jsonify({'error': UPLOAD_TOO_LARGE}), 413
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
-def check_wav_file(file_path):
-    """检查WAV文件是否有效"""
+def normalize_audio(data, filename):
+    """在内存中把上传的音频（bytes或文件对象）规整为16kHz单声道PCM16，解码失败时返回None"""
     try:
-        with wave.open(file_path, 'rb') as wav_file:
-            # 获取音频文件的参数
-            channels = wav_file.getnchannels()
-            sample_width = wav_file.getsampwidth()
-            frame_rate = wav_file.getframerate()
-            frames = wav_file.getnframes()
-            duration = frames / float(frame_rate)
-            
-            print(f"WAV file info: channels={channels}, sample_width={sample_width}, "
-                  f"frame_rate={frame_rate}, frames={frames}, duration={duration:.2f}s")
-            
-            # 检查是否是有效的音频文件
-            return frames > 0 and duration > 0.1  # 至少0.1秒
-    except Exception as e:
-        print(f"Error checking WAV file: {str(e)}")
-        return False
-
-def convert_to_wav(input_path):
-    """将音频文件转换为wav格式"""
-    output_path = os.path.splitext(input_path)[0] + '.wav'
-    try:
-        # 使用ffmpeg转换音频格式，添加更多的音频处理参数
-        subprocess.run([
-            'ffmpeg', '-i', input_path,
-            '-acodec', 'pcm_s16le',  # 16位PCM编码
-            '-ar', '16000',          # 16kHz采样率
-            '-ac', '1',              # 单声道
-            '-af', 'silenceremove=1:0:-50dB',  # 移除静音部分
-            '-af', 'volume=2.0',     # 提高音量
-            '-y',                    # 覆盖已存在的文件
-            output_path
-        ], check=True, capture_output=True)
-
-        # 检查生成的WAV文件是否有效
-        if not check_wav_file(output_path):
-            print("Generated WAV file is invalid")
-            return None
-
-        return output_path
-    except subprocess.CalledProcessError as e:
-        print(f"Error converting audio: {e.stderr.decode()}")
+        audio = normalize(data, filename)
+        print(f"Normalized audio: sample_rate={audio.sample_rate}, "
+              f"samples={len(audio.pcm)}, duration={audio.duration:.2f}s")
+        return audio
+    except AudioDecodeError as e:
+        print(f"Error decoding audio: {str(e)}")
         return None
     except Exception as e:
         print(f"Error converting audio: {str(e)}")
         return None
 
+def summarize_turns(summary, turns):
+    """用大模型把移出上下文窗口的轮次折叠进会话摘要"""
+    return AudioProcessor().summarize(summary, turns)
+
+# 会话缓存在启动时就绑定摘要函数，其他模块不带参数获取
+get_session_store(summarize_turns)
+
+def prepare_interview():
+    """校验请求中的音频并获取会话，返回(会话上下文, 规整后的音频)"""
+    try:
+        files = request.files
+    except RequestEntityTooLarge:
+        raise InterviewFailed(UPLOAD_TOO_LARGE, 413)
+    if 'audio' not in files:
+        print("No audio file in request")
+        raise InterviewFailed('No audio file', 400)
+    
+    file = files['audio']
+    if file.filename == '':
+        print("No selected file")
+        raise InterviewFailed('No selected file', 400)
+    
+    if not file or not allowed_file(file.filename):
+        print(f"Invalid file type: {file.filename}")
+        raise InterviewFailed('Invalid file type', 400)
+
+    # 在内存中解码并规整音频
+    with span('normalize') as current:
+        audio = normalize_audio(file.stream, file.filename)
+        if audio is None:
+            current.fail('decode_error')
+    if audio is None:
+        raise InterviewFailed('Failed to convert audio format', 500)
+
+    # 检查是否是有效的音频（去除静音后至少0.1秒）
+    if not audio.is_valid():
+        print(f"Normalized audio is too short: {audio.duration:.2f}s")
+        raise InterviewFailed('Audio file is too small or empty', 400)
+
+    # 音频有效后才获取面试会话，首轮时新建；无效的请求不会留下空会话
+    try:
+        with span('session'):
+            context = get_session_store().get_or_create(request.form.get('session_id'))
+    except SessionNotFound:
+        raise InterviewFailed('Session not found', 404)
+    return context, audio
+
 @app.route('/api/interview', methods=['POST'])
 def process_interview():
     try:
         print("Processing interview request...")
-        
-        if 'audio' not in request.files:
-            print("No audio file in request")
-            return jsonify({'error': 'No audio file'}), 400
-        
-        file = request.files['audio']
-        if file.filename == '':
-            print("No selected file")
-            return jsonify({'error': 'No selected file'}), 400
-        
-        if not file or not allowed_file(file.filename):
-            print(f"Invalid file type: {file.filename}")
-            return jsonify({'error': 'Invalid file type'}), 400
-
-        # 保存用户音频文件
-        filename = secure_filename(str(uuid.uuid4()) + os.path.splitext(file.filename)[1])
-        local_file_path = os.path.join(Config.VOICE_UPLOAD_FOLDER, filename)
-        print(f"Saving file to: {local_file_path}")
-        file.save(local_file_path)
-        
-        # 转换音频格式为wav
-        wav_file_path = convert_to_wav(local_file_path)
-        if not wav_file_path:
-            return jsonify({'error': 'Failed to convert audio format'}), 500
-            
-        # 检查转换后的文件大小
-        file_size = os.path.getsize(wav_file_path)
-        if file_size < 1024:  # 小于1KB的文件可能是无效的
-            print(f"Converted file is too small: {file_size} bytes")
-            return jsonify({'error': 'Audio file is too small or empty'}), 400
-        
-        processor = AudioProcessor()
-        
-        # 上传到OSS
-        print("Uploading to OSS...")
-        file_url = processor.upload_to_oss(wav_file_path)
-        if not file_url:
-            print("Failed to upload file to OSS")
-            return jsonify({'error': 'Failed to upload file to OSS'}), 500
-        
-        # 语音转文本
-        print("Converting speech to text...")
-        user_text = processor.speech_to_text(file_url)
-        if not user_text:
-            print("Speech to text conversion failed")
-            return jsonify({'error': 'Speech to text failed'}), 500
-        
-        # 获取AI回复
-        print("Getting AI response...")
-        ai_response = processor.chat_with_ai(user_text)
-        if not ai_response:
-            print("Failed to get AI response")
-            return jsonify({'error': 'Failed to get AI response'}), 500
-        
-        # 生成AI语音回复
-        print("Converting AI response to speech...")
-        ai_audio_filename = str(uuid.uuid4()) + '.wav'
-        ai_audio_path = os.path.join(Config.VOICE_UPLOAD_FOLDER, ai_audio_filename)
-        if not processor.text_to_speech(ai_response, ai_audio_path):
-            print("Text to speech conversion failed")
-            return jsonify({'error': 'Text to speech failed'}), 500
-        
-        # 上传AI音频到OSS
-        print("Uploading AI response audio to OSS...")
-        ai_audio_url = processor.upload_to_oss(ai_audio_path)
-        if not ai_audio_url:
-            print("Failed to upload AI audio to OSS")
-            return jsonify({'error': 'Failed to upload AI audio'}), 500
-        
-        # 保存到数据库
-        print("Saving to database...")
-        try:
-            session = Session()
-            interview = Interview(
-                user_audio_path=file_url,
-                user_text=user_text,
-                ai_response_text=ai_response,
-                ai_audio_path=ai_audio_url
-            )
-            session.add(interview)
-            session.commit()
-            session.close()
-        except Exception as e:
-            print(f"Database error: {str(e)}")
-            return jsonify({'error': 'Database error'}), 500
-        
-        # 清理临时文件
-        try:
-            os.remove(local_file_path)
-            os.remove(wav_file_path)
-        except Exception as e:
-            print(f"Error cleaning up temporary files: {str(e)}")
-        
-        print("Interview processing completed successfully")
-        return jsonify({
-            'user_text': user_text,
-            'ai_response': ai_response,
-            'ai_audio_url': ai_audio_url
-        })
-        
+        context, audio = prepare_interview()
+        return jsonify(run_interview(context, audio))
+    except InterviewFailed as e:
+        return jsonify({'error': e.error}), e.status
     except Exception as e:
         print(f"Error processing interview: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/interview/jobs', methods=['POST'])
+def submit_interview_job():
+    """提交一轮面试，立即返回任务ID；排队任务已满时返回429和Retry-After"""
+    queue = get_job_queue()
+    # 先占排队位置，队列已满时不读取和解码上传的音频，也不创建会话
+    try:
+        queue.reserve()
+    except QueueFull as e:
+        response = jsonify({'error': 'Too many pending interviews, please retry later',
+                            'retry_after': e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    try:
+        context, audio = prepare_interview()
+        job = queue.submit(run_interview, context, audio, cancellable=True, reserved=True)
+    except InterviewFailed as e:
+        queue.release()
+        return jsonify({'error': e.error}), e.status
+    except Exception as e:
+        queue.release()
+        print(f"Error submitting interview job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    response = jsonify(job.to_dict(queue.position(job)))
+    response.headers['Location'] = f"/api/interview/jobs/{job.id}"
+    return response, 202
+
+@app.route('/api/interview/jobs/<job_id>', methods=['GET'])
+def get_interview_job(job_id):
+    """查询任务状态；完成后包含与/api/interview相同的结果，wait=N时最多等待N秒"""
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    wait = min(request.args.get('wait', 0, type=float) or 0, Config.JOB_MAX_WAIT)
+    if wait > 0:
+        job.done.wait(wait)
+    position = queue.position(job) if job.status == job.QUEUED else None
+    return jsonify(job.to_dict(position))
+
+@app.route('/api/interview/jobs/<job_id>', methods=['DELETE'])
+def cancel_interview_job(job_id):
+    """取消排队中或处理中的任务（如用户离开页面），处理中的任务会尽快停止"""
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 202
+
 @app.route('/api/history', methods=['GET'])
 def get_history():
+    """分页获取面试历史
+
+    参数：limit 每页条数；cursor 上一页响应头X-Next-Cursor的值；
+    fields 需要的字段（逗号分隔，列表页可省略大文本字段）；stream=1 流式输出JSON数组
+    """
     try:
+        limit = request.args.get('limit', Config.HISTORY_PAGE_SIZE, type=int)
+        cursor = request.args.get('cursor')
+        fields = parse_fields(request.args.get('fields'))
+        stream = request.args.get('stream') in ('1', 'true')
+        max_limit = Config.HISTORY_STREAM_MAX_LIMIT if stream else Config.HISTORY_MAX_PAGE_SIZE
+        if limit is None or not 0 < limit <= max_limit:
+            return jsonify({'error': f'limit must be between 1 and {max_limit}'}), 400
+        if cursor:
+            decode_cursor(cursor)
+
+        if stream:
+            def generate():
+                session = Session()
+                try:
+                    yield from stream_page(session, limit, cursor, fields)
+                finally:
+                    session.close()
+            return Response(stream_with_context(generate()), mimetype='application/json')
+
         session = Session()
-        interviews = session.query(Interview).order_by(Interview.created_at.desc()).all()
-        result = [{
-            'id': interview.id,
-            'user_text': interview.user_text,
-            'ai_response': interview.ai_response_text,
-            'ai_audio_url': interview.ai_audio_path,
-            'created_at': interview.created_at.isoformat()
-        } for interview in interviews]
-        session.close()
-        return jsonify(result)
+        try:
+            with span('history_query'):
+                result, next_cursor = fetch_page(session, limit, cursor, fields)
+        finally:
+            session.close()
+        response = jsonify(result)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error getting history: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-if __name__ == '__main__':
+@app.route('/api/pool', methods=['GET'])
+def get_pool_stats():
+    """客户端连接池统计，带check=1时同时做健康检查"""
+    try:
+        pool = get_pool()
+        result = pool.snapshot()
+        if request.args.get('check'):
+            result['health'] = pool.check_health()
+        return jsonify(result)
+    except Exception as e:
+        print(f"Error getting pool stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/tts-cache', methods=['GET'])
+def get_tts_cache_stats():
+    """语音合成缓存的命中率和容量统计"""
+    try:
+        return jsonify(get_tts_cache().snapshot())
+    except Exception as e:
+        print(f"Error getting TTS cache stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def collect_component_stats():
+    """把各模块已有的统计（缓存、识别任务、连接池、会话）导出为指标"""
+    sources = (
+        ('tts_cache', get_tts_cache().snapshot()),
+        ('llm_cache', get_reply_cache().snapshot()),
+        ('asr_tracker', dict(get_tracker().stats, pending=get_tracker().pending())),
+        ('client_pool', get_pool().snapshot()),
+        ('session_store', get_session_store().snapshot()),
+        ('job_queue', get_job_queue().snapshot()),
+        ('janitor', get_janitor().snapshot()),
+        ('db_writer', get_writer().snapshot()),
+        ('db_pool', pool_status()),
+        ('dependency', resilience.snapshot()),
+        ('warmup', get_warmup().stats),
+    )
+    gauges = []
+    for prefix, stats in sources:
+        for key, value in stats.items():
+            if key != 'timestamp' and isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges.append((f"{prefix}_{key}", f"{prefix} {key}", 'gauge', value))
+    return gauges
+
+REGISTRY.add_collector(collect_component_stats)
+
+@app.route('/api/llm-cache', methods=['GET'])
+def get_llm_cache_stats():
+    """对话回复缓存的命中率和节省的模型调用时间"""
+    try:
+        return jsonify(get_reply_cache().snapshot())
+    except Exception as e:
+        print(f"Error getting LLM cache stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ready', methods=['GET'])
+def readiness():
+    """就绪检查：第一次调用时在后台预热数据库连接和外部客户端，全部就绪前返回503"""
+    warmup = get_warmup()
+    warmup.start()
+    result = warmup.snapshot()
+    return jsonify(result), 200 if result['ready'] else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus格式的指标"""
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+def startup():
+    """建表、启动后台预热和清理线程；开发服务器和wsgi.py启动时各调用一次"""
     init_db()
-    app.run(debug=True) 
\ No newline at end of file
+    get_warmup().start()
+    if Config.JANITOR_ENABLED:
+        get_janitor().start()
+    if Config.TTS_CACHE_ENABLED:
+        # 后台预热常用语句，不阻塞启动
+        threading.Thread(target=prewarm, args=(AudioProcessor(),), daemon=True).start()
+
+if __name__ == '__main__':
+    # 开发服务器；生产环境使用wsgi.py
+    # debug模式下reloader会先启动一个只负责监视文件的父进程，启动任务只在实际服务请求的子进程中执行
+    if not Config.DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        startup()
+    app.run(debug=Config.DEBUG)
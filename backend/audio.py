@@ -0,0 +1,142 @@
+"""进程内音频规整：解码、重采样为16kHz单声道PCM16、增益、语音活动检测去除静音、时长校验
+
+全部在内存中用NumPy向量化处理；soundfile无法解码的格式（如webm/opus）
+才通过管道调用ffmpeg解码，不落盘。
+"""
+import io
+import os
+import wave
+import subprocess
+import numpy as np
+import soundfile as sf
+import vad
+from config import Config
+
+# 这些格式soundfile(libsndfile)无法解码，直接交给ffmpeg
+FFMPEG_ONLY_EXTENSIONS = {'webm'}
+# 降采样前低通滤波器的阶数
+LOWPASS_TAPS = 63
+
+
+class AudioDecodeError(Exception):
+    """音频无法解码"""
+
+
+class NormalizedAudio:
+    """规整后的音频：16位单声道PCM"""
+
+    def __init__(self, pcm, sample_rate):
+        self.pcm = pcm  # int16数组
+        self.sample_rate = sample_rate
+
+    @property
+    def duration(self):
+        return len(self.pcm) / float(self.sample_rate)
+
+    def is_valid(self, min_duration=Config.AUDIO_MIN_DURATION):
+        """检查是否是有效的音频（至少min_duration秒）"""
+        return len(self.pcm) > 0 and self.duration > min_duration
+
+    def chunks(self, max_seconds=Config.VAD_SPLIT_SECONDS):
+        """在停顿处切分为不超过max_seconds的片段（int16数组列表），短音频返回自身"""
+        if self.duration <= max_seconds:
+            return [self.pcm]
+        samples = self.pcm.astype(np.float32) / 32768
+        return vad.split(self.pcm, vad.detect(samples, self.sample_rate), max_seconds)
+
+    def to_wav_bytes(self):
+        """编码为WAV文件内容"""
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(self.pcm.tobytes())
+        return buffer.getvalue()
+
+
+def _decode_with_soundfile(data):
+    source = data if hasattr(data, 'read') else io.BytesIO(data)
+    samples, sample_rate = sf.read(source, dtype='float32', always_2d=True)
+    return samples, sample_rate
+
+
+def _decode_with_ffmpeg(data, sample_rate):
+    """通过stdin/stdout管道用ffmpeg解码为单声道float32"""
+    try:
+        result = subprocess.run([
+            'ffmpeg', '-loglevel', 'error',
+            '-i', 'pipe:0',
+            '-f', 'f32le',           # 32位浮点裸数据
+            '-ac', '1',              # 单声道
+            '-ar', str(sample_rate),
+            'pipe:1'
+        ], input=data.read() if hasattr(data, 'read') else data, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(e.stderr.decode(errors='replace')) from e
+    except OSError as e:
+        raise AudioDecodeError(f"ffmpeg not available: {str(e)}") from e
+    samples = np.frombuffer(result.stdout, dtype=np.float32)
+    return samples.reshape(-1, 1), sample_rate
+
+
+def decode(data, filename='', sample_rate=Config.AUDIO_SAMPLE_RATE):
+    """把音频文件内容（bytes或可seek的二进制文件对象）解码为(samples[帧, 声道] float32, 采样率)"""
+    extension = os.path.splitext(filename)[1].lstrip('.').lower()
+    if extension not in FFMPEG_ONLY_EXTENSIONS:
+        try:
+            return _decode_with_soundfile(data)
+        except RuntimeError as e:
+            print(f"soundfile cannot decode {filename or 'audio'}, falling back to ffmpeg: {str(e)}")
+            if hasattr(data, 'seek'):
+                data.seek(0)
+    return _decode_with_ffmpeg(data, sample_rate)
+
+
+def to_mono(samples):
+    return samples.mean(axis=1) if samples.ndim == 2 else samples
+
+
+def lowpass(samples, cutoff, taps=LOWPASS_TAPS):
+    """加窗sinc低通滤波，cutoff为截止频率与采样率之比（0~0.5）"""
+    n = np.arange(taps) - (taps - 1) / 2.0
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    kernel /= kernel.sum()
+    return np.convolve(samples, kernel.astype(np.float32), mode='same')
+
+
+def resample(samples, source_rate, target_rate):
+    """重采样；整数倍降采样时先做均值滤波再抽取，其余情况线性插值
+
+    非整数倍降采样（如44.1kHz、48kHz的webm转16kHz）插值前先低通滤波到目标采样率的奈奎斯特频率以下，
+    否则8kHz以上的成分会混叠到识别和VAD使用的频段
+    """
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    if source_rate % target_rate == 0:
+        factor = source_rate // target_rate
+        usable = len(samples) - len(samples) % factor
+        return samples[:usable].reshape(-1, factor).mean(axis=1)
+    if target_rate < source_rate:
+        # 留出过渡带，截止频率取目标奈奎斯特频率的90%
+        samples = lowpass(samples, 0.45 * target_rate / float(source_rate))
+    count = int(round(len(samples) * target_rate / float(source_rate)))
+    positions = np.arange(count) * (source_rate / float(target_rate))
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def to_pcm16(samples, gain=1.0):
+    """放大并裁剪到[-1, 1]后转为int16"""
+    scaled = np.clip(samples * gain, -1.0, 1.0)
+    return (scaled * 32767).astype(np.int16)
+
+
+def normalize(data, filename='', sample_rate=Config.AUDIO_SAMPLE_RATE, gain=Config.AUDIO_GAIN):
+    """解码并规整为16kHz单声道PCM16，去除首尾静音、压缩过长的停顿并提高音量
+
+    没有检测到语音时返回空音频（is_valid()为False），调用方据此在上传和识别前拒绝
+    """
+    samples, source_rate = decode(data, filename, sample_rate)
+    mono = resample(to_mono(samples), source_rate, sample_rate)
+    speech = vad.detect(mono, sample_rate)
+    return NormalizedAudio(to_pcm16(vad.compact(mono, speech), gain), sample_rate)
@@ -0,0 +1,237 @@
+"""批量录音文件识别：归档录音重新识别、回填面试记录的user_text
+
+录音按files_per_job个一组提交为一个paraformer任务（file_urls为列表），最多max_jobs个任务同时进行，
+由共享的跟踪器轮询状态；每个任务完成后保留完整的逐句结果和时间戳，整组一次写入数据库。
+写库成功后把完成的录音追加到检查点文件，中断后再次运行会跳过已完成的录音。
+
+在backend目录下运行：
+    python batch.py                     识别data/my_voice中的全部录音
+    python batch.py a.wav b.webm ...    识别指定文件
+    python batch.py --backfill          为user_text为空的面试记录重新识别
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import threading
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from models import Session, Interview, Transcript, init_db
+from transcription import get_tracker, parse_transcription, submit_transcription, fetch_url, TranscriptionFailed
+from clients import get_pool
+from storage import create_storage, new_object_name
+from resilience import get_policy
+from config import Config
+
+AUDIO_EXTENSIONS = ('.wav', '.webm', '.mp3', '.m4a', '.ogg', '.opus', '.flac', '.aac')
+
+
+class BatchItem:
+    """一个待识别的录音：本地文件需先上传，已有对象URL的直接提交"""
+
+    def __init__(self, source, path=None, file_url=None, interview_id=None):
+        self.source = source
+        self.path = path
+        self.file_url = file_url
+        self.interview_id = interview_id
+
+
+class Checkpoint:
+    """已完成录音的记录，每行一个JSON：{"source": ...}"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)['source'])
+                    except (ValueError, KeyError):
+                        # 中断时可能写了半行
+                        continue
+
+    def add(self, sources):
+        self.done.update(sources)
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for source in sources:
+                f.write(json.dumps({'source': source}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def local_items(paths):
+    items = []
+    for path in paths:
+        if os.path.isdir(path):
+            items.extend(local_items(sorted(glob.glob(os.path.join(path, '*')))))
+        elif path.lower().endswith(AUDIO_EXTENSIONS):
+            path = os.path.abspath(path)
+            items.append(BatchItem(path, path=path))
+    return items
+
+
+def backfill_items(session):
+    """user_text为空、有用户音频地址的面试记录"""
+    rows = session.query(Interview.id, Interview.user_audio_path).filter(
+        Interview.user_audio_path.isnot(None),
+        (Interview.user_text.is_(None)) | (Interview.user_text == '')
+    ).order_by(Interview.id).all()
+    return [BatchItem(url, file_url=url, interview_id=interview_id) for interview_id, url in rows]
+
+
+class BatchTranscriber:
+    def __init__(self, tracker=None, storage=None, http=None,
+                 files_per_job=Config.BATCH_FILES_PER_JOB,
+                 max_jobs=Config.BATCH_MAX_JOBS,
+                 job_timeout=Config.BATCH_JOB_TIMEOUT,
+                 checkpoint=Config.BATCH_CHECKPOINT):
+        self.tracker = tracker or get_tracker()
+        if storage is None or http is None:
+            clients = get_pool()
+            storage = storage or create_storage(clients)
+            http = http or clients.http
+        self.storage = storage
+        self.http = http
+        self.files_per_job = files_per_job
+        self.max_jobs = max_jobs
+        self.job_timeout = job_timeout
+        self.checkpoint = Checkpoint(checkpoint)
+        self._db_lock = threading.Lock()
+        self.stats = {'files': 0, 'skipped': 0, 'succeeded': 0, 'failed': 0, 'jobs': 0, 'seconds': 0.0}
+
+    def _transcribe_group(self, items):
+        """上传、提交一个多文件任务并等待，返回{file_url: (全文, 句子列表)}，失败的录音不在其中"""
+        for item in items:
+            if item.file_url is None:
+                item.file_url = self.storage.put_file(
+                    new_object_name(os.path.splitext(item.path)[1]), item.path)
+        response = get_policy('asr').call(
+            submit_transcription, self.tracker.client,
+            model='paraformer-v2',
+            file_urls=[item.file_url for item in items],
+            language_hints=['zh', 'en']
+        )
+        if response.status_code != HTTPStatus.OK or response.output is None:
+            raise TranscriptionFailed(f"Batch submit failed: Status {response.status_code}")
+        output = self.tracker.track(response.output['task_id'], timeout=self.job_timeout).result()
+
+        results = {}
+        for result in output.get('results') or []:
+            if result.get('subtask_status') != 'SUCCEEDED' or not result.get('transcription_url'):
+                print(f"Transcription failed for {result.get('file_url')}: {result.get('subtask_status')}")
+                continue
+            try:
+                response = get_policy('asr').call(fetch_url, self.http, result['transcription_url'])
+            except Exception as e:
+                print(f"Failed to fetch transcription for {result.get('file_url')}: {str(e)}")
+                continue
+            if response.status_code != 200:
+                print(f"Failed to fetch transcription for {result.get('file_url')}: "
+                      f"Status {response.status_code}")
+                continue
+            results[result['file_url']] = parse_transcription(response.json())
+        return results
+
+    def _save(self, items, results):
+        """一组结果一次写入：插入Transcript，回填Interview.user_text"""
+        transcripts = []
+        updates = []
+        for item in items:
+            if item.file_url not in results:
+                continue
+            text, sentences = results[item.file_url]
+            transcripts.append({
+                'source': item.source,
+                'file_url': item.file_url,
+                'text': text,
+                'sentences': json.dumps(sentences, ensure_ascii=False),
+                'interview_id': item.interview_id,
+            })
+            if item.interview_id is not None and text:
+                updates.append({'id': item.interview_id, 'user_text': text})
+        if not transcripts:
+            return []
+        with self._db_lock:
+            session = Session()
+            try:
+                session.bulk_insert_mappings(Transcript, transcripts)
+                if updates:
+                    session.bulk_update_mappings(Interview, updates)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+            # 写库成功后才记入检查点，中断时最多重复识别一组
+            self.checkpoint.add([row['source'] for row in transcripts])
+        return transcripts
+
+    def _run_group(self, items):
+        try:
+            return items, self._save(items, self._transcribe_group(items))
+        except Exception as e:
+            print(f"Error in batch job ({len(items)} files): {str(e)}")
+            return items, []
+
+    def run(self, items):
+        """识别全部录音（跳过检查点中已完成的），返回统计"""
+        start = time.monotonic()
+        pending = [item for item in items if item.source not in self.checkpoint.done]
+        self.stats['files'] += len(items)
+        self.stats['skipped'] += len(items) - len(pending)
+        groups = [pending[i:i + self.files_per_job] for i in range(0, len(pending), self.files_per_job)]
+        with ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix='batch') as pool:
+            futures = [pool.submit(self._run_group, group) for group in groups]
+            for future in as_completed(futures):
+                group, saved = future.result()
+                self.stats['jobs'] += 1
+                self.stats['succeeded'] += len(saved)
+                self.stats['failed'] += len(group) - len(saved)
+                done = self.stats['succeeded'] + self.stats['failed']
+                print(f"Batch progress: {done}/{len(pending)} files, "
+                      f"{done / (time.monotonic() - start):.2f} files/s")
+        self.stats['seconds'] += time.monotonic() - start
+        return self.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量录音文件识别')
+    parser.add_argument('paths', nargs='*', help='录音文件或目录，默认为data/my_voice')
+    parser.add_argument('--backfill', action='store_true', help='为user_text为空的面试记录重新识别')
+    parser.add_argument('--files-per-job', type=int, default=Config.BATCH_FILES_PER_JOB)
+    parser.add_argument('--jobs', type=int, default=Config.BATCH_MAX_JOBS, help='同时进行的识别任务数')
+    parser.add_argument('--checkpoint', default=Config.BATCH_CHECKPOINT)
+    parser.add_argument('--restart', action='store_true', help='忽略检查点，全部重新识别')
+    args = parser.parse_args(argv)
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    init_db()
+    if args.backfill:
+        session = Session()
+        try:
+            items = backfill_items(session)
+        finally:
+            session.close()
+    else:
+        items = local_items(args.paths or [Config.VOICE_UPLOAD_FOLDER])
+
+    transcriber = BatchTranscriber(files_per_job=args.files_per_job, max_jobs=args.jobs,
+                                   checkpoint=args.checkpoint)
+    stats = transcriber.run(items)
+    processed = stats['succeeded'] + stats['failed']
+    print(f"Done: {stats['succeeded']} succeeded, {stats['failed']} failed, "
+          f"{stats['skipped']} skipped (checkpoint), {stats['jobs']} jobs, "
+          f"{processed / stats['seconds'] if stats['seconds'] else 0:.2f} files/s")
+    return 0 if stats['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""对比进程内音频规整与原来每次调用ffmpeg子进程写文件的耗时
+
+使用data/my_voice中的样例录音。没有安装ffmpeg时只测进程内规整。
+在backend目录下运行：python -m benchmarks.audio
+"""
+import os
+import glob
+import time
+import shutil
+import tempfile
+import subprocess
+from audio import normalize
+from config import Config
+
+
+def ffmpeg_convert(input_path, output_path):
+    """原convert_to_wav的做法"""
+    subprocess.run([
+        'ffmpeg', '-i', input_path,
+        '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1',
+        '-af', 'volume=2.0', '-y', output_path
+    ], check=True, capture_output=True)
+
+
+def main():
+    files = sorted(glob.glob(os.path.join(Config.VOICE_UPLOAD_FOLDER, '*.wav')))
+    samples = [(path, open(path, 'rb').read()) for path in files]
+    if not samples:
+        print(f"No sample recordings found in {Config.VOICE_UPLOAD_FOLDER}")
+        return
+
+    start = time.perf_counter()
+    audio_seconds = 0.0
+    for path, data in samples:
+        audio_seconds += normalize(data, path).duration
+    elapsed = time.perf_counter() - start
+    print(f"in-process: {len(samples)} files, {elapsed / len(samples) * 1000:.2f} ms/file, "
+          f"{audio_seconds / elapsed:.0f}x realtime")
+
+    if shutil.which('ffmpeg') is None:
+        print("ffmpeg not found, skipping subprocess baseline")
+        return
+    tmp = tempfile.mkdtemp()
+    start = time.perf_counter()
+    for i, (path, _) in enumerate(samples):
+        ffmpeg_convert(path, os.path.join(tmp, f'{i}.wav'))
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(tmp)
+    print(f"ffmpeg subprocess: {len(samples)} files, {elapsed / len(samples) * 1000:.2f} ms/file")
+
+
+if __name__ == '__main__':
+    main()
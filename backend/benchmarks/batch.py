@@ -0,0 +1,59 @@
+"""批量识别：每个录音一个任务 vs 多文件任务，以及从检查点续跑
+
+识别任务使用fakes.FakeTranscription（耗时随机，多文件任务每个文件额外增加一点耗时），
+下载结果使用fakes.FakeHTTP，录音上传到本地临时目录，数据库为临时SQLite。
+在backend目录下运行：python -m benchmarks.batch
+"""
+import os
+import glob
+import tempfile
+from sqlalchemy import create_engine
+from config import Config
+from models import Base, Session, Transcript
+from storage import LocalStorage
+from fakes import FakeTranscription, FakeHTTP
+from transcription import TranscriptionTracker
+from batch import BatchTranscriber, local_items
+
+
+def run(label, items, files_per_job, max_jobs, checkpoint=None):
+    tracker = TranscriptionTracker(client=FakeTranscription(min_duration=0.5, max_duration=1.5,
+                                                            seconds_per_file=0.02))
+    transcriber = BatchTranscriber(tracker=tracker, storage=LocalStorage(tempfile.mkdtemp()),
+                                   http=FakeHTTP(), files_per_job=files_per_job, max_jobs=max_jobs,
+                                   checkpoint=checkpoint)
+    stats = transcriber.run(items)
+    tracker.shutdown()
+    processed = stats['succeeded'] + stats['failed']
+    print(f"{label:>28}: {processed:>4} files in {stats['seconds']:6.2f} s, "
+          f"{processed / stats['seconds'] if stats['seconds'] else 0:7.2f} files/s, "
+          f"{stats['jobs']} jobs, {stats['skipped']} skipped")
+
+
+def main():
+    engine = create_engine(f'sqlite:///{tempfile.mkdtemp()}/batch.db')
+    Base.metadata.create_all(engine)
+    Session.configure(bind=engine)
+    items = local_items(sorted(glob.glob(os.path.join(Config.VOICE_UPLOAD_FOLDER, '*'))))
+    if not items:
+        print(f"No sample recordings found in {Config.VOICE_UPLOAD_FOLDER}")
+        return
+
+    # 原做法：逐个调用speech_to_text，只测前20个
+    run('one file per job, serial', items[:20], 1, 1)
+    run('one file per job, 4 at once', items, 1, 4)
+    run('50 files per job, 4 at once', items, 50, 4)
+
+    # 先处理一半后“中断”，再对全部录音续跑
+    session = Session()
+    before = session.query(Transcript).count()
+    checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.jsonl')
+    run('first half', items[:len(items) // 2], 20, 4, checkpoint)
+    run('resume from checkpoint', items, 20, 4, checkpoint)
+    print(f"{'transcripts saved':>28}: {session.query(Transcript).count() - before} "
+          f"for {len(items)} files (each saved once)")
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""对比每个请求重新创建客户端与复用客户端池的开销
+
+1. 构造开销：原AudioProcessor.__init__中创建SpeechSynthesizer、ProviderAuthV4、Bucket
+2. 连接开销：每次requests.get新建连接 vs 共享会话保持长连接
+默认请求本地HTTP服务；传入URL（如OSS上的对象地址）可测真实TLS握手开销。
+在backend目录下运行：python -m benchmarks.clients [URL]
+"""
+import os
+import sys
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+import oss2
+import dashscope
+from oss2.credentials import StaticCredentialsProvider
+from dashscope.audio.tts_v2 import SpeechSynthesizer
+from clients import ClientPool
+from config import Config
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"transcripts": []}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def timed(label, func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    per_call = (time.perf_counter() - start) / rounds * 1000
+    print(f"{label:>40}: {per_call:.3f} ms")
+    return per_call
+
+
+def build_per_request_clients():
+    """原AudioProcessor.__init__的做法"""
+    SpeechSynthesizer(model=Config.TTS_MODEL, voice=Config.TTS_VOICE)
+    auth = oss2.ProviderAuthV4(StaticCredentialsProvider('id', 'secret'))
+    oss2.Bucket(auth, f"https://oss-{Config.OSS_REGION}.aliyuncs.com", Config.OSS_BUCKET,
+                region=Config.OSS_REGION)
+
+
+def main(url=None, rounds=200):
+    os.environ.setdefault('OSS_ACCESS_KEY_ID', 'id')
+    os.environ.setdefault('OSS_ACCESS_KEY_SECRET', 'secret')
+    dashscope.api_key = dashscope.api_key or 'benchmark'
+    server = None
+    if url is None:
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/transcription.json"
+
+    pool = ClientPool()
+    print("client construction")
+    before = timed('per request', build_per_request_clients, rounds)
+    after = timed('pooled', lambda: (pool.bucket, pool.http), rounds)
+    print(f"{'speedup':>40}: {before / after:.0f}x")
+
+    print(f"fetching {url}")
+    before = timed('requests.get (new connection)', lambda: requests.get(url, timeout=10), rounds)
+    after = timed('pooled session (keep-alive)', lambda: pool.http.get(url, timeout=10), rounds)
+    print(f"{'speedup':>40}: {before / after:.1f}x")
+    print(f"pool stats: {pool.snapshot()}")
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,52 @@
+"""多轮面试提示词规模：有界上下文 vs 每轮重发全部历史
+
+在临时SQLite库中模拟一场长面试，摘要使用fakes中的本地实现。
+在backend目录下运行：python -m benchmarks.conversation [轮数]
+"""
+import sys
+import tempfile
+from sqlalchemy import create_engine
+from models import Base, Session, Interview
+from conversation import SessionStore, SYSTEM_PROMPT, estimate_tokens
+from fakes import FakeBackends
+
+USER_TEXT = '我在第{n}个项目里负责支付模块，主要解决了对账延迟和重复扣款的问题，用到了消息队列和幂等设计。'
+AI_TEXT = '好的，关于第{n}个项目，请再具体说说你是怎么保证消息不丢失的？如果下游服务超时你会怎么处理？'
+
+
+def prompt_tokens(messages):
+    return sum(estimate_tokens(message['content']) for message in messages)
+
+
+def main(turns=100):
+    engine = create_engine(f'sqlite:///{tempfile.mkdtemp()}/conversation.db')
+    Base.metadata.create_all(engine)
+    Session.configure(bind=engine)
+
+    # 缓存只放一个会话，另一个会话交替访问，迫使每轮都从数据库重新加载
+    store = SessionStore(summarizer=FakeBackends().summarize, capacity=1)
+    context = store.create()
+    full_history = [{'role': 'system', 'content': SYSTEM_PROMPT}]
+    print(f"{'turn':>6} {'bounded':>10} {'full history':>14}")
+    for n in range(1, turns + 1):
+        user_text, ai_text = USER_TEXT.format(n=n), AI_TEXT.format(n=n)
+        context = store.get(context.session_id)
+        bounded = prompt_tokens(context.build_messages(user_text))
+        full_history.append({'role': 'user', 'content': user_text})
+        if n in (1, 2, 5, 10, 20, 50, turns) or n % 100 == 0:
+            print(f"{n:>6} {bounded:>10} {prompt_tokens(full_history):>14}")
+        full_history.append({'role': 'assistant', 'content': ai_text})
+
+        turn_index = context.next_turn()
+        session = Session()
+        session.add(Interview(user_text=user_text, ai_response_text=ai_text,
+                              session_id=context.session_id, turn_index=turn_index))
+        session.commit()
+        session.close()
+        store.record_turn(context, user_text, ai_text, turn_index)
+        store.create()
+    print(f"store stats: {store.snapshot()}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
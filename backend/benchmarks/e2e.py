@@ -0,0 +1,255 @@
+"""端到端压测：按目标并发回放data/my_voice中的录音，请求/api/interview和/api/history
+
+默认在本进程的线程HTTP服务上启动Flask应用，识别、对话、合成和上传使用fakes中的本地后端，
+各项时延按对数正态分布随机取值（命令行用"中位数:p99"设置，单位秒），数据库为临时SQLite；
+指定--url时直接压测已在运行的服务（此时时延参数不起作用）。
+每个客户端连续进行--turns轮面试（同一会话），每轮之后按--history-ratio的概率查询一页历史。
+各阶段耗时取自响应头Server-Timing，报告各接口和各阶段的p50/p95/p99（毫秒），
+--json把报告写入文件，用于回归对比。
+
+在backend目录下运行：
+    python -m benchmarks.e2e --concurrency 8 --requests 200 --json e2e.json
+"""
+import io
+import os
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from contextlib import redirect_stdout
+import numpy as np
+import requests
+from sqlalchemy import create_engine
+from werkzeug.serving import make_server, WSGIRequestHandler
+from config import Config
+
+Config.STORAGE_BACKEND = 'local'
+Config.LOCAL_STORAGE_DIR = tempfile.mkdtemp()
+# 模拟的回复文本每次相同，合成缓存会跳过上传，关闭后才能测到上传
+Config.TTS_CACHE_ENABLED = False
+Config.METRICS_LOG_EVENTS = False
+
+from models import Base, Session  # noqa: E402
+from audio import normalize  # noqa: E402
+from fakes import FakeBackends, Latency, patch_processor  # noqa: E402
+import app as server_app  # noqa: E402
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def latency(value):
+    """解析命令行的时延：中位数:p99，或只有中位数（固定时延）"""
+    median, _, p99 = value.partition(':')
+    return Latency(float(median), float(p99) if p99 else None)
+
+
+def load_samples(folder, limit=None):
+    """读取能解码且有语音的录音，返回[(文件名, 内容)]"""
+    samples, skipped = [], 0
+    for path in sorted(glob.glob(os.path.join(folder, '*'))):
+        extension = path.rsplit('.', 1)[-1].lower()
+        if extension not in Config.ALLOWED_EXTENSIONS:
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            if not normalize(io.BytesIO(data), path).is_valid():
+                skipped += 1
+                continue
+        except Exception:
+            skipped += 1
+            continue
+        samples.append((os.path.basename(path), data))
+        if limit and len(samples) >= limit:
+            break
+    return samples, skipped
+
+
+def parse_server_timing(header):
+    """解析Server-Timing响应头：asr;dur=312.5, total;dur=900 -> {'asr': 312.5, 'total': 900.0}"""
+    timings = {}
+    for entry in (header or '').split(','):
+        name, _, params = entry.strip().partition(';')
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'dur' and name:
+                timings[name] = float(value)
+    return timings
+
+
+class Recorder:
+    """线程安全地收集每个请求的结果"""
+
+    def __init__(self):
+        self.results = []
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, status, seconds, timings):
+        with self._lock:
+            self.results.append((endpoint, status, seconds, timings))
+
+
+def client(base_url, samples, jobs, turns, history_ratio, recorder, seed):
+    """每个客户端从jobs中领取请求，连续turns轮使用同一会话"""
+    rng = random.Random(seed)
+    http = requests.Session()
+    session_id, turn = None, 0
+    while True:
+        with jobs['lock']:
+            if jobs['remaining'] <= 0:
+                return
+            jobs['remaining'] -= 1
+        name, data = rng.choice(samples)
+        form = {'session_id': session_id} if session_id else {}
+        start = time.perf_counter()
+        try:
+            response = http.post(f"{base_url}/api/interview", data=form,
+                                 files={'audio': (name, io.BytesIO(data))})
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 0
+        elapsed = time.perf_counter() - start
+        timings = parse_server_timing(response.headers.get('Server-Timing')) if response is not None else {}
+        recorder.add('/api/interview', status, elapsed, timings)
+
+        turn += 1
+        if status == 200 and turn < turns:
+            session_id = response.json().get('session_id')
+        else:
+            session_id, turn = None, 0
+
+        if rng.random() < history_ratio:
+            start = time.perf_counter()
+            try:
+                response = http.get(f"{base_url}/api/history", params={'limit': 20})
+                status = response.status_code
+                timings = parse_server_timing(response.headers.get('Server-Timing'))
+            except requests.RequestException:
+                status, timings = 0, {}
+            recorder.add('/api/history', status, time.perf_counter() - start, timings)
+
+
+def distribution(values):
+    """毫秒的p50/p95/p99"""
+    if not values:
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'count': len(values), 'mean': round(float(np.mean(values)), 1), 'p50': round(float(p50), 1),
+            'p95': round(float(p95), 1), 'p99': round(float(p99), 1), 'max': round(float(max(values)), 1)}
+
+
+def build_report(recorder, elapsed, settings):
+    endpoints, stages = {}, {}
+    for endpoint, status, seconds, timings in recorder.results:
+        entry = endpoints.setdefault(endpoint, {'latencies': [], 'status': {}})
+        entry['status'][str(status)] = entry['status'].get(str(status), 0) + 1
+        if status == 200:
+            entry['latencies'].append(seconds * 1000)
+            for stage, ms in timings.items():
+                if stage != 'total':
+                    stages.setdefault(f"{endpoint} {stage}", []).append(ms)
+    report = {
+        'settings': settings,
+        'duration_s': round(elapsed, 2),
+        'requests': len(recorder.results),
+        'throughput_rps': round(len(recorder.results) / elapsed, 2) if elapsed else 0.0,
+        'endpoints': {},
+        'stages': {name: distribution(values) for name, values in sorted(stages.items())},
+    }
+    for endpoint, entry in endpoints.items():
+        ok = entry['status'].get('200', 0)
+        total = sum(entry['status'].values())
+        report['endpoints'][endpoint] = dict(distribution(entry['latencies']), status=entry['status'],
+                                             error_rate=round(1 - ok / total, 4) if total else 0.0)
+    return report
+
+
+def print_report(report):
+    print(f"{report['requests']} requests in {report['duration_s']} s, "
+          f"{report['throughput_rps']} requests/s, settings {report['settings']}")
+    print(f"{'':>36} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+    for name, stats in report['endpoints'].items():
+        print(f"{name:>36} {stats['count']:>6} {stats.get('p50', 0):>8.0f} {stats.get('p95', 0):>8.0f} "
+              f"{stats.get('p99', 0):>8.0f}  status {stats['status']}")
+    for name, stats in report['stages'].items():
+        print(f"{name:>36} {stats['count']:>6} {stats['p50']:>8.0f} {stats['p95']:>8.0f} {stats['p99']:>8.0f}")
+
+
+def start_server(args):
+    """启动使用本地后端的应用，返回(服务器, 地址)"""
+    engine = create_engine(f'sqlite:///{tempfile.mkdtemp()}/e2e.db', connect_args={'timeout': 30})
+    Base.metadata.create_all(engine)
+    Session.configure(bind=engine)
+    backends = FakeBackends(asr_final_latency=args.asr, llm_first_token_latency=args.llm,
+                            tts_first_chunk_latency=args.tts, upload_latency=args.upload,
+                            upload_dir=Config.LOCAL_STORAGE_DIR)
+    patch_processor(backends, uploads=True)
+    server = make_server('127.0.0.1', 0, server_app.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='端到端压测/api/interview和/api/history')
+    parser.add_argument('--concurrency', type=int, default=8, help='同时进行的客户端数')
+    parser.add_argument('--requests', type=int, default=200, help='面试请求总数')
+    parser.add_argument('--turns', type=int, default=5, help='每个会话的轮数')
+    parser.add_argument('--history-ratio', type=float, default=0.5, help='每轮之后查询历史的概率')
+    parser.add_argument('--samples', default=Config.VOICE_UPLOAD_FOLDER, help='录音目录')
+    parser.add_argument('--max-samples', type=int, default=40, help='最多使用的录音数')
+    parser.add_argument('--url', help='压测已在运行的服务，不启动本地后端')
+    parser.add_argument('--asr', type=latency, default='0.3:1.0', help='识别时延 中位数:p99（秒）')
+    parser.add_argument('--llm', type=latency, default='0.5:2.0', help='模型首个token时延')
+    parser.add_argument('--tts', type=latency, default='0.2:0.8', help='合成首包时延')
+    parser.add_argument('--upload', type=latency, default='0.05:0.5', help='OSS上传时延')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='把报告写入该文件')
+    args = parser.parse_args(argv)
+
+    samples, skipped = load_samples(args.samples, args.max_samples)
+    if not samples:
+        print(f"No usable recordings in {args.samples}")
+        return 1
+    print(f"Replaying {len(samples)} recordings ({skipped} skipped: undecodable or silent)")
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server, base_url = start_server(args)
+    settings = {key: (repr(value) if isinstance(value, Latency) else value)
+                for key, value in vars(args).items() if key not in ('json', 'samples')}
+
+    recorder = Recorder()
+    jobs = {'remaining': args.requests, 'lock': threading.Lock()}
+    threads = [threading.Thread(target=client, args=(base_url, samples, jobs, args.turns, args.history_ratio,
+                                                     recorder, args.seed + i))
+               for i in range(args.concurrency)]
+    start = time.perf_counter()
+    # 服务端各环节的print不输出到报告中
+    with redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+    if server is not None:
+        server.shutdown()
+
+    report = build_report(recorder, elapsed, settings)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report written to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
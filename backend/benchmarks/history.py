@@ -0,0 +1,90 @@
+"""/api/history查询基准：原全表加载 vs 游标分页、字段投影、流式输出
+
+在临时SQLite库中写入指定行数（默认一百万）的面试记录。
+在backend目录下运行：python -m benchmarks.history [行数]
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Interview
+from history import fetch_page, stream_page, encode_cursor
+
+USER_TEXT = '我在上一家公司主要负责订单系统的后端开发，' * 8
+AI_TEXT = '很好，请详细说说你是如何设计订单状态机的，以及遇到过哪些并发问题？' * 6
+
+
+def seed(engine, rows, batch=50000):
+    start = datetime(2024, 1, 1)
+    table = Interview.__table__
+    with engine.begin() as conn:
+        for offset in range(0, rows, batch):
+            conn.execute(table.insert(), [{
+                'user_audio_path': f'https://example.com/{i}.wav',
+                'user_text': USER_TEXT,
+                'ai_response_text': AI_TEXT,
+                'ai_audio_path': f'https://example.com/{i}_ai.wav',
+                'created_at': start + timedelta(seconds=i * 7),
+            } for i in range(offset, min(rows, offset + batch))])
+
+
+def measure(label, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:>45}: {elapsed * 1000:10.1f} ms  peak {peak / 1024 / 1024:8.1f} MB")
+    return result
+
+
+def main(rows=1000000):
+    path = os.path.join(tempfile.mkdtemp(), 'history.db')
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    start = time.perf_counter()
+    seed(engine, rows)
+    print(f"seeded {rows} rows in {time.perf_counter() - start:.1f}s")
+
+    session = Session()
+
+    def legacy():
+        interviews = session.query(Interview).order_by(Interview.created_at.desc()).all()
+        return [{
+            'id': interview.id,
+            'user_text': interview.user_text,
+            'ai_response': interview.ai_response_text,
+            'ai_audio_url': interview.ai_audio_path,
+            'created_at': interview.created_at.isoformat()
+        } for interview in interviews]
+
+    measure('legacy: load all rows', legacy)
+    session.expunge_all()
+
+    _, cursor = measure('keyset: first page (20)', lambda: fetch_page(session, 20))
+    # 翻到一半的位置，对比OFFSET分页深翻页时游标仍然是一次索引查找
+    middle = session.query(Interview.created_at, Interview.id) \
+        .order_by(Interview.created_at.desc(), Interview.id.desc()).offset(rows // 2).first()
+    deep = encode_cursor(middle.created_at, middle.id)
+    measure('keyset: page at middle (20)', lambda: fetch_page(session, 20, deep))
+    measure('offset: page at middle (20)', lambda: session.query(Interview)
+            .order_by(Interview.created_at.desc(), Interview.id.desc())
+            .offset(rows // 2).limit(20).all())
+    measure('keyset: next page (20)', lambda: fetch_page(session, 20, cursor))
+    measure('projection: 100 rows, id/created_at/audio', lambda: fetch_page(
+        session, 100, fields=['id', 'created_at', 'ai_audio_url']))
+    measure('projection: 100 rows, all fields', lambda: fetch_page(session, 100))
+    measure('stream: 10000 rows', lambda: sum(len(part) for part in stream_page(session, 10000)))
+    session.close()
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
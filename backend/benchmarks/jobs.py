@@ -0,0 +1,122 @@
+"""异步面试任务接口压测：吞吐量、排队时间和429拒绝情况
+
+Flask应用跑在本地线程HTTP服务上，识别、对话、合成使用fakes中的本地后端，
+存储写本地临时目录，数据库为临时SQLite。
+在backend目录下运行：python -m benchmarks.jobs [并发客户端数] [每个客户端的请求数] [工作线程数] [队列长度]
+"""
+import io
+import os
+import sys
+import time
+import tempfile
+import threading
+import numpy as np
+import requests
+from sqlalchemy import create_engine
+from werkzeug.serving import make_server, WSGIRequestHandler
+from config import Config
+
+Config.STORAGE_BACKEND = 'local'
+Config.LOCAL_STORAGE_DIR = tempfile.mkdtemp()
+Config.TTS_CACHE_ENABLED = False
+Config.METRICS_LOG_EVENTS = False
+
+from models import Base, Session  # noqa: E402
+from audio import NormalizedAudio  # noqa: E402
+from fakes import FakeBackends, patch_processor  # noqa: E402
+import jobs  # noqa: E402
+import app as server_app  # noqa: E402
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def tone_wav(seconds=1.5, sample_rate=16000):
+    """前后各有0.5秒静音的音调，静音段让VAD估计出背景噪声"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    silence = np.zeros(sample_rate // 2, dtype=np.int16)
+    pcm = np.concatenate([silence, (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16), silence])
+    return NormalizedAudio(pcm, sample_rate).to_wav_bytes()
+
+
+def client(base_url, wav, requests_per_client, results):
+    http = requests.Session()
+    for _ in range(requests_per_client):
+        submitted = time.monotonic()
+        rejected = 0
+        while True:
+            response = http.post(f"{base_url}/api/interview/jobs",
+                                 files={'audio': ('answer.wav', io.BytesIO(wav), 'audio/wav')})
+            if response.status_code != 429:
+                break
+            rejected += 1
+            time.sleep(float(response.headers['Retry-After']))
+        if response.status_code != 202:
+            results.append({'ok': False, 'rejected': rejected})
+            continue
+        job_url = base_url + response.headers['Location']
+        while True:
+            job = http.get(job_url, params={'wait': 10}).json()
+            if job['status'] in ('succeeded', 'failed', 'cancelled'):
+                break
+        if job['status'] != 'succeeded':
+            results.append({'ok': False, 'rejected': rejected})
+            continue
+        results.append({
+            'ok': True,
+            'rejected': rejected,
+            'queue_wait': job['started_at'] - job['created_at'],
+            'run': job['finished_at'] - job['started_at'],
+            'end_to_end': time.monotonic() - submitted,
+        })
+
+
+def main(clients=16, requests_per_client=4, workers=Config.JOB_WORKERS, capacity=Config.JOB_QUEUE_SIZE):
+    os.environ.setdefault('OSS_ACCESS_KEY_ID', 'id')
+    os.environ.setdefault('OSS_ACCESS_KEY_SECRET', 'secret')
+    engine = create_engine(f'sqlite:///{tempfile.mkdtemp()}/jobs.db', connect_args={'timeout': 30})
+    Base.metadata.create_all(engine)
+    Session.configure(bind=engine)
+    patch_processor(FakeBackends(upload_dir=Config.LOCAL_STORAGE_DIR))
+    jobs._queue = jobs.JobQueue(workers=workers, capacity=capacity)
+
+    server = make_server('127.0.0.1', 0, server_app.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    wav = tone_wav()
+    results = []
+    start = time.monotonic()
+    threads = [threading.Thread(target=client, args=(base_url, wav, requests_per_client, results))
+               for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    server.shutdown()
+
+    done = [result for result in results if result['ok']]
+    print(f"workers={workers} queue={capacity} "
+          f"clients={clients} requests={len(results)}")
+    print(f"{'succeeded':>16}: {len(done)}/{len(results)}")
+    print(f"{'429 responses':>16}: {sum(result['rejected'] for result in results)}")
+    print(f"{'throughput':>16}: {len(done) / elapsed:.2f} jobs/s")
+    for key in ('queue_wait', 'run', 'end_to_end'):
+        values = [result[key] for result in done]
+        print(f"{key:>16}: p50 {percentile(values, 50) * 1000:.0f} ms, "
+              f"p95 {percentile(values, 95) * 1000:.0f} ms, max {max(values, default=0) * 1000:.0f} ms")
+    print(f"{'queue stats':>16}: {server_app.get_job_queue().snapshot()}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:5]))
@@ -0,0 +1,96 @@
+"""对话回复缓存：按面试记录回放候选人的话，统计命中率和节省的模型调用时间
+
+从interviews表按会话和轮次读出user_text和上一轮的ai_response_text（缓存的上下文），
+依次查询缓存，未命中时把记录中的回复存入缓存，模型调用耗时按固定值计。
+数据库不可用或没有记录时使用合成的面试对话。
+在backend目录下运行：python -m benchmarks.llm_cache [数据库URI]
+"""
+import sys
+import time
+import random
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Interview
+from llm_cache import ReplyCache
+from config import Config
+
+OPENINGS = ['你好', '您好！', '你好。', '面试官好', '可以开始了', '可以开始了吗', '我准备好了']
+REPEATS = ['我没听清', '没听清，能再说一遍吗', '能再说一遍吗', '能不能再说一遍', '不好意思，我没听清楚']
+SKIPS = ['下一题', '下一题吧', '这题不会，下一题', '跳过这题']
+QUESTIONS = ['请先做个自我介绍。', '介绍一下你最近做过的一个项目。', '你在项目中遇到过哪些技术难点？',
+             '说说你对微服务的理解。', '数据库索引是怎么工作的？', '如何排查线上的内存泄漏？',
+             '你为什么想换工作？', '你对我们公司有什么了解？']
+
+
+def load_turns(uri):
+    """返回[(用户的话, 记录中的回复, 上一轮回复)]"""
+    session = sessionmaker(bind=create_engine(uri))()
+    try:
+        rows = session.query(Interview.session_id, Interview.user_text, Interview.ai_response_text) \
+            .filter(Interview.user_text.isnot(None)) \
+            .order_by(Interview.session_id, Interview.turn_index, Interview.id).all()
+    finally:
+        session.close()
+    turns = []
+    previous_session, previous_reply = None, None
+    for session_id, user_text, ai_text in rows:
+        if session_id is None or session_id != previous_session:
+            previous_reply = None
+        turns.append((user_text, ai_text, previous_reply))
+        previous_session, previous_reply = session_id, ai_text
+    return turns
+
+
+def synthetic_turns(sessions=300, seed=0):
+    rng = random.Random(seed)
+    turns = []
+    for _ in range(sessions):
+        question = '你好，欢迎参加今天的面试。' + QUESTIONS[0]
+        turns.append((rng.choice(OPENINGS), question, None))
+        for _ in range(rng.randint(4, 10)):
+            roll = rng.random()
+            if roll < 0.15:
+                user_text, reply = rng.choice(REPEATS), '好的，我再说一遍：' + question
+            elif roll < 0.25:
+                user_text, reply = rng.choice(SKIPS), '好的，我们换一个问题。' + rng.choice(QUESTIONS)
+            else:
+                user_text = f"我之前在一家公司做了{rng.randint(1, 9)}年后端开发，负责过{rng.randint(2, 30)}个服务的重构。"
+                reply = '明白了。' + rng.choice(QUESTIONS)
+            turns.append((user_text, reply, question))
+            question = reply
+    return turns
+
+
+def replay(label, cache, turns, model_latency):
+    start = time.perf_counter()
+    for user_text, ai_text, previous in turns:
+        messages = [{'role': 'assistant', 'content': previous}] if previous else None
+        if cache.get(user_text, messages) is None:
+            cache.put(user_text, ai_text, messages, model_latency)
+    elapsed = time.perf_counter() - start
+    stats = cache.snapshot()
+    calls = len(turns) - stats['exact_hits'] - stats['similar_hits']
+    print(f"{label:>16}: hit rate {stats['hit_rate'] * 100:5.1f}% "
+          f"(exact {stats['exact_hits']}, similar {stats['similar_hits']}, "
+          f"misses {stats['misses']}, bypassed {stats['bypassed']}), "
+          f"{calls} model calls, {stats['saved_seconds']:.0f} s saved, "
+          f"{elapsed / len(turns) * 1e6:.1f} us/lookup")
+
+
+def main(uri=Config.SQLALCHEMY_DATABASE_URI, model_latency=1.5):
+    try:
+        turns = load_turns(uri)
+        source = 'interviews table'
+    except Exception as e:
+        print(f"Could not read interviews ({e.__class__.__name__}), using synthetic dialogues")
+        turns = []
+    if not turns:
+        turns = synthetic_turns()
+        source = 'synthetic dialogues'
+    print(f"{len(turns)} utterances from {source}, model call counted as {model_latency}s")
+    replay('exact only', ReplyCache(similarity=None), turns, model_latency)
+    replay('exact + similar', ReplyCache(similarity=0.85), turns, model_latency)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
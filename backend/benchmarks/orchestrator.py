@@ -0,0 +1,100 @@
+"""面试流程编排：并发执行后的总耗时 vs 各阶段耗时之和，以及取消和超时
+
+识别、对话、合成使用fakes中的本地后端，存储写本地临时目录并模拟上传延迟，
+数据库为临时SQLite并模拟写入延迟。
+在backend目录下运行：python -m benchmarks.orchestrator
+"""
+import time
+import asyncio
+import tempfile
+import threading
+import numpy as np
+from sqlalchemy import create_engine
+from config import Config
+
+Config.TTS_CACHE_ENABLED = False
+Config.METRICS_LOG_EVENTS = False
+# 模拟单条写入的延迟，不经过合并写入
+Config.DB_WRITE_BEHIND = False
+
+from models import Base, Session, Interview  # noqa: E402
+from audio import NormalizedAudio  # noqa: E402
+from storage import LocalStorage  # noqa: E402
+from conversation import get_session_store  # noqa: E402
+from fakes import FakeBackends, patch_processor  # noqa: E402
+from orchestrator import AsyncAudioProcessor  # noqa: E402
+from utils import AudioProcessor  # noqa: E402
+import interview  # noqa: E402
+
+
+class SlowStorage(LocalStorage):
+    def __init__(self, root, latency):
+        super().__init__(root)
+        self.latency = latency
+
+    def put_bytes(self, name, data):
+        time.sleep(self.latency)
+        return super().put_bytes(name, data)
+
+
+def slow_save(latency):
+    save = interview._save_interview
+
+    def wrapper(fields):
+        time.sleep(latency)
+        return save(fields)
+    return wrapper
+
+
+def run(processor, audio, cancelled=None):
+    context = get_session_store().create()
+    return asyncio.run(interview.run_interview_async(context, audio, processor, cancelled))
+
+
+def main(upload_latency=0.8, db_latency=0.3):
+    engine = create_engine(f'sqlite:///{tempfile.mkdtemp()}/orchestrator.db')
+    Base.metadata.create_all(engine)
+    Session.configure(bind=engine)
+    patch_processor(FakeBackends())
+    interview._save_interview = slow_save(db_latency)
+
+    processor = AudioProcessor()
+    processor.tts_cache = None
+    processor.storage = SlowStorage(tempfile.mkdtemp(), upload_latency)
+    processor = AsyncAudioProcessor(processor)
+    t = np.arange(16000 * 2) / 16000
+    audio = NormalizedAudio((np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16), 16000)
+
+    start = time.monotonic()
+    _, timings = run(processor, audio)
+    wall = time.monotonic() - start
+    print(f"{'stage':>16} {'start':>8} {'end':>8}")
+    for name, (begin, end) in sorted(timings.items(), key=lambda item: item[1]):
+        print(f"{name:>16} {begin * 1000:>6.0f}ms {end * 1000:>6.0f}ms")
+    serial = sum(end - begin for begin, end in timings.values())
+    print(f"{'sum of stages':>16}: {serial * 1000:.0f} ms (sequential execution)")
+    print(f"{'wall time':>16}: {wall * 1000:.0f} ms (critical path)")
+
+    # 客户端在生成回复期间取消
+    cancelled = threading.Event()
+    threading.Timer(0.6, cancelled.set).start()
+    start = time.monotonic()
+    try:
+        run(processor, audio, cancelled)
+    except interview.InterviewFailed as e:
+        print(f"{'cancel':>16}: {e.error} ({e.status}) after {(time.monotonic() - start) * 1000:.0f} ms")
+
+    # 回复阶段超时，已写入的记录被回滚
+    Config.STAGE_TIMEOUTS = dict(Config.STAGE_TIMEOUTS, reply=0.5)
+    start = time.monotonic()
+    try:
+        run(processor, audio)
+    except interview.InterviewFailed as e:
+        print(f"{'timeout':>16}: {e.error} ({e.status}) after {(time.monotonic() - start) * 1000:.0f} ms")
+    session = Session()
+    print(f"{'rows saved':>16}: {session.query(Interview).count()} (only the successful turn)")
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""面试记录写入：每条单独提交 vs 后台合并提交（durable/非durable）
+
+多个线程同时写入，模拟并发的面试请求；数据库为临时目录中的SQLite文件（每次提交都要落盘）。
+在backend目录下运行：python -m benchmarks.persistence [并发线程数] [每线程记录数]
+"""
+import sys
+import time
+import tempfile
+import threading
+from sqlalchemy import create_engine
+from models import Base, Session, Interview
+from persistence import InterviewWriter
+
+
+def fields(i):
+    return {
+        'user_audio_path': f'https://example.com/{i}.wav',
+        'user_text': '我有三年的后端开发经验，主要负责订单和支付相关的服务。',
+        'ai_response_text': '好的，请介绍一下你在支付服务中遇到过的一个技术难点。',
+        'ai_audio_path': f'https://example.com/{i}.mp3',
+        'turn_index': 1,
+    }
+
+
+def save_one(data):
+    """原做法：每条记录一个会话、一次提交"""
+    session = Session()
+    try:
+        session.add(Interview(**data))
+        session.commit()
+    finally:
+        session.close()
+
+
+def run(label, write, threads, rows):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        for i in range(rows):
+            start = time.perf_counter()
+            write(fields(offset + i))
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(t * rows,)) for t in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    print(f"{label:>22}: {len(latencies) / elapsed:8.0f} rows/s, "
+          f"p50 {p50:6.2f} ms, p95 {p95:6.2f} ms per write")
+
+
+def main(threads=16, rows=50):
+    engine = create_engine(f'sqlite:///{tempfile.mkdtemp()}/persistence.db',
+                           connect_args={'check_same_thread': False, 'timeout': 30})
+    Base.metadata.create_all(engine)
+    Session.configure(bind=engine)
+    print(f"{threads} threads x {rows} rows")
+
+    run('commit per row', save_one, threads, rows)
+
+    writer = InterviewWriter()
+    run('write-behind, durable', lambda data: writer.add(data, durable=True).result(), threads, rows)
+    print(f"{'':>22}  {writer.stats['rows']} rows in {writer.stats['commits']} commits")
+
+    writer = InterviewWriter()
+    run('write-behind, buffered', lambda data: writer.add(data, durable=False), threads, rows)
+    start = time.perf_counter()
+    writer.flush()
+    print(f"{'':>22}  {writer.stats['rows']} rows in {writer.stats['commits']} commits, "
+          f"final flush {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    session = Session()
+    print(f"{'rows in database':>22}: {session.query(Interview).count()}")
+    session.close()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,54 @@
+"""逐句流水线 vs 完整回复后整段合成：首音频时延和总耗时
+
+AudioProcessor的流式对话和流式合成替换为fakes中的本地实现，
+模拟的首token、逐token、首包和逐字合成延迟可以调整。
+在backend目录下运行：python -m benchmarks.pipeline
+"""
+import time
+from fakes import FakeBackends
+from utils import AudioProcessor
+
+REPLIES = {
+    'short': '好的，请介绍一下你自己。',
+    'medium': '你好张三，欢迎参加今天的面试。请先介绍一下你最近做过的一个项目。'
+              '在这个项目中你主要负责哪些模块？遇到过哪些技术难点？',
+    'long': '谢谢你的介绍。你提到在支付系统中用消息队列解决了对账延迟的问题，这个思路很好。'
+            '我想进一步了解一下细节。首先，你们是如何保证消息不丢失的？'
+            '其次，如果下游服务长时间超时，你会怎么处理积压的消息？'
+            '最后，在重复消费的情况下，你们是怎么做幂等的？请结合具体的实现来说明。',
+}
+
+
+def serial(fake):
+    """原流程：等完整回复，再整段合成"""
+    start = time.monotonic()
+    first = []
+    text = ''.join(fake.stream_reply('你好'))
+    fake.synthesize(text, lambda data: first or first.append(time.monotonic() - start))
+    return first[0], time.monotonic() - start
+
+
+def pipelined(processor):
+    start = time.monotonic()
+    first = []
+    processor.chat_and_speak('你好', on_audio=lambda data: first or first.append(time.monotonic() - start))
+    return first[0], time.monotonic() - start
+
+
+def main():
+    processor = AudioProcessor()
+    processor.tts_cache = None
+    print(f"{'reply':>8} {'chars':>6} {'serial first':>13} {'pipelined first':>16} "
+          f"{'serial total':>13} {'pipelined total':>16}")
+    for name, reply in REPLIES.items():
+        fake = FakeBackends(reply=reply)
+        processor.stream_chat = fake.stream_reply
+        processor.stream_speech = fake.synthesize
+        serial_first, serial_total = serial(fake)
+        first, total = pipelined(processor)
+        print(f"{name:>8} {len(reply):>6} {serial_first * 1000:>11.0f}ms {first * 1000:>14.0f}ms "
+              f"{serial_total * 1000:>11.0f}ms {total * 1000:>14.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
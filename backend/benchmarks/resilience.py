@@ -0,0 +1,116 @@
+"""外部依赖容错：重试、熔断和对冲的效果
+
+用fakes.FaultInjector包装本地的模拟调用，FaultyServer模拟不稳定的识别结果下载服务：
+    重试：20%的调用失败，对比不重试和重试2次的成功率
+    熔断：依赖挂起，对比每次都等到超时和熔断后直接失败的总耗时
+    对冲：10%的合成请求变慢，对比不对冲和对冲的p50/p95/p99时延
+    HTTP：FaultyServer按比例返回503或挂起，对比不重试和带超时重试的成功率
+在backend目录下运行：python -m benchmarks.resilience
+"""
+import io
+import time
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from config import Config
+
+Config.METRICS_LOG_EVENTS = False
+
+from resilience import Policy, CircuitBreaker  # noqa: E402
+from transcription import fetch_url  # noqa: E402
+from fakes import FaultInjector, FaultyServer  # noqa: E402
+
+
+def run(policy_call, func, calls, workers=16):
+    """并发调用，返回(成功数, 每次调用耗时列表, 总耗时)"""
+    def one(_):
+        start = time.perf_counter()
+        try:
+            policy_call(func)
+            ok = True
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    # 不打印每次重试的日志
+    with redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(one, range(calls)))
+    return sum(ok for ok, _ in results), [seconds for _, seconds in results], time.perf_counter() - start
+
+
+def no_breaker():
+    return CircuitBreaker(failures=10 ** 9)
+
+
+def bench_retries(calls=1000):
+    for retries in (0, 2):
+        func = FaultInjector(lambda: time.sleep(0.01), failure_rate=0.2, seed=1)
+        policy = Policy('retry', timeout=1, retries=retries, backoff=0.02, breaker=no_breaker())
+        ok, _, elapsed = run(policy.call, func, calls)
+        print(f"{'retries=' + str(retries):>20}: {ok / calls * 100:5.1f}% succeeded, "
+              f"{func.calls} upstream calls, {elapsed:.2f} s")
+
+
+def bench_breaker(calls=200):
+    for label, breaker in (('no breaker', no_breaker()), ('breaker', CircuitBreaker(failures=5, reset_timeout=30))):
+        func = FaultInjector(lambda: None, slow_rate=1.0, slow_latency=2.0)
+        policy = Policy('hang', timeout=0.25, retries=0, workers=64, breaker=breaker)
+        ok, latencies, elapsed = run(policy.call, func, calls)
+        print(f"{label:>20}: {ok} succeeded, {func.calls} upstream calls, "
+              f"mean {np.mean(latencies) * 1000:6.1f} ms/call, {elapsed:.2f} s total, "
+              f"rejected {policy.stats['rejected']}")
+
+
+def bench_hedging(calls=400):
+    def synthesize():
+        time.sleep(0.15)
+        return b'audio'
+
+    for hedge_delay in (None, 0.3):
+        func = FaultInjector(synthesize, slow_rate=0.1, slow_latency=1.5, seed=2)
+        policy = Policy('tts', timeout=5, retries=0, workers=64, breaker=no_breaker(), hedge_delay=hedge_delay)
+        ok, latencies, _ = run(lambda f: policy.hedged(f), func, calls, workers=8)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        label = 'no hedging' if hedge_delay is None else f'hedge after {hedge_delay}s'
+        print(f"{label:>20}: p50 {p50:6.0f} ms, p95 {p95:6.0f} ms, p99 {p99:6.0f} ms, "
+              f"{func.calls / calls:.2f} upstream calls/request, {policy.stats['hedge_wins']} hedge wins")
+
+
+def bench_http(calls=300):
+    server = FaultyServer(failure_rate=0.15, hang_rate=0.03, hang=5.0, seed=3)
+    http = requests.Session()
+    http.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=64))
+
+    def fetch():
+        response = fetch_url(http, server.url)
+        response.json()
+        return response
+
+    try:
+        for retries in (0, 2):
+            policy = Policy('http', timeout=1, retries=retries, backoff=0.05, workers=64, breaker=no_breaker())
+            before = server.requests
+            ok, latencies, elapsed = run(policy.call, fetch, calls)
+            p99 = np.percentile(latencies, 99) * 1000
+            print(f"{'retries=' + str(retries):>20}: {ok / calls * 100:5.1f}% succeeded, "
+                  f"{server.requests - before} requests, p99 {p99:5.0f} ms, {elapsed:.2f} s, "
+                  f"{policy.stats['timeouts']} timeouts")
+    finally:
+        server.close()
+
+
+def main():
+    print('retries, 20% of calls fail:')
+    bench_retries()
+    print('circuit breaker, dependency hangs (0.25 s timeout):')
+    bench_breaker()
+    print('hedged synthesis, 10% of calls take 1.5 s longer:')
+    bench_hedging()
+    print('transcription download, 15% 503 and 3% hangs (1 s timeout):')
+    bench_http()
+
+
+if __name__ == '__main__':
+    main()
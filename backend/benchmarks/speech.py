@@ -0,0 +1,170 @@
+"""AI语音的编码格式：每条回复的字节数、编码耗时和客户端开始播放的时间
+
+没有真实的合成结果，用data/my_voice中的录音（转为24kHz单声道，拼接为约10秒）代替一条回复，按200ms一片送入编码器，
+模拟逐句合成的输出。原做法为cosyvoice逐句返回的MP3直接拼接（按默认的MP3_22050HZ_MONO_256KBPS估计，22050Hz的MP3最高160kbps），
+客户端下载完整文件后播放；新做法在本地编码为一个文件，客户端收到能播放约0.3秒的数据即可开始播放。
+开始播放的时间 = RTT + 所需字节数 / 带宽，带宽为模拟的移动网络。
+duration ok为播放器从文件头读到的时长占实际时长的比例，fed s为能开始播放时已合成的音频时长。
+最后用LocalStorage.serve检查对象的Content-Type和Cache-Control。
+在backend目录下运行：python -m benchmarks.speech [录音数]
+"""
+import io
+import os
+import sys
+import glob
+import time
+import shutil
+import tempfile
+from contextlib import contextmanager, redirect_stderr
+import numpy as np
+import requests
+import soundfile as sf
+from audio import decode, to_mono, resample, to_pcm16
+from speech import SpeechFormat, SpeechEncoder
+from storage import LocalStorage, new_object_name
+from config import Config
+
+SAMPLE_RATE = 24000
+CHUNK_SECONDS = 0.2
+PLAYABLE_SECONDS = 0.3
+# 一条回复约三四句
+REPLY_SECONDS = 10
+# (名称, 下行带宽bps, RTT秒)
+LINKS = [('3G 1.5Mbps', 1.5e6, 0.15), ('4G 8Mbps', 8e6, 0.06)]
+
+
+def replies(limit, seconds=REPLY_SECONDS):
+    """用录音代替合成出的回复：依次拼接录音，每条约seconds秒，返回PCM16列表"""
+    pcms, current = [], []
+    for path in sorted(glob.glob(os.path.join(Config.VOICE_UPLOAD_FOLDER, '*.wav'))):
+        with open(path, 'rb') as f:
+            samples, rate = decode(f.read(), path)
+        current.append(to_pcm16(resample(to_mono(samples), rate, SAMPLE_RATE)))
+        if sum(len(pcm) for pcm in current) >= seconds * SAMPLE_RATE:
+            pcms.append(np.concatenate(current)[:seconds * SAMPLE_RATE])
+            current = []
+            if len(pcms) >= limit:
+                break
+    return pcms
+
+
+def per_sentence_mp3(pcm, sentence_seconds=3.0):
+    """原做法：每句单独编码为MP3后直接拼接"""
+    legacy = SpeechFormat('mp3', 256000, 22050)
+    sentence = to_pcm16(resample(pcm.astype(np.float32) / 32768, SAMPLE_RATE, 22050))
+    step = int(sentence_seconds * 22050)
+    return b''.join(legacy.encode(sentence[i:i + step].tobytes()) for i in range(0, len(sentence), step))
+
+
+@contextmanager
+def quiet_stderr():
+    """拼接或不完整的MP3的Xing头与实际长度不符，libmpg123会直接向stderr输出警告"""
+    stderr = os.dup(2)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 2)
+    try:
+        yield
+    finally:
+        os.dup2(stderr, 2)
+        os.close(stderr)
+        os.close(devnull)
+
+
+def reported_duration(data):
+    """播放器从文件头读到的时长"""
+    with quiet_stderr():
+        return sf.info(io.BytesIO(data)).duration
+
+
+def playable_seconds(prefix):
+    """客户端收到prefix时能解码出的音频时长"""
+    try:
+        with quiet_stderr():
+            samples, rate = sf.read(io.BytesIO(prefix), dtype='int16')
+    except Exception:
+        return 0.0
+    return len(samples) / float(rate)
+
+
+def encode_progressive(speech_format, pcm):
+    """逐片编码，返回(完整文件, 编码耗时, 能播放PLAYABLE_SECONDS所需的字节数, 此时已送入编码器的音频时长)"""
+    received = bytearray()
+    encoder = SpeechEncoder(speech_format, received.extend)
+    step = int(CHUNK_SECONDS * SAMPLE_RATE)
+    snapshots = []
+    elapsed = 0.0
+    for offset in range(0, len(pcm), step):
+        start = time.perf_counter()
+        encoder.feed(pcm[offset:offset + step].tobytes())
+        elapsed += time.perf_counter() - start
+        snapshots.append((bytes(received), encoder.duration))
+    start = time.perf_counter()
+    data = encoder.close()
+    elapsed += time.perf_counter() - start
+    # Ogg要等一页写满才推送，能播放时已合成的时长更长
+    for prefix, fed in snapshots:
+        if playable_seconds(prefix) >= PLAYABLE_SECONDS:
+            return data, elapsed, len(prefix), fed
+    return data, elapsed, len(data), encoder.duration
+
+
+def time_to_play(size, bandwidth, rtt):
+    return rtt + size * 8 / bandwidth
+
+
+def check_headers(samples):
+    """上传到本地存储后用HEAD检查响应头"""
+    root = tempfile.mkdtemp()
+    storage = LocalStorage(root)
+    server = storage.serve()
+    try:
+        # 不输出HTTP服务的访问日志
+        with redirect_stderr(io.StringIO()):
+            for extension, data in samples:
+                response = requests.head(storage.put_bytes(new_object_name(extension), data))
+                print(f"{extension:>8}: Content-Type {response.headers.get('Content-Type')}, "
+                      f"Cache-Control {response.headers.get('Cache-Control')}")
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(root)
+
+
+def main(limit=20):
+    pcms = replies(limit)
+    seconds = sum(len(pcm) for pcm in pcms) / SAMPLE_RATE
+    print(f"{len(pcms)} replies, {seconds / len(pcms):.1f} s on average")
+
+    formats = [('wav', SpeechFormat('wav', 0, SAMPLE_RATE)),
+               ('mp3 48k', SpeechFormat('mp3', 48000, SAMPLE_RATE)),
+               ('mp3 32k', SpeechFormat('mp3', 32000, SAMPLE_RATE)),
+               ('opus 32k', SpeechFormat('opus', 32000, SAMPLE_RATE)),
+               ('opus 24k', SpeechFormat('opus', 24000, SAMPLE_RATE))]
+    header = ''.join(f"{'play@' + name:>16}" for name, _, _ in LINKS)
+    print(f"{'format':>20} {'KB/reply':>9} {'kbps':>6} {'encode ms':>10} {'duration ok':>12} {'fed s':>6}{header}")
+
+    legacy = [per_sentence_mp3(pcm) for pcm in pcms]
+    size = np.mean([len(data) for data in legacy])
+    # 拼接的文件播放器读到的时长只有第一句
+    reported = np.mean([reported_duration(data) for data in legacy])
+    plays = ''.join(f"{time_to_play(size, bandwidth, rtt) * 1000:>14.0f}ms" for _, bandwidth, rtt in LINKS)
+    print(f"{'mp3 per sentence':>20} {size / 1024:>9.1f} {size * 8 / (seconds / len(pcms)) / 1000:>6.0f} "
+          f"{'-':>10} {reported / (seconds / len(pcms)) * 100:>11.0f}% {seconds / len(pcms):>6.1f}{plays}")
+
+    samples = []
+    for name, speech_format in formats:
+        results = [encode_progressive(speech_format, pcm) for pcm in pcms]
+        size = np.mean([len(data) for data, _, _, _ in results])
+        encode_ms = np.mean([elapsed for _, elapsed, _, _ in results]) * 1000
+        playable = np.mean([first for _, _, first, _ in results])
+        fed = np.mean([seconds_fed for _, _, _, seconds_fed in results])
+        reported = np.mean([reported_duration(data) for data, _, _, _ in results])
+        plays = ''.join(f"{time_to_play(playable, bandwidth, rtt) * 1000:>14.0f}ms" for _, bandwidth, rtt in LINKS)
+        print(f"{name:>20} {size / 1024:>9.1f} {size * 8 / (seconds / len(pcms)) / 1000:>6.0f} {encode_ms:>10.1f} "
+              f"{reported / (seconds / len(pcms)) * 100:>11.0f}% {fed:>6.1f}{plays}")
+        samples.append((speech_format.extension, results[0][0]))
+    check_headers(samples)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
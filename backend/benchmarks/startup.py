@@ -0,0 +1,68 @@
+"""启动耗时：导入app的时间，以及启动时不应加载的模块
+
+在子进程中用python -X importtime多次导入app，取最小的累计耗时；对比同时导入各SDK
+（即原先启动时的做法）的耗时。启动时加载了LAZY_MODULES中的模块，或导入耗时超过--budget毫秒时
+返回非零退出码，可以在CI中作为检查。
+在backend目录下运行：python -m benchmarks.startup [--budget 1000]
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+# 在首次使用或就绪检查时才导入
+LAZY_MODULES = ('dashscope', 'oss2', 'aiohttp', 'pymysql', 'requests', 'realtime')
+# 原先导入app时会加载的SDK
+EAGER_IMPORTS = 'import dashscope.audio.asr, dashscope.audio.tts_v2, oss2, requests, pymysql'
+
+
+def import_profile(statement):
+    """在新进程中执行statement，返回({模块: 累计微秒}, 总微秒)"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            capture_output=True, text=True, check=True)
+    modules, total = {}, 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 缩进为嵌套层级，顶层模块的累计耗时相加即为总耗时
+        if not name.startswith('  '):
+            total += int(cumulative)
+        modules[name.strip()] = int(cumulative)
+    return modules, total
+
+
+def best_of(statement, runs):
+    profiles = [import_profile(statement) for _ in range(runs)]
+    return min(profiles, key=lambda profile: profile[1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='导入app的耗时和启动时加载的模块')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=1000, help='导入app的耗时上限（毫秒）')
+    args = parser.parse_args(argv)
+
+    modules, total = best_of('import app', args.runs)
+    _, eager_total = best_of(f'import app; {EAGER_IMPORTS}', args.runs)
+    print(f"{'import app':>24}: {total / 1000:7.1f} ms")
+    print(f"{'with SDKs imported':>24}: {eager_total / 1000:7.1f} ms")
+    print('slowest modules (cumulative):')
+    top = sorted(((name, ms) for name, ms in modules.items() if '.' not in name), key=lambda item: -item[1])
+    for name, cumulative in top[:8]:
+        print(f"{name:>24}: {cumulative / 1000:7.1f} ms")
+
+    failures = []
+    loaded = [name for name in LAZY_MODULES if name in modules]
+    if loaded:
+        failures.append(f"loaded at import time: {', '.join(loaded)}")
+    if total / 1000 > args.budget:
+        failures.append(f"import took {total / 1000:.0f} ms, budget {args.budget:.0f} ms")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
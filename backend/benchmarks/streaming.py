@@ -0,0 +1,76 @@
+"""测量实时面试WebSocket服务的首音频时延
+
+使用fakes中的本地后端和临时SQLite数据库，不访问阿里云。
+在backend目录下运行：python -m benchmarks.streaming
+"""
+import json
+import time
+import socket
+import asyncio
+import tempfile
+import threading
+import websockets
+from sqlalchemy import create_engine
+from models import Base, Session
+from fakes import FakeBackends
+import streaming
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def run_turn(uri, seconds=2.0, sample_rate=16000, chunk_ms=100):
+    """发送一段静音回答，返回(首音频时延, done消息)"""
+    chunk = b'\x00\x00' * (sample_rate * chunk_ms // 1000)
+    async with websockets.connect(uri, max_size=None) as ws:
+        await ws.send(json.dumps({'type': 'start', 'sample_rate': sample_rate}))
+        while json.loads(await ws.recv())['type'] != 'ready':
+            pass
+        for _ in range(int(seconds * 1000 / chunk_ms)):
+            await ws.send(chunk)
+        stopped_at = time.monotonic()
+        await ws.send(json.dumps({'type': 'stop'}))
+
+        first_audio = None
+        while True:
+            message = await ws.recv()
+            if isinstance(message, bytes):
+                if first_audio is None:
+                    first_audio = time.monotonic() - stopped_at
+                continue
+            message = json.loads(message)
+            if message['type'] in ('done', 'error'):
+                return first_audio, message
+
+
+def main(turns=5):
+    tmp = tempfile.mkdtemp()
+    engine = create_engine(f'sqlite:///{tmp}/bench.db')
+    Base.metadata.create_all(engine)
+    Session.configure(bind=engine)
+
+    backends = FakeBackends(upload_dir=tmp)
+    port = free_port()
+    ready = threading.Event()
+    threading.Thread(
+        target=lambda: asyncio.run(streaming.serve('127.0.0.1', port, backends, ready)),
+        daemon=True
+    ).start()
+    ready.wait()
+
+    uri = f'ws://127.0.0.1:{port}'
+    results = [asyncio.run(run_turn(uri)) for _ in range(turns)]
+    for first_audio, done in results:
+        print(f"first audio {first_audio * 1000:.0f} ms, server timings {done.get('timings')}")
+
+    streamed = sorted(first_audio for first_audio, _ in results)[len(results) // 2]
+    serial = backends.serial_latency()
+    print(f"median time to first audio: {streamed * 1000:.0f} ms "
+          f"(serial pipeline: {serial * 1000:.0f} ms, {serial / streamed:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
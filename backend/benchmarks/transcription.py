@@ -0,0 +1,68 @@
+"""对比共享跟踪器与原来每请求一个线程每秒轮询的识别等待方式
+
+使用fakes.FakeTranscription，不访问阿里云。
+在backend目录下运行：python -m benchmarks.transcription [并发任务数]
+"""
+import sys
+import time
+import threading
+from concurrent.futures import wait
+from fakes import FakeTranscription
+from transcription import TranscriptionTracker
+
+
+def submit(client):
+    return client.async_call(model='paraformer-v2', file_urls=['fake.wav']).output['task_id']
+
+
+def run_per_request_threads(client, jobs):
+    """原实现：每个任务一个线程，fetch后固定sleep(1)"""
+    detected = {}
+
+    def worker():
+        task_id = submit(client)
+        while client.fetch(task=task_id).output['task_status'] not in ('SUCCEEDED', 'FAILED'):
+            time.sleep(1)
+        detected[task_id] = time.monotonic()
+
+    threads = [threading.Thread(target=worker) for _ in range(jobs)]
+    for t in threads:
+        t.start()
+    peak_threads = threading.active_count()
+    for t in threads:
+        t.join()
+    return detected, peak_threads
+
+
+def run_tracker(client, jobs, rounds=3):
+    """共享跟踪器；分几轮提交，后几轮可以用到学习到的任务耗时"""
+    tracker = TranscriptionTracker(client=client)
+    detected = {}
+    peak_threads = 0
+    for _ in range(rounds):
+        futures = []
+        for _ in range(jobs // rounds):
+            task_id = submit(client)
+            future = tracker.track(task_id)
+            future.add_done_callback(lambda f, t=task_id: detected.__setitem__(t, time.monotonic()))
+            futures.append(future)
+        peak_threads = max(peak_threads, threading.active_count())
+        wait(futures)
+        peak_threads = max(peak_threads, threading.active_count())
+    tracker.shutdown()
+    return detected, peak_threads
+
+
+def main(jobs=60):
+    for name, runner in (('per-request threads', run_per_request_threads),
+                         ('shared tracker', run_tracker)):
+        client = FakeTranscription()
+        detected, threads = runner(client, jobs)
+        delays = sorted(at - client.completed_at(task) for task, at in detected.items())
+        print(f"{name:>20}: jobs={len(delays)} fetches={client.fetch_count} "
+              f"peak threads={threads} detection delay "
+              f"p50={delays[len(delays) // 2] * 1000:.0f}ms max={delays[-1] * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 60)
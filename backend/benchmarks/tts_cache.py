@@ -0,0 +1,92 @@
+"""语音合成缓存：按面试官常用语句的重复比例模拟一批回复，对比有无缓存的合成+上传耗时
+
+合成器和存储都是本地模拟，延迟按真实服务的量级设置。
+在backend目录下运行：python -m benchmarks.tts_cache [回复数]
+"""
+import sys
+import time
+import random
+import tempfile
+from contextlib import contextmanager
+from storage import LocalStorage
+from tts_cache import TTSCache
+from utils import AudioProcessor
+from config import Config
+
+COMMON = Config.TTS_PREWARM_PHRASES
+UNIQUE = '关于你提到的第{n}个项目，请具体说说你负责的模块和遇到的技术难点。'
+
+
+class FakeSynthesizer:
+    """首包约300ms，之后每字约10ms"""
+
+    def call(self, text):
+        time.sleep(0.3 + len(text) * 0.01)
+        return b'\x00' * (len(text) * 600)
+
+    def get_last_request_id(self):
+        return 'fake'
+
+    def get_first_package_delay(self):
+        return 300
+
+
+class FakeClients:
+    @contextmanager
+    def synthesizer(self, callback=None):
+        yield FakeSynthesizer()
+
+
+class SlowStorage(LocalStorage):
+    """本地目录存储，每次上传额外等待50ms"""
+
+    def put_bytes(self, name, data):
+        time.sleep(0.05)
+        return super().put_bytes(name, data)
+
+
+def make_replies(count, repeat_ratio, offset=0):
+    return [random.choice(COMMON) if random.random() < repeat_ratio else UNIQUE.format(n=offset + n)
+            for n in range(count)]
+
+
+def run(processor, replies):
+    start = time.perf_counter()
+    for text in replies:
+        url, upload = processor.synthesize_and_upload(text)
+        upload.result()
+    return (time.perf_counter() - start) / len(replies) * 1000
+
+
+def main(count=100, repeat_ratio=0.4):
+    random.seed(0)
+    replies = make_replies(count, repeat_ratio)
+
+    processor = AudioProcessor()
+    processor.clients = FakeClients()
+    processor.storage = SlowStorage(tempfile.mkdtemp())
+
+    processor.tts_cache = None
+    baseline = run(processor, replies)
+    print(f"{'no cache':>28}: {baseline:.1f} ms/reply")
+
+    processor.tts_cache = TTSCache(tempfile.mkdtemp())
+    cold = run(processor, replies)
+    print(f"{'cache (cold start)':>28}: {cold:.1f} ms/reply")
+    print(f"{'':>28}  {processor.tts_cache.snapshot()}")
+
+    # 新的空缓存先预热常用语句，再处理另一批回复（独有的句子不会命中）
+    replies = make_replies(count, repeat_ratio, offset=count)
+    processor.tts_cache = TTSCache(tempfile.mkdtemp())
+    start = time.perf_counter()
+    for phrase in COMMON:
+        processor.synthesize_and_upload(phrase)[1].result()
+    print(f"{'prewarm (empty cache)':>28}: {(time.perf_counter() - start) * 1000:.1f} ms total")
+    warm = run(processor, replies)
+    print(f"{'cache (prewarmed)':>28}: {warm:.1f} ms/reply")
+    print(f"{'':>28}  {processor.tts_cache.snapshot()}")
+    print(f"{'speedup':>28}: {baseline / warm:.2f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,117 @@
+"""上传处理：每个请求写临时文件的次数和字节数，以及遗留文件清理
+
+用Flask测试客户端上传data/my_voice中最大的几个录音和一段合成的60秒48kHz双声道录音，
+对比werkzeug默认的请求类（超过500KB写临时文件）和SpooledRequest；
+只测到音频规整为止（/api/interview中识别之前的部分）。
+清理部分在临时目录中生成不同新旧、大小的文件，测一次清理的耗时和删除的数量。
+在backend目录下运行：python -m benchmarks.uploads
+"""
+import io
+import os
+import glob
+import time
+import tempfile
+import numpy as np
+import soundfile as sf
+from flask import Flask, Request, request
+from config import Config
+from audio import normalize
+from uploads import SpooledRequest, Janitor
+
+spilled = {'files': 0, 'bytes': 0}
+_rollover = tempfile.SpooledTemporaryFile.rollover
+_write = tempfile.SpooledTemporaryFile.write
+
+
+def counting_rollover(self):
+    """记录缓冲转为临时文件的次数，转存时已缓冲的内容也要写盘"""
+    if not self._rolled:
+        spilled['files'] += 1
+        spilled['bytes'] += self._file.tell()
+    return _rollover(self)
+
+
+def counting_write(self, data):
+    rolled = self._rolled
+    result = _write(self, data)
+    if rolled:
+        spilled['bytes'] += len(data)
+    return result
+
+
+def make_app(request_class):
+    app = Flask(__name__)
+    app.request_class = request_class
+    app.config['MAX_CONTENT_LENGTH'] = Config.UPLOAD_MAX_BYTES
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        file = request.files['audio']
+        audio = normalize(file.stream, file.filename)
+        return {'duration': audio.duration}
+    return app
+
+
+def recordings():
+    files = sorted(glob.glob(os.path.join(Config.VOICE_UPLOAD_FOLDER, '*.wav')), key=os.path.getsize)[-5:]
+    samples = [(os.path.basename(path), open(path, 'rb').read()) for path in files]
+    t = np.arange(48000 * 60) / 48000
+    tone = (np.sin(2 * np.pi * 220 * t) * 0.3).astype(np.float32)
+    buffer = io.BytesIO()
+    sf.write(buffer, np.stack([tone, tone], axis=1), 48000, format='WAV', subtype='PCM_16')
+    samples.append(('long.wav', buffer.getvalue()))
+    return samples
+
+
+def run_uploads(label, request_class, samples, rounds=5):
+    client = make_app(request_class).test_client()
+    spilled.update(files=0, bytes=0)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for name, data in samples:
+            response = client.post('/upload', data={'audio': (io.BytesIO(data), name)},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 200, response.status_code
+    elapsed = time.perf_counter() - start
+    requests = rounds * len(samples)
+    print(f"{label:>24}: {spilled['files'] / requests:.2f} temp files/request, "
+          f"{spilled['bytes'] / requests / 1024:7.0f} KB written/request, "
+          f"{elapsed / requests * 1000:6.1f} ms/request")
+
+
+def run_janitor(files=2000):
+    directory = tempfile.mkdtemp()
+    now = time.time()
+    rng = np.random.default_rng(0)
+    for i in range(files):
+        path = os.path.join(directory, f'{i}.wav')
+        with open(path, 'wb') as f:
+            f.write(b'\x00' * int(rng.integers(10, 200) * 1024))
+        # 修改时间分布在最近3天
+        mtime = now - rng.uniform(0, 3 * 24 * 3600)
+        os.utime(path, (mtime, mtime))
+    janitor = Janitor([directory], max_age=2 * 24 * 3600, max_bytes=50 * 1024 * 1024)
+    start = time.perf_counter()
+    deleted = janitor.sweep()
+    elapsed = time.perf_counter() - start
+    stats = janitor.snapshot()
+    print(f"{'janitor':>24}: {files} files, deleted {deleted} "
+          f"({stats['deleted_bytes'] / 1024 / 1024:.0f} MB) in {elapsed * 1000:.0f} ms, "
+          f"{stats['files']} files / {stats['bytes'] / 1024 / 1024:.0f} MB left")
+
+
+def main():
+    samples = recordings()
+    sizes = ', '.join(f"{len(data) / 1024:.0f}KB" for _, data in samples)
+    print(f"uploads: {sizes}")
+    tempfile.SpooledTemporaryFile.rollover = counting_rollover
+    tempfile.SpooledTemporaryFile.write = counting_write
+    run_uploads('werkzeug default', Request, samples)
+    run_uploads('SpooledRequest', SpooledRequest, samples)
+    tempfile.SpooledTemporaryFile.rollover = _rollover
+    tempfile.SpooledTemporaryFile.write = _write
+    run_janitor()
+
+
+if __name__ == '__main__':
+    main()
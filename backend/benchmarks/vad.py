@@ -0,0 +1,80 @@
+"""语音活动检测：对比原来只按能量去首尾静音与VAD去静音、压缩停顿后送入识别的音频时长
+
+使用data/my_voice中的样例录音，统计被判为无语音而直接拒绝的录音数、
+送入识别的总时长（识别按音频时长计费和耗时）、检测耗时以及长回答的切分段数。
+样例录音多在安静环境下录制，另外叠加-45dB的背景噪声、前后各留1秒（点了录音后停顿再开口）
+模拟嘈杂环境，此时固定能量阈值失效。
+在backend目录下运行：python -m benchmarks.vad
+"""
+import os
+import glob
+import time
+import numpy as np
+import vad
+from audio import decode, to_mono, resample
+from config import Config
+
+
+def energy_trim(samples, sample_rate, threshold_db=Config.AUDIO_SILENCE_THRESHOLD_DB, frame_ms=20):
+    """原trim_silence的做法：固定能量阈值，只去首尾"""
+    energy_db, _, frame = vad.frame_features(samples, sample_rate, frame_ms)
+    voiced = np.flatnonzero(energy_db > threshold_db)
+    if len(voiced) == 0:
+        return samples[:0]
+    return samples[voiced[0] * frame:min(len(samples), (voiced[-1] + 1) * frame)]
+
+
+def noisy(samples, sample_rate, level_db=-45, lead_seconds=1.0, seed=0):
+    """叠加背景噪声并在前后补上只有噪声的片段"""
+    lead = np.zeros(int(lead_seconds * sample_rate), dtype=np.float32)
+    padded = np.concatenate([lead, samples, lead])
+    noise = np.random.default_rng(seed).standard_normal(len(padded)) * 10 ** (level_db / 20)
+    return (padded + noise).astype(np.float32)
+
+
+def measure(label, recordings, sample_rate):
+    original = sum(len(samples) for samples in recordings) / sample_rate
+    old_seconds = 0.0
+    old_rejected = 0
+    for samples in recordings:
+        trimmed = energy_trim(samples, sample_rate)
+        old_seconds += len(trimmed) / sample_rate
+        old_rejected += len(trimmed) / sample_rate <= Config.AUDIO_MIN_DURATION
+
+    new_seconds = 0.0
+    new_rejected = 0
+    chunks = 0
+    start = time.perf_counter()
+    for samples in recordings:
+        result = vad.detect(samples, sample_rate)
+        compacted = vad.compact(samples, result)
+        new_seconds += len(compacted) / sample_rate
+        new_rejected += len(compacted) / sample_rate <= Config.AUDIO_MIN_DURATION
+        chunks += len(vad.split(compacted, vad.detect(compacted, sample_rate), Config.VAD_SPLIT_SECONDS))
+    elapsed = time.perf_counter() - start
+
+    print(f"{label}: {len(recordings)} recordings, {original:.1f} s of audio")
+    print(f"{'energy trim':>12}: {old_seconds:7.1f} s sent to ASR, {old_rejected} rejected as empty")
+    print(f"{'vad':>12}: {new_seconds:7.1f} s sent to ASR, {new_rejected} rejected as empty, "
+          f"{elapsed / len(recordings) * 1000:.2f} ms/file")
+    print(f"{'saved':>12}: {old_seconds - new_seconds:7.1f} s of ASR audio "
+          f"({(1 - new_seconds / old_seconds) * 100 if old_seconds else 0:.0f}%)")
+    print(f"{'chunks':>12}: {chunks} (split at pauses every {Config.VAD_SPLIT_SECONDS}s)")
+
+
+def main(sample_rate=Config.AUDIO_SAMPLE_RATE):
+    files = sorted(glob.glob(os.path.join(Config.VOICE_UPLOAD_FOLDER, '*.wav')))
+    if not files:
+        print(f"No sample recordings found in {Config.VOICE_UPLOAD_FOLDER}")
+        return
+    recordings = []
+    for path in files:
+        samples, source_rate = decode(open(path, 'rb').read(), path, sample_rate)
+        recordings.append(resample(to_mono(samples), source_rate, sample_rate))
+    measure('quiet room', recordings, sample_rate)
+    measure('noisy room', [noisy(samples, sample_rate, seed=i) for i, samples in enumerate(recordings)],
+            sample_rate)
+
+
+if __name__ == '__main__':
+    main()
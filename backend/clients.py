@@ -0,0 +1,196 @@
+"""进程内共享的外部服务客户端池
+
+OSS Bucket、下载识别结果用的HTTP会话和预先建立WebSocket连接的语音合成器
+在进程内只创建一次，多个请求线程复用，避免每个请求重新建连和握手。
+oss2、dashscope和requests导入较慢（dashscope连同aiohttp约0.4秒），都在首次使用时才导入，
+只查询历史的请求和健康检查不需要加载它们。
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from speech import get_speech_format
+from config import Config
+
+_dashscope = None
+_dashscope_lock = threading.Lock()
+
+
+def get_dashscope():
+    """首次使用时导入dashscope并设置API key"""
+    global _dashscope
+    with _dashscope_lock:
+        if _dashscope is None:
+            import dashscope
+            dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
+            _dashscope = dashscope
+        return _dashscope
+
+
+class ClientPool:
+    """线程安全的客户端池，带健康检查和重连"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bucket = None
+        self._http = None
+        # 建立语音合成器连接池要几秒，单独加锁，不阻塞OSS、HTTP客户端和统计
+        self._tts_lock = threading.Lock()
+        self._tts_pool = None
+        self._tts_pool_size = 0
+        self._tts_in_use = 0
+        self.stats = {
+            'oss_created': 0,
+            'oss_reused': 0,
+            'http_created': 0,
+            'http_reused': 0,
+            'tts_borrowed': 0,
+            'tts_unpooled': 0,
+            'tts_errors': 0,
+            'health_checks': 0,
+            'reconnects': 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    @property
+    def bucket(self):
+        """共享的OSS Bucket，底层使用带连接池的oss2.Session"""
+        with self._lock:
+            if self._bucket is None:
+                import oss2
+                from oss2.credentials import EnvironmentVariableCredentialsProvider
+                # 使用V4签名认证
+                auth = oss2.ProviderAuthV4(EnvironmentVariableCredentialsProvider())
+                endpoint = f"https://oss-{Config.OSS_REGION}.aliyuncs.com"
+                print(f"OSS Endpoint: {endpoint}")
+                self._bucket = oss2.Bucket(
+                    auth,
+                    endpoint,
+                    Config.OSS_BUCKET,
+                    session=oss2.Session(pool_size=Config.OSS_POOL_SIZE),
+                    region=Config.OSS_REGION
+                )
+                self.stats['oss_created'] += 1
+            else:
+                self.stats['oss_reused'] += 1
+            return self._bucket
+
+    @property
+    def http(self):
+        """共享的requests会话，保持长连接并对连接错误做有限重试"""
+        with self._lock:
+            if self._http is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=Config.HTTP_POOL_SIZE,
+                    pool_maxsize=Config.HTTP_POOL_SIZE,
+                    max_retries=Retry(total=2, backoff_factor=0.2, allowed_methods=['GET'])
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._http = session
+                self.stats['http_created'] += 1
+            else:
+                self.stats['http_reused'] += 1
+            return self._http
+
+    def _get_tts_pool(self):
+        pool = self._tts_pool
+        if pool is not None or Config.TTS_POOL_SIZE <= 0:
+            return pool
+        with self._tts_lock:
+            if self._tts_pool is None:
+                get_dashscope()
+                from dashscope.audio.tts_v2 import SpeechSynthesizerObjectPool
+                # SDK的对象池会预先建立WebSocket连接，并在后台定期检查和重连
+                pool = SpeechSynthesizerObjectPool(max_size=Config.TTS_POOL_SIZE)
+                with self._lock:
+                    self._tts_pool = pool
+                    self._tts_pool_size = Config.TTS_POOL_SIZE
+            return self._tts_pool
+
+    @contextmanager
+    def synthesizer(self, callback=None):
+        """借出一个已连接的语音合成器（输出PCM16单声道，见speech.py），用完自动归还"""
+        pool = self._get_tts_pool()
+        if pool is None:
+            get_dashscope()
+            from dashscope.audio.tts_v2 import SpeechSynthesizer
+            self._count('tts_unpooled')
+            yield SpeechSynthesizer(model=Config.TTS_MODEL, voice=Config.TTS_VOICE,
+                                    format=get_speech_format().synthesis_format(), callback=callback)
+            return
+
+        synthesizer = pool.borrow_synthesizer(model=Config.TTS_MODEL, voice=Config.TTS_VOICE,
+                                              format=get_speech_format().synthesis_format(),
+                                              callback=callback)
+        with self._lock:
+            self.stats['tts_borrowed'] += 1
+            self._tts_in_use += 1
+        try:
+            yield synthesizer
+        except Exception:
+            self._count('tts_errors')
+            raise
+        finally:
+            # 出错的连接归还后会被后台线程检测到并重连
+            pool.return_synthesizer(synthesizer)
+            with self._lock:
+                self._tts_in_use -= 1
+
+    def check_health(self):
+        """检查OSS连接，不可用时丢弃旧客户端以便下次重建"""
+        self._count('health_checks')
+        health = {'oss': True}
+        try:
+            # 查询一个不存在的对象，404视为正常
+            self.bucket.object_exists('__healthcheck__')
+        except Exception as e:
+            print(f"OSS health check failed: {str(e)}")
+            health['oss'] = False
+            self.reconnect()
+        health['tts_pool'] = self._tts_pool is not None
+        return health
+
+    def warm_tts(self):
+        """预先建立语音合成器连接池，未启用连接池时返回False"""
+        return self._get_tts_pool() is not None
+
+    def reconnect(self):
+        """丢弃OSS和HTTP客户端，下次使用时重新创建"""
+        with self._lock:
+            self._bucket = None
+            if self._http is not None:
+                self._http.close()
+            self._http = None
+            self.stats['reconnects'] += 1
+
+    def snapshot(self):
+        """连接池统计信息"""
+        with self._lock:
+            stats = dict(self.stats)
+            if self._tts_pool is not None:
+                stats['tts_pool_size'] = self._tts_pool_size
+                # 池满时SDK会临时新建合成器，借出数可能超过池大小
+                stats['tts_pool_available'] = max(self._tts_pool_size - self._tts_in_use, 0)
+        stats['timestamp'] = time.time()
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """进程内共享的客户端池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ClientPool()
+        return _pool
@@ -13,12 +13,180 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # 数据库连接池与写入
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))  # 常驻连接数，与任务队列和编排线程的并发相当
+    DB_MAX_OVERFLOW = 10  # 高峰时可额外创建的连接数
+    DB_POOL_TIMEOUT = 10  # 等待空闲连接的最长秒数
+    DB_POOL_RECYCLE = 1800  # 连接使用超过该秒数后重建，避免被MySQL的wait_timeout断开
+    DB_POOL_PRE_PING = True  # 取出连接时先检查是否可用
+    DB_WRITE_BEHIND = True  # 面试记录交给后台线程合并提交
+    DB_WRITE_DURABLE = True  # 为True时等提交完成才返回；为False时放入缓冲即返回，进程崩溃可能丢失最近的记录
+    DB_WRITE_BATCH_SIZE = 32  # 一次提交的最多记录数
+    DB_WRITE_FLUSH_DELAY = 0.05  # 非durable的记录最多在缓冲中停留的秒数
+
     # OSS配置
     OSS_REGION = "cn-shanghai"
     OSS_BUCKET = "brando-test"
+    OSS_POOL_SIZE = 10  # OSS连接池大小
+    OSS_MULTIPART_THRESHOLD = 2 * 1024 * 1024  # 超过该大小分片上传
+    OSS_PART_SIZE = 1024 * 1024  # 分片大小
+    OSS_RESUMABLE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', '.oss_checkpoints')
+
+    # 存储后端：oss 或 local（本地目录，用于离线测试）
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'oss')
+    LOCAL_STORAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'storage')
+    LOCAL_STORAGE_URL = os.getenv('LOCAL_STORAGE_URL')  # 本地存储对外的HTTP地址，为空时返回file://地址
+    UPLOAD_WORKERS = 8  # 后台上传线程数
+
+    # 下载识别结果等HTTP请求的连接池大小
+    HTTP_POOL_SIZE = 10
+
+    # 语音合成配置
+    TTS_MODEL = "cosyvoice-v1"
+    TTS_VOICE = "loongbella"
+    TTS_POOL_SIZE = 4  # 预先建立连接的合成器数量，0表示不使用连接池
+    TTS_PIPELINE = True  # 流式获取回复并逐句合成，False时等完整回复后整段合成
+
+    # AI语音的输出格式（见speech.py）：cosyvoice合成PCM，每条回复在本地编码为一个完整文件
+    TTS_FORMAT = 'mp3'  # mp3、opus（Ogg容器，体积更小，但iOS 17以下的Safari不支持，流式推送按约1秒一页）或wav
+    TTS_BITRATE = 48000  # mp3/opus的目标码率（bps）
+    TTS_SAMPLE_RATE = 24000  # 合成采样率（8000/16000/22050/24000/44100/48000），opus不支持22050和44100
+    AUDIO_CACHE_CONTROL = 'public, max-age=31536000, immutable'  # 上传的音频对象名唯一、内容不变
+
+    # 语音合成缓存
+    TTS_CACHE_ENABLED = True
+    TTS_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'ai_voice', 'cache')
+    TTS_CACHE_MEMORY_BYTES = 32 * 1024 * 1024  # 内存层容量
+    TTS_CACHE_DISK_BYTES = 512 * 1024 * 1024  # 磁盘层容量
+    TTS_PREWARM_PHRASES = [  # 启动时预先合成的常用语句
+        "请介绍一下你自己。",
+        "请先介绍一下你最近做过的一个项目。",
+        "好的，我们进入下一个问题。",
+        "抱歉，我现在无法回答您的问题。",
+        "抱歉，系统出现了问题。",
+    ]
     
     # 语音文件存储路径
     VOICE_UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'my_voice')
+    AI_VOICE_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'ai_voice')
+    # 应用自己产生、可以随时删除的临时音频文件
+    SPOOL_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'spool')
+
+    # 上传
+    UPLOAD_MAX_BYTES = 20 * 1024 * 1024  # 请求体上限，超出返回413
+    UPLOAD_SPOOL_BYTES = 16 * 1024 * 1024  # 上传文件在内存中缓冲的上限，超过后才写临时文件
+
+    # 遗留文件清理（只清理目录下一层的文件）
+    # data/my_voice、data/ai_voice中是仓库自带的样例录音（基准测试和批量识别使用），不能清理
+    JANITOR_ENABLED = os.getenv('JANITOR_ENABLED', '0') == '1'
+    JANITOR_DIRS = [SPOOL_FOLDER]
+    JANITOR_MAX_AGE = 24 * 3600  # 文件保留时间（秒）
+    JANITOR_MAX_BYTES = 200 * 1024 * 1024  # 目录总大小配额
+    JANITOR_GRACE = 60  # 修改时间在该秒数内的文件不删除
+    JANITOR_INTERVAL = 600  # 清理间隔（秒）
     
+    # 异步面试任务
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))  # 同时处理的任务数
+    JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', 32))  # 最多排队的任务数，超出时返回429
+    JOB_RESULT_TTL = 600  # 完成的任务保留多久供查询（秒）
+    JOB_DEFAULT_DURATION = 5  # 还没有统计数据时假定的单个任务耗时（秒），用于估算Retry-After
+    JOB_MAX_WAIT = 30  # 查询任务时最多阻塞等待的秒数（长轮询）
+
+    # 面试流程各阶段的超时（秒）和执行阻塞调用的线程数
+    STAGE_TIMEOUTS = {
+        'upload_user': 60,
+        'asr': 60,
+        'reply': 90,
+        'upload_ai': 60,
+        'db': 10,
+        'session_update': 60,
+    }
+    ORCHESTRATOR_WORKERS = 32
+    ORCHESTRATOR_CANCEL_POLL = 0.05  # 检查是否被取消的间隔（秒）
+
+    # 历史记录分页
+    HISTORY_PAGE_SIZE = 20  # 默认每页条数
+    HISTORY_MAX_PAGE_SIZE = 100  # 每页最大条数
+    HISTORY_STREAM_MAX_LIMIT = 10000  # 流式输出时单次最多条数
+
+    # 多轮面试上下文
+    SESSION_CONTEXT_TOKENS = 1500  # 每轮提示词（系统提示+摘要+最近轮次+本轮输入）的token预算
+    SESSION_WINDOW_TURNS = 6  # 保留原文的最近轮数，超出后较早的一半折叠进摘要
+    SESSION_SUMMARY_TOKENS = 300  # 滚动摘要的token上限
+    SESSION_CACHE_SIZE = 1000  # 内存中缓存的活跃会话数
+
     # 允许上传的文件类型
-    ALLOWED_EXTENSIONS = {'wav', 'mp3', 'webm'} 
\ No newline at end of file
+    ALLOWED_EXTENSIONS = {'wav', 'mp3', 'webm'}
+
+    # 音频规整配置
+    AUDIO_SAMPLE_RATE = 16000  # 识别使用的采样率
+    AUDIO_GAIN = 2.0  # 音量放大倍数
+    AUDIO_SILENCE_THRESHOLD_DB = -50  # 低于该能量的帧一定视为静音（VAD阈值的下限）
+    AUDIO_MIN_DURATION = 0.1  # 去除静音后有效音频的最短时长（秒）
+
+    # 语音活动检测
+    VAD_FRAME_MS = 20  # 帧长
+    VAD_MARGIN_DB = 12  # 语音帧能量需高出背景噪声的dB数
+    VAD_ZCR_THRESHOLD = 0.25  # 过零率高于该值的弱能量帧视为擦音
+    VAD_MIN_SPEECH_MS = 120  # 短于该时长的语音段视为噪声
+    VAD_HANGOVER_MS = 300  # 间隔短于该时长的语音段合并
+    VAD_PAD_MS = 150  # 每个语音段前后保留的余量
+    VAD_MAX_PAUSE_MS = 600  # 回答中间的停顿最多保留这么长
+    VAD_SPLIT_SECONDS = 30  # 超过该时长的回答在停顿处切分后并行识别
+
+    # HTTP服务配置
+    DEBUG = os.getenv('FLASK_DEBUG') == '1'  # 只在本地开发时打开（自动重载、调试页面）
+    SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+    SERVER_PORT = int(os.getenv('SERVER_PORT', 5000))
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', 32))  # wsgi.py（waitress）的请求线程数
+
+    # 实时面试WebSocket服务配置
+    STREAM_HOST = '0.0.0.0'
+    STREAM_PORT = 5001
+    STREAM_SAMPLE_RATE = 16000  # 客户端上传PCM16单声道音频的采样率
+
+    # 外部依赖的容错策略（见resilience.py）
+    DEPENDENCY_TIMEOUTS = {  # 单次调用超时（秒），None表示不限制
+        'oss': 60,
+        'asr': 10,  # 提交录音文件识别任务、查询状态、下载结果
+        'asr_realtime': 30,
+        'llm': 30,
+        'tts': 15,
+    }
+    DEPENDENCY_RETRIES = {  # 失败后的重试次数
+        'oss': 2,
+        'asr': 2,
+        'asr_realtime': 1,
+        'llm': 2,
+        'tts': 2,
+    }
+    DEPENDENCY_WORKERS = 16  # 每个依赖最多同时占用的线程数
+    RETRY_BACKOFF = 0.2  # 重试退避基数（秒），第n次重试前随机等待[0, 基数*2^n]
+    RETRY_MAX_BACKOFF = 2.0  # 单次退避上限（秒）
+    BREAKER_FAILURES = 5  # 连续失败多少次后熔断
+    BREAKER_RESET_TIMEOUT = 30  # 熔断后多少秒放行试探请求
+    TTS_HEDGE_DELAY = None  # 语音合成超过该秒数还没有首包时再发一个请求，None表示不对冲
+
+    # 对话回复缓存
+    LLM_CACHE_ENABLED = True
+    LLM_CACHE_SIZE = 2000  # 最多缓存的回复条数
+    LLM_CACHE_TTL = 24 * 3600  # 回复的有效期（秒）
+    LLM_CACHE_SIMILARITY = None  # 近似匹配的相似度阈值（字符二元组Jaccard，建议不低于0.85），默认只做精确匹配
+    LLM_CACHE_MAX_CHARS = 20  # 超过该长度（规整后）的输入不走缓存
+
+    # 监控
+    METRICS_LOG_EVENTS = os.getenv('METRICS_LOG_EVENTS', '1') == '1'  # 是否输出各阶段的结构化日志
+
+    # 录音文件识别任务轮询配置
+    ASR_DIRECT = True  # 直接把PCM送入实时识别，不必先上传OSS再提交录音文件识别
+    ASR_TIMEOUT = 30  # 单个任务最长等待秒数
+    ASR_POLL_INITIAL_INTERVAL = 0.3  # 初始查询间隔（秒）
+    ASR_POLL_MAX_INTERVAL = 1.0  # 最大查询间隔（秒）
+    ASR_POLL_BACKOFF = 1.2  # 每次未完成后间隔的放大倍数
+    ASR_POLL_WORKERS = 4  # 并发查询线程数
+
+    # 批量识别（归档录音重新识别、回填user_text）
+    BATCH_FILES_PER_JOB = 50  # 每个识别任务包含的文件数（paraformer单个任务最多100个）
+    BATCH_MAX_JOBS = 4  # 同时进行的识别任务数
+    BATCH_JOB_TIMEOUT = 600  # 单个批量任务最长等待秒数
+    BATCH_CHECKPOINT = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'batch_checkpoint.jsonl')
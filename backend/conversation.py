@@ -0,0 +1,229 @@
+"""多轮面试的对话上下文
+
+每个会话只保留最近几轮原文（滑动窗口），更早的轮次折叠成一段滚动摘要，
+拼出来的提示词始终控制在token预算内，不随面试轮数增长。
+活跃会话的上下文缓存在进程内（LRU），被淘汰或首次访问时与数据库同步。
+"""
+import re
+import uuid
+import threading
+from collections import OrderedDict
+from models import Session, Interview, InterviewSession, session_scope
+from config import Config
+
+SYSTEM_PROMPT = '你是一个专业的面试官，请用专业、友好的语气进行面试。'
+
+_CJK = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+_WORD = re.compile(r'[A-Za-z0-9_]+')
+
+
+def estimate_tokens(text):
+    """粗略估计token数：中文字符和标点每个约1个，英文单词和数字每个约1.3个"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    words = len(_WORD.findall(text))
+    return cjk + int(words * 1.3) + 1
+
+
+def truncate_tokens(text, budget):
+    """保留文本末尾不超过budget个token的部分"""
+    while text and estimate_tokens(text) > budget:
+        text = text[max(1, len(text) // 10):]
+    return text
+
+
+class SessionNotFound(KeyError):
+    """会话不存在"""
+
+
+class ConversationContext:
+    """一个会话在内存中的上下文：滚动摘要 + 最近几轮原文"""
+
+    def __init__(self, session_id, summary='', summarized_turns=0, turns=None, turn_count=0):
+        self.session_id = session_id
+        self.summary = summary or ''
+        self.summarized_turns = summarized_turns
+        self.turns = list(turns or [])  # [(用户, 面试官), ...]
+        self.turn_count = turn_count  # 已记录的最大轮次序号
+        self.reserved = turn_count  # 已分配出去的最大轮次序号，见next_turn
+        self.dirty = False
+        self.compacting = False  # 正在调用摘要模型折叠较早的轮次
+        self.lock = threading.Lock()
+
+    def next_turn(self):
+        """为新的一轮分配轮次序号（从1开始）；同一会话并发的轮次各得到不同的序号，失败的轮次留下空号"""
+        with self.lock:
+            self.reserved = max(self.reserved, self.turn_count) + 1
+            return self.reserved
+
+    def build_messages(self, user_input, budget=Config.SESSION_CONTEXT_TOKENS):
+        """拼出本轮的messages：系统提示、摘要、预算内尽量多的最近轮次、当前输入"""
+        messages = [{'role': 'system', 'content': SYSTEM_PROMPT}]
+        remaining = budget - estimate_tokens(SYSTEM_PROMPT) - estimate_tokens(user_input)
+        if self.summary:
+            content = f"此前面试内容摘要：{self.summary}"
+            messages.append({'role': 'system', 'content': content})
+            remaining -= estimate_tokens(content)
+
+        recent = []
+        for user_text, ai_text in reversed(self.turns):
+            cost = estimate_tokens(user_text) + estimate_tokens(ai_text)
+            if cost > remaining:
+                break
+            recent.append((user_text, ai_text))
+            remaining -= cost
+        for user_text, ai_text in reversed(recent):
+            messages.append({'role': 'user', 'content': user_text})
+            messages.append({'role': 'assistant', 'content': ai_text})
+
+        messages.append({'role': 'user', 'content': user_input})
+        return messages
+
+
+def fallback_summary(summary, turns):
+    """摘要模型不可用时的兜底：直接拼接并截断到摘要预算"""
+    lines = [summary] if summary else []
+    lines += [f"候选人：{user_text} 面试官：{ai_text}" for user_text, ai_text in turns]
+    return truncate_tokens('\n'.join(lines), Config.SESSION_SUMMARY_TOKENS)
+
+
+class SessionStore:
+    """活跃会话上下文的LRU缓存，数据库为后备存储
+
+    summarizer(summary, turns) -> 新摘要，用于把移出窗口的轮次折叠进摘要
+    """
+
+    def __init__(self, summarizer=None, capacity=Config.SESSION_CACHE_SIZE,
+                 window=Config.SESSION_WINDOW_TURNS):
+        self.summarizer = summarizer or fallback_summary
+        self.capacity = capacity
+        self.window = window
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'compactions': 0}
+
+    def create(self):
+        """新建会话"""
+        session_id = str(uuid.uuid4())
+        with session_scope() as session:
+            session.add(InterviewSession(id=session_id, summary='', summarized_turns=0, turn_count=0))
+        context = ConversationContext(session_id)
+        self._put(context)
+        return context
+
+    def get(self, session_id):
+        """获取会话上下文，不在缓存中时从数据库加载"""
+        with self._lock:
+            context = self._contexts.get(session_id)
+            if context is not None:
+                self._contexts.move_to_end(session_id)
+                self.stats['hits'] += 1
+                return context
+            self.stats['misses'] += 1
+        context = self._load(session_id)
+        self._put(context)
+        return context
+
+    def get_or_create(self, session_id=None):
+        return self.get(session_id) if session_id else self.create()
+
+    def record_turn(self, context, user_text, ai_text, turn_index=None):
+        """本轮的Interview入库后调用：追加到窗口，超出窗口时把较早的一半折叠进摘要
+
+        turn_index为开始本轮时context.next_turn()分配的序号
+
+        调用摘要模型时不持有context.lock，同一会话的其他轮次和LRU淘汰不必等待；
+        摘要完成前被折叠的轮次仍留在窗口中
+        """
+        with context.lock:
+            context.turns.append((user_text, ai_text))
+            context.turn_count = context.turn_count + 1 if turn_index is None else max(context.turn_count, turn_index)
+            context.dirty = True
+            if len(context.turns) <= self.window or context.compacting:
+                return
+            fold = len(context.turns) - self.window // 2
+            folded, previous = context.turns[:fold], context.summary
+            context.compacting = True
+
+        try:
+            summary = self.summarizer(previous, folded)
+        except Exception as e:
+            print(f"Error summarizing session {context.session_id}: {str(e)}")
+            summary = None
+        summary = truncate_tokens(summary or fallback_summary(previous, folded), Config.SESSION_SUMMARY_TOKENS)
+
+        with context.lock:
+            # 期间只会在末尾追加新的轮次，被折叠的仍是最前面的fold轮
+            context.summary = summary
+            context.turns = context.turns[fold:]
+            context.summarized_turns += fold
+            context.compacting = False
+            self.stats['compactions'] += 1
+            self._flush(context)
+
+    def _put(self, context):
+        evicted = []
+        with self._lock:
+            self._contexts[context.session_id] = context
+            self._contexts.move_to_end(context.session_id)
+            while len(self._contexts) > self.capacity:
+                evicted.append(self._contexts.popitem(last=False)[1])
+                self.stats['evictions'] += 1
+        for old in evicted:
+            if old.dirty:
+                with old.lock:
+                    self._flush(old)
+
+    def _flush(self, context):
+        """把摘要和轮数写回数据库（调用方持有context.lock）"""
+        try:
+            with session_scope() as session:
+                row = session.get(InterviewSession, context.session_id)
+                row.summary = context.summary
+                row.summarized_turns = context.summarized_turns
+                row.turn_count = context.turn_count
+            context.dirty = False
+        except Exception as e:
+            print(f"Error saving session {context.session_id}: {str(e)}")
+
+    def _load(self, session_id):
+        session = Session()
+        try:
+            row = session.get(InterviewSession, session_id)
+            if row is None:
+                raise SessionNotFound(session_id)
+            # 只取摘要之后、窗口之内的最近几轮
+            recent = session.query(Interview.user_text, Interview.ai_response_text, Interview.turn_index) \
+                .filter(Interview.session_id == session_id,
+                        Interview.turn_index > (row.summarized_turns or 0)) \
+                .order_by(Interview.turn_index.desc()).limit(self.window).all()
+            turn_count = max([row.turn_count or 0] + [turn.turn_index for turn in recent])
+            return ConversationContext(
+                session_id,
+                summary=row.summary,
+                summarized_turns=row.summarized_turns or 0,
+                turns=[(turn.user_text, turn.ai_response_text) for turn in reversed(recent)],
+                turn_count=turn_count
+            )
+        finally:
+            session.close()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, active=len(self._contexts))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store(summarizer=None):
+    """进程内共享的会话缓存；summarizer在启动时第一次调用时指定，之后不带参数获取"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore(summarizer)
+        elif summarizer is not None and summarizer != _store.summarizer:
+            raise ValueError('Session store was already created with a different summarizer')
+        return _store
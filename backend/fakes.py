@@ -0,0 +1,312 @@
+"""本地模拟的外部服务，按可配置的延迟返回固定结果
+
+不访问阿里云，用于离线测量各环节时延和压测。
+"""
+import os
+import math
+import time
+import uuid
+import random
+import json
+import threading
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Latency:
+    """对数正态分布的模拟时延：大多数调用接近中位数，少数有长尾
+
+    median为中位数（秒），p99为第99百分位（秒），不设置时固定为median
+    """
+
+    def __init__(self, median, p99=None, seed=None):
+        self.median = median
+        self.p99 = p99
+        # 标准正态分布的第99百分位约为2.326
+        self.sigma = math.log(p99 / median) / 2.326 if p99 and median else 0.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        if not self.sigma:
+            return self.median
+        with self._lock:
+            return self._random.lognormvariate(math.log(self.median), self.sigma)
+
+    def __float__(self):
+        return float(self.median)
+
+    def __repr__(self):
+        return f"Latency(median={self.median}, p99={self.p99})"
+
+
+def delay(latency):
+    """取一次时延：latency为秒数或Latency"""
+    return latency.sample() if isinstance(latency, Latency) else latency
+
+
+class FakeRecognizer:
+    """模拟实时识别：每收到一定量音频返回一次中间结果，结束时延迟返回完整文本"""
+
+    def __init__(self, transcript, on_partial, final_latency, bytes_per_partial):
+        self.transcript = transcript
+        self.on_partial = on_partial
+        self.final_latency = final_latency
+        self.bytes_per_partial = bytes_per_partial
+        self.received = 0
+
+    def feed(self, chunk):
+        before = self.received // self.bytes_per_partial
+        self.received += len(chunk)
+        steps = self.received // self.bytes_per_partial
+        if steps > before:
+            self.on_partial(self.transcript[:min(len(self.transcript), steps * 2)])
+
+    def finish(self):
+        time.sleep(delay(self.final_latency))
+        return self.transcript
+
+    def close(self):
+        pass
+
+
+class FakeBackends:
+    """与streaming.DashScopeBackends接口一致的本地后端
+
+    各项*_latency可以是秒数或Latency（每次调用随机取值）
+    """
+
+    def __init__(self,
+                 transcript='你好，我叫张三，我有三年的后端开发经验。',
+                 reply='你好张三，欢迎参加今天的面试。请先介绍一下你最近做过的一个项目。'
+                       '在这个项目中你主要负责哪些模块？遇到过哪些技术难点？',
+                 asr_final_latency=0.3,
+                 llm_first_token_latency=0.5,
+                 llm_token_interval=0.03,
+                 tts_first_chunk_latency=0.2,
+                 tts_seconds_per_char=0.01,
+                 tts_bytes_per_char=600,
+                 upload_latency=0.05,
+                 upload_dir=None):
+        self.transcript = transcript
+        self.reply = reply
+        self.asr_final_latency = asr_final_latency
+        self.llm_first_token_latency = llm_first_token_latency
+        self.llm_token_interval = llm_token_interval
+        self.tts_first_chunk_latency = tts_first_chunk_latency
+        self.tts_seconds_per_char = tts_seconds_per_char
+        self.tts_bytes_per_char = tts_bytes_per_char
+        self.upload_latency = upload_latency
+        self.upload_dir = upload_dir
+        self._uploads = ThreadPoolExecutor(max_workers=16)
+
+    def open_recognizer(self, sample_rate, on_partial):
+        # 约每0.5秒音频返回一次中间结果
+        return FakeRecognizer(self.transcript, on_partial, self.asr_final_latency, sample_rate)
+
+    def stream_reply(self, user_text, messages=None):
+        time.sleep(delay(self.llm_first_token_latency))
+        for i in range(0, len(self.reply), 2):
+            if i:
+                time.sleep(self.llm_token_interval)
+            yield self.reply[i:i + 2]
+
+    def summarize(self, summary, turns):
+        return (summary + ' ' if summary else '') + '；'.join(user_text for user_text, _ in turns)
+
+    def synthesize(self, text, on_audio):
+        time.sleep(delay(self.tts_first_chunk_latency))
+        # 剩余时间平均分成三个分片返回
+        chunk = b'\x00' * (len(text) * self.tts_bytes_per_char // 3 or 1)
+        for i in range(3):
+            if i:
+                time.sleep(len(text) * self.tts_seconds_per_char / 2)
+            on_audio(chunk)
+
+    def _upload(self, name, data):
+        time.sleep(delay(self.upload_latency))
+        if self.upload_dir:
+            os.makedirs(self.upload_dir, exist_ok=True)
+            with open(os.path.join(self.upload_dir, name), 'wb') as f:
+                f.write(data)
+
+    def upload_async(self, data, extension):
+        name = str(uuid.uuid4()) + extension
+        return f"file://{self.upload_dir or ''}/{name}", self._uploads.submit(self._upload, name, data)
+
+    def serial_latency(self):
+        """原串行流程（识别、完整回复、整段合成）下从用户说完到听到声音的理论耗时"""
+        tokens = (len(self.reply) + 1) // 2
+        llm = float(self.llm_first_token_latency) + self.llm_token_interval * (tokens - 1)
+        tts = float(self.tts_first_chunk_latency) + len(self.reply) * self.tts_seconds_per_char
+        return float(self.asr_final_latency) + llm + tts + float(self.upload_latency)
+
+
+class FakeTranscription:
+    """模拟dashscope的Transcription：提交后任务在随机时长后完成"""
+
+    def __init__(self, min_duration=1.0, max_duration=3.0, failure_rate=0.0,
+                 transcription_url='http://127.0.0.1/transcription.json', seconds_per_file=0.0):
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        # 多文件任务每多一个文件增加的耗时
+        self.seconds_per_file = seconds_per_file
+        self.failure_rate = failure_rate
+        self.transcription_url = transcription_url
+        self.fetch_count = 0
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def async_call(self, model, file_urls, **kwargs):
+        task_id = uuid.uuid4().hex
+        duration = random.uniform(self.min_duration, self.max_duration) + self.seconds_per_file * len(file_urls)
+        status = 'FAILED' if random.random() < self.failure_rate else 'SUCCEEDED'
+        with self._lock:
+            self._tasks[task_id] = (time.monotonic() + duration, status, list(file_urls))
+        return SimpleNamespace(status_code=HTTPStatus.OK, message='',
+                               output={'task_id': task_id, 'task_status': 'PENDING'})
+
+    def fetch(self, task, **kwargs):
+        with self._lock:
+            self.fetch_count += 1
+            done_at, status, file_urls = self._tasks[task]
+        if time.monotonic() < done_at:
+            return SimpleNamespace(status_code=HTTPStatus.OK, message='',
+                                   output={'task_id': task, 'task_status': 'RUNNING'})
+        results = [{'file_url': url, 'transcription_url': self.transcription_url,
+                    'subtask_status': status} for url in file_urls]
+        return SimpleNamespace(status_code=HTTPStatus.OK, message='',
+                               output={'task_id': task, 'task_status': status, 'results': results})
+
+    def completed_at(self, task):
+        """任务实际完成的时间点（time.monotonic）"""
+        with self._lock:
+            return self._tasks[task][0]
+
+
+class FakeHTTP:
+    """模拟下载识别结果JSON的HTTP会话，每个结果两句话"""
+
+    def __init__(self, latency=0.02, transcript='你好，我叫张三。我有三年的后端开发经验。'):
+        self.latency = latency
+        self.transcript = transcript
+
+    def get(self, url, timeout=None):
+        time.sleep(self.latency)
+        first, second = self.transcript.split('。', 1)
+        result = {'file_url': url, 'transcripts': [{
+            'channel_id': 0,
+            'text': self.transcript,
+            'sentences': [{'begin_time': 100, 'end_time': 1800, 'text': first + '。'},
+                          {'begin_time': 2000, 'end_time': 4200, 'text': second}],
+        }]}
+        return SimpleNamespace(status_code=200, json=lambda: result)
+
+
+class FaultInjector:
+    """给一个函数注入故障：按比例抛出错误或变慢，用于测试重试、熔断和对冲
+
+    failure_rate：抛出error的比例；slow_rate：额外等待slow_latency秒的比例（长尾）
+    """
+
+    def __init__(self, func, failure_rate=0.0, slow_rate=0.0, slow_latency=5.0, error=ConnectionError, seed=None):
+        self.func = func
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error = error
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.failure_rate
+            slow = self._random.random() < self.slow_rate
+        if slow:
+            time.sleep(self.slow_latency)
+        if failed:
+            raise self.error(f"injected failure in {getattr(self.func, '__name__', 'call')}")
+        return self.func(*args, **kwargs)
+
+
+class FaultyServer:
+    """本地HTTP服务，返回识别结果JSON，按比例返回503或挂起hang秒后才响应
+
+    模拟不稳定的上游（识别结果下载、OSS），url为服务地址
+    """
+
+    def __init__(self, failure_rate=0.0, hang_rate=0.0, hang=30.0, latency=0.01,
+                 transcript='你好，我叫张三。', seed=None):
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang = hang
+        self.latency = latency
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._body = json.dumps({'transcripts': [{'channel_id': 0, 'text': transcript, 'sentences': [
+            {'begin_time': 0, 'end_time': 1000, 'text': transcript}]}]}).encode('utf-8')
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    roll = server._random.random()
+                time.sleep(server.latency)
+                if roll < server.hang_rate:
+                    time.sleep(server.hang)
+                elif roll < server.hang_rate + server.failure_rate:
+                    self.send_error(HTTPStatus.SERVICE_UNAVAILABLE)
+                    return
+                self.send_response(HTTPStatus.OK)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(server._body)))
+                self.end_headers()
+                self.wfile.write(server._body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/transcription.json"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def patch_processor(backends, uploads=False):
+    """把utils.AudioProcessor中访问阿里云的识别、对话、合成方法替换为backends的本地实现
+
+    uploads为True时上传也替换为backends.upload_async（按upload_latency模拟OSS上传）。
+    用于在本地跑完整的HTTP接口流程，返回恢复原方法的函数
+    """
+    from utils import AudioProcessor
+    names = ['recognize_pcm', 'stream_chat', 'stream_speech', 'summarize']
+    if uploads:
+        names.append('upload_bytes_async')
+    originals = {name: getattr(AudioProcessor, name) for name in names}
+
+    def recognize_pcm(self, pcm, sample_rate=16000):
+        recognizer = backends.open_recognizer(sample_rate, lambda text: None)
+        recognizer.feed(pcm)
+        return recognizer.finish()
+
+    AudioProcessor.recognize_pcm = recognize_pcm
+    AudioProcessor.stream_chat = lambda self, user_input, messages=None: backends.stream_reply(user_input, messages)
+    AudioProcessor.stream_speech = lambda self, text, on_data: backends.synthesize(text, on_data)
+    AudioProcessor.summarize = lambda self, summary, turns: backends.summarize(summary, turns)
+    if uploads:
+        AudioProcessor.upload_bytes_async = lambda self, data, extension: backends.upload_async(data, extension)
+
+    def restore():
+        for name, method in originals.items():
+            setattr(AudioProcessor, name, method)
+    return restore
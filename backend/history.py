@@ -0,0 +1,90 @@
+"""面试历史查询：按(created_at, id)倒序的游标分页和字段投影"""
+import json
+import base64
+from datetime import datetime
+from sqlalchemy import or_
+from models import Interview
+
+# 接口字段名 -> 表列
+FIELDS = {
+    'id': Interview.id,
+    'user_text': Interview.user_text,
+    'ai_response': Interview.ai_response_text,
+    'ai_audio_url': Interview.ai_audio_path,
+    'created_at': Interview.created_at,
+}
+DEFAULT_FIELDS = list(FIELDS)
+
+
+class InvalidQuery(ValueError):
+    """分页参数不合法"""
+
+
+def encode_cursor(created_at, interview_id):
+    raw = f"{created_at.isoformat()}|{interview_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, interview_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(interview_id)
+    except Exception:
+        raise InvalidQuery('Invalid cursor')
+
+
+def parse_fields(value):
+    """解析fields参数，如"id,created_at,ai_audio_url"；为空时返回全部字段"""
+    if not value:
+        return DEFAULT_FIELDS
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise InvalidQuery(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def query_page(session, limit, cursor=None, fields=DEFAULT_FIELDS):
+    """构造一页的查询，只选择需要的列；分页键created_at和id总是会查询"""
+    columns = [FIELDS[field] for field in fields]
+    for key in (Interview.created_at, Interview.id):
+        if not any(column is key for column in columns):
+            columns.append(key)
+    query = session.query(*columns)
+    if cursor:
+        created_at, interview_id = decode_cursor(cursor)
+        # 前一个条件让数据库直接在索引上定位范围，后一个条件排除同一时间已返回过的记录
+        query = query.filter(
+            Interview.created_at <= created_at,
+            or_(Interview.created_at < created_at, Interview.id < interview_id)
+        )
+    return query.order_by(Interview.created_at.desc(), Interview.id.desc()).limit(limit)
+
+
+def serialize(row, fields):
+    item = {}
+    for field in fields:
+        value = getattr(row, FIELDS[field].key)
+        item[field] = value.isoformat() if isinstance(value, datetime) and value else value
+    return item
+
+
+def fetch_page(session, limit, cursor=None, fields=DEFAULT_FIELDS):
+    """返回(记录列表, 下一页游标)；没有下一页时游标为None"""
+    rows = query_page(session, limit + 1, cursor, fields).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return [serialize(row, fields) for row in rows], next_cursor
+
+
+def stream_page(session, limit, cursor=None, fields=DEFAULT_FIELDS, batch_size=500):
+    """逐条生成JSON数组的片段，不把整页结果都加载到内存"""
+    yield '['
+    # SQLAlchemy 1.4的yield_per只控制ORM分批，不打开stream_results时pymysql仍会先读完整个结果集
+    query = query_page(session, limit, cursor, fields).execution_options(stream_results=True).yield_per(batch_size)
+    for i, row in enumerate(query):
+        yield (',' if i else '') + json.dumps(serialize(row, fields), ensure_ascii=False)
+    yield ']'
@@ -0,0 +1,182 @@
+"""一轮面试的处理流程
+
+阶段及依赖（箭头表示依赖）：
+    upload_user                         用户音频归档上传
+    asr                                 实时识别（长回答分段并行），失败时等upload_user完成后提交录音文件识别
+    reply          -> asr               流式回复并逐句合成，合成完即开始上传AI音频
+    upload_ai      -> reply             等待AI音频上传完成
+    db             -> asr, reply        写面试记录（对象URL预先确定，无需等上传完成）
+    session_update -> db, upload_user, upload_ai
+                                        全部成功后才把本轮计入会话上下文
+两个上传与入库同时进行；任一阶段失败时已写入的记录会被删除。
+"""
+import asyncio
+from models import Interview, session_scope
+from persistence import get_writer
+from conversation import get_session_store
+from orchestrator import Graph, AsyncAudioProcessor, StageTimeout, Cancelled
+from config import Config
+
+
+class InterviewFailed(Exception):
+    """一轮面试处理失败，status为对应的HTTP状态码"""
+
+    def __init__(self, error, status=500):
+        super().__init__(error)
+        self.error = error
+        self.status = status
+
+
+class InterviewCancelled(InterviewFailed):
+    """客户端取消了本轮面试"""
+
+    def __init__(self):
+        super().__init__('Interview cancelled', 499)
+
+
+def _save_interview(fields):
+    with session_scope() as session:
+        interview = Interview(**fields)
+        session.add(interview)
+        session.flush()
+        return interview.id
+
+
+def _delete_interview(interview_id):
+    with session_scope() as session:
+        session.query(Interview).filter(Interview.id == interview_id).delete()
+
+
+async def run_interview_async(context, audio, processor=None, cancelled=None):
+    """识别、对话、合成、上传和入库，返回(响应内容, 各阶段起止时间)
+
+    cancelled为threading.Event，被设置时取消尚未完成的阶段
+    """
+    processor = processor or AsyncAudioProcessor()
+    turn_index = context.next_turn()
+    graph = Graph()
+
+    # 用户音频直接从内存上传，与识别、对话、合成并行
+    print("Uploading to OSS in background...")
+    user_audio_url, user_upload = processor.upload_bytes(audio.to_wav_bytes(), '.wav')
+
+    async def upload_user(graph):
+        try:
+            await user_upload
+        except Exception as e:
+            print(f"Error uploading to OSS: {str(e)}")
+            raise InterviewFailed('Failed to upload file to OSS')
+        return user_audio_url
+
+    async def asr(graph):
+        # 优先把PCM直接送入实时识别，失败时再用OSS地址提交录音文件识别
+        print("Converting speech to text...")
+        user_text = None
+        if Config.ASR_DIRECT:
+            # 较长的回答在停顿处切开，各段同时识别
+            texts = await asyncio.gather(*(processor.recognize_pcm(chunk.tobytes(), audio.sample_rate)
+                                           for chunk in audio.chunks()))
+            if all(text is not None for text in texts):
+                user_text = ''.join(texts)
+        if user_text is None:
+            await graph.result('upload_user')
+            user_text = await processor.speech_to_text(user_audio_url)
+        if not user_text:
+            print("Speech to text conversion failed")
+            raise InterviewFailed('Speech to text failed')
+        return user_text
+
+    async def reply(graph):
+        user_text = await graph.result('asr')
+        messages = context.build_messages(user_text)
+        if Config.TTS_PIPELINE:
+            # 流式获取AI回复，每生成一句就开始合成
+            print("Getting AI response and converting to speech...")
+            ai_response, ai_audio = await processor.chat_and_speak(user_text, messages)
+        else:
+            print("Getting AI response...")
+            ai_response = await processor.chat_with_ai(user_text, messages)
+            if not ai_response:
+                print("Failed to get AI response")
+                raise InterviewFailed('Failed to get AI response')
+            print("Converting AI response to speech...")
+            ai_audio = await processor.synthesize(ai_response)
+        if not ai_audio:
+            print("Text to speech conversion failed")
+            raise InterviewFailed('Text to speech failed')
+        # 常用语句直接复用缓存中已上传的URL
+        ai_audio_url, ai_upload = processor.upload_speech(ai_response, ai_audio)
+        return ai_response, ai_audio_url, ai_upload
+
+    async def upload_ai(graph):
+        _, ai_audio_url, ai_upload = await graph.result('reply')
+        try:
+            await ai_upload
+        except Exception as e:
+            print(f"Error uploading to OSS: {str(e)}")
+            raise InterviewFailed('Failed to upload AI audio')
+        return ai_audio_url
+
+    async def db(graph):
+        user_text = await graph.result('asr')
+        ai_response, ai_audio_url, _ = await graph.result('reply')
+        print("Saving to database...")
+        fields = {
+            'user_audio_path': user_audio_url,
+            'user_text': user_text,
+            'ai_response_text': ai_response,
+            'ai_audio_path': ai_audio_url,
+            'session_id': context.session_id,
+            'turn_index': turn_index,
+        }
+        try:
+            if Config.DB_WRITE_BEHIND:
+                # 与其他请求的记录合并提交；非durable时不等待提交
+                writer = get_writer()
+                saved = writer.add(fields)
+                graph.on_rollback(lambda: writer.discard(saved))
+                return await asyncio.wrap_future(saved) if Config.DB_WRITE_DURABLE else None
+            interview_id = await processor.call(_save_interview, fields)
+        except Exception as e:
+            print(f"Database error: {str(e)}")
+            raise InterviewFailed('Database error')
+        graph.on_rollback(lambda: _delete_interview(interview_id))
+        return interview_id
+
+    async def session_update(graph):
+        user_text = await graph.result('asr')
+        ai_response, _, _ = await graph.result('reply')
+        await processor.call(get_session_store().record_turn, context, user_text, ai_response, turn_index)
+
+    graph.add('upload_user', upload_user)
+    graph.add('asr', asr)
+    graph.add('reply', reply, deps=['asr'])
+    graph.add('upload_ai', upload_ai, deps=['reply'])
+    graph.add('db', db, deps=['asr', 'reply'])
+    graph.add('session_update', session_update, deps=['db', 'upload_user', 'upload_ai'])
+
+    try:
+        results = await graph.run(cancelled)
+    except InterviewFailed:
+        raise
+    except StageTimeout as e:
+        raise InterviewFailed(str(e), 504)
+    except Cancelled:
+        raise InterviewCancelled()
+    except Exception as e:
+        raise InterviewFailed(str(e))
+
+    print("Interview processing completed successfully")
+    ai_response, ai_audio_url, _ = results['reply']
+    return {
+        'user_text': results['asr'],
+        'ai_response': ai_response,
+        'ai_audio_url': ai_audio_url,
+        'session_id': context.session_id
+    }, graph.timings
+
+
+def run_interview(context, audio, cancelled=None):
+    """同步调用入口（请求线程或任务队列的工作线程中），返回响应内容"""
+    result, _ = asyncio.run(run_interview_async(context, audio, cancelled=cancelled))
+    return result
@@ -0,0 +1,238 @@
+"""面试任务队列
+
+提交即返回任务ID，由固定数量的工作线程按顺序处理；
+排队的任务达到上限时拒绝新任务并给出建议的重试等待时间，避免请求堆积拖垮整个服务。
+接口先用reserve()占住排队位置再解码音频，队列已满时被拒绝的请求不消耗解码和数据库写入；
+排队中被取消的任务立即让出位置。
+处理流程以等待外部服务为主，线程足够，且可以共享进程内的客户端池和各类缓存。
+"""
+import math
+import time
+import uuid
+import queue
+import threading
+import contextvars
+from collections import OrderedDict
+from metrics import Histogram, REGISTRY, log_event
+from config import Config
+
+JOB_QUEUE_SECONDS = REGISTRY.register(Histogram(
+    'interview_job_queue_seconds', '任务从提交到开始处理的排队时间'))
+JOB_RUN_SECONDS = REGISTRY.register(Histogram(
+    'interview_job_run_seconds', '任务处理耗时', ('status',)))
+
+
+class QueueFull(Exception):
+    """排队任务已满，retry_after为建议的重试等待秒数"""
+
+    def __init__(self, retry_after):
+        super().__init__('Job queue is full')
+        self.retry_after = retry_after
+
+
+class Job:
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, func, args, cancellable=False):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.args = args
+        # cancellable的任务函数需接受cancelled参数（threading.Event），被设置时应尽快停止
+        self.cancellable = cancellable
+        self.cancelled = threading.Event()
+        # 带上提交时的上下文（请求ID等）
+        self.context = contextvars.copy_context()
+        self.status = Job.QUEUED
+        self.result = None
+        self.error = None
+        self.status_code = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (Job.SUCCEEDED, Job.FAILED, Job.CANCELLED)
+
+    def to_dict(self, position=None):
+        item = {
+            'job_id': self.id,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if position is not None:
+            item['position'] = position
+        if self.status == Job.SUCCEEDED:
+            item['result'] = self.result
+        elif self.status == Job.FAILED:
+            item['error'] = self.error
+            item['status_code'] = self.status_code
+        return item
+
+
+class JobQueue:
+    """有界队列+工作线程池；完成的任务保留result_ttl秒供查询"""
+
+    def __init__(self, workers=Config.JOB_WORKERS, capacity=Config.JOB_QUEUE_SIZE,
+                 result_ttl=Config.JOB_RESULT_TTL):
+        self.workers = workers
+        self.capacity = capacity
+        self.result_ttl = result_ttl
+        # 容量由_pending控制：已占用的位置 = 排队中的任务 + 已预留还未提交的
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        # 近期任务处理耗时的滑动平均，用于估算Retry-After
+        self._average_run = None
+        self.stats = {'submitted': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0}
+
+    def _start(self):
+        """首次提交时启动工作线程（调用方持有锁）"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'interview-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def reserve(self):
+        """预留一个排队位置，队列已满时抛出QueueFull；之后应submit(reserved=True)或release()"""
+        with self._lock:
+            self._expire()
+            if self._pending >= self.capacity:
+                self.stats['rejected'] += 1
+                raise QueueFull(self.retry_after())
+            self._pending += 1
+
+    def release(self):
+        """归还reserve()预留的位置（请求校验失败时）"""
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, func, *args, cancellable=False, reserved=False):
+        """提交任务，队列已满时抛出QueueFull；reserved为True时使用已预留的位置"""
+        if not reserved:
+            self.reserve()
+        job = Job(func, args, cancellable)
+        with self._lock:
+            self._start()
+            self._queue.put_nowait(job)
+            self._jobs[job.id] = job
+            self.stats['submitted'] += 1
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """取消任务：排队中的立即结束并让出位置，执行中的通知其停止；返回任务，不存在时返回None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancelled.set()
+            if job.status != Job.QUEUED:
+                return job
+            job.status = Job.CANCELLED
+            job.finished_at = time.time()
+            job.args = None
+            self._pending -= 1
+            self.stats['cancelled'] += 1
+        job.done.set()
+        return job
+
+    def position(self, job):
+        """任务前面还有几个排队的任务"""
+        with self._lock:
+            ahead = 0
+            for other in self._jobs.values():
+                if other is job:
+                    return ahead
+                if other.status == Job.QUEUED:
+                    ahead += 1
+        return None
+
+    def retry_after(self):
+        """按排队任务数和平均处理耗时估算多久后会有空位（秒）"""
+        average = self._average_run or Config.JOB_DEFAULT_DURATION
+        return max(1, math.ceil(self._pending / self.workers * average))
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                # 排队中已被取消的任务在cancel()中已结束
+                if job.status == Job.CANCELLED:
+                    self._queue.task_done()
+                    continue
+                self._pending -= 1
+                job.started_at = time.time()
+                job.status = Job.RUNNING
+            JOB_QUEUE_SECONDS.observe(job.started_at - job.created_at)
+            try:
+                if job.cancellable:
+                    job.result = job.context.run(job.func, *job.args, cancelled=job.cancelled)
+                    job.status = Job.SUCCEEDED
+                else:
+                    job.result = job.context.run(job.func, *job.args)
+                    job.status = Job.SUCCEEDED
+            except Exception as e:
+                job.error = getattr(e, 'error', None) or str(e)
+                job.status_code = getattr(e, 'status', 500)
+                job.status = Job.CANCELLED if job.cancelled.is_set() else Job.FAILED
+                print(f"Error in interview job {job.id}: {job.error}")
+            job.finished_at = time.time()
+            duration = job.finished_at - job.started_at
+            JOB_RUN_SECONDS.observe(duration, status=job.status)
+            job.context.run(log_event, 'job', job_id=job.id, status=job.status,
+                            queue_ms=round((job.started_at - job.created_at) * 1000, 1),
+                            run_ms=round(duration * 1000, 1))
+            with self._lock:
+                self.stats[job.status] += 1
+                if job.status != Job.CANCELLED:
+                    self._average_run = duration if self._average_run is None \
+                        else 0.8 * self._average_run + 0.2 * duration
+            # 释放参数（音频数据）
+            job.args = None
+            job.done.set()
+            self._queue.task_done()
+
+    def _expire(self):
+        """清理超过保留时间的已完成任务（调用方持有锁）"""
+        deadline = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < deadline]:
+            del self._jobs[job_id]
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['queued'] = sum(1 for job in self._jobs.values() if job.status == Job.QUEUED)
+            stats['reserved'] = self._pending
+            stats['running'] = sum(1 for job in self._jobs.values() if job.status == Job.RUNNING)
+            stats['workers'] = self.workers
+            stats['capacity'] = self.capacity
+        return stats
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """进程内共享的任务队列"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
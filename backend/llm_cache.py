@@ -0,0 +1,189 @@
+"""对话回复缓存
+
+候选人经常说一些很短的固定用语（“你好”“可以开始了”“我没听清”“下一题”），
+对同一个问题说同样的话时，模型的回复基本一样，没必要每次都调用qwen-plus。
+    精确匹配：去掉标点、空白并统一大小写后的文本相同
+    近似匹配（默认关闭）：字符二元组的Jaccard相似度不低于阈值（“能再说一遍吗”≈“可以再说一遍吗”），
+        否定词（不、没、别、未、无）不同时不算相似，“不可以开始了”不会命中“可以开始了”
+缓存键带上上一条面试官的话（候选人在回应什么），开场时为空；
+超过max_chars的输入是实质性的回答，与上下文强相关，直接跳过缓存。
+按条数LRU淘汰，超过TTL的条目视为失效。
+"""
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from config import Config
+
+_PUNCTUATION = re.compile(r'[\s\W_]+', re.UNICODE)
+_NEGATIONS = '不没别未无'
+
+
+def normalize(text):
+    """全角转半角、小写、去掉标点和空白"""
+    return _PUNCTUATION.sub('', unicodedata.normalize('NFKC', text or '').lower())
+
+
+def ngrams(text, n=2):
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def negations(text):
+    """文本中各否定词的个数"""
+    return tuple(text.count(word) for word in _NEGATIONS)
+
+
+def context_scope(messages):
+    """候选人回应的上一条面试官回复，没有时（开场）为空"""
+    for message in reversed(messages or []):
+        if message.get('role') == 'assistant':
+            return hashlib.sha256(normalize(message['content']).encode('utf-8')).hexdigest()[:16]
+    return ''
+
+
+class _Entry:
+    __slots__ = ('reply', 'grams', 'negations', 'expires', 'latency')
+
+    def __init__(self, reply, grams, negations, expires, latency):
+        self.reply = reply
+        self.grams = grams
+        self.negations = negations
+        self.expires = expires
+        self.latency = latency
+
+
+class ReplyCache:
+    """线程安全的回复缓存"""
+
+    def __init__(self, capacity=Config.LLM_CACHE_SIZE, ttl=Config.LLM_CACHE_TTL,
+                 similarity=Config.LLM_CACHE_SIMILARITY, max_chars=Config.LLM_CACHE_MAX_CHARS):
+        self.capacity = capacity
+        self.ttl = ttl
+        # 为None时只做精确匹配
+        self.similarity = similarity
+        self.max_chars = max_chars
+        self._entries = OrderedDict()  # (scope, 规整后的文本) -> _Entry
+        self._index = {}  # (scope, 二元组) -> {键}
+        self._lock = threading.Lock()
+        self.stats = {
+            'exact_hits': 0,
+            'similar_hits': 0,
+            'misses': 0,
+            'bypassed': 0,
+            'expired': 0,
+            'stores': 0,
+            'evictions': 0,
+            'saved_seconds': 0.0,
+        }
+
+    def _key(self, text, messages):
+        """返回缓存键，不适合缓存时返回None"""
+        normalized = normalize(text)
+        if not normalized or len(normalized) > self.max_chars:
+            return None
+        return context_scope(messages), normalized
+
+    def get(self, text, messages=None):
+        """查找回复，未命中时返回None"""
+        key = self._key(text, messages)
+        with self._lock:
+            if key is None:
+                self.stats['bypassed'] += 1
+                return None
+            entry = self._lookup(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['saved_seconds'] += entry.latency
+            return entry.reply
+
+    def _lookup(self, key):
+        """调用方持有锁"""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires < now:
+                self._remove(key)
+                self.stats['expired'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['exact_hits'] += 1
+            return entry
+        if self.similarity is None:
+            return None
+
+        scope, normalized = key
+        grams = ngrams(normalized)
+        negated = negations(normalized)
+        candidates = set()
+        for gram in grams:
+            candidates |= self._index.get((scope, gram), set())
+        best, best_score = None, self.similarity
+        for candidate in candidates:
+            other = self._entries[candidate]
+            # 意思相反的话不能共用回复
+            if other.negations != negated:
+                continue
+            score = len(grams & other.grams) / float(len(grams | other.grams))
+            if score >= best_score and other.expires >= now:
+                best, best_score = candidate, score
+        if best is None:
+            return None
+        self._entries.move_to_end(best)
+        self.stats['similar_hits'] += 1
+        return self._entries[best]
+
+    def put(self, text, reply, messages=None, latency=0.0):
+        """保存回复，latency为这次调用模型的耗时，命中时计入节省的时间"""
+        key = self._key(text, messages)
+        if key is None or not reply:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            grams = ngrams(key[1])
+            self._entries[key] = _Entry(reply, grams, negations(key[1]), time.time() + self.ttl, latency)
+            for gram in grams:
+                self._index.setdefault((key[0], gram), set()).add(key)
+            self.stats['stores'] += 1
+            while len(self._entries) > self.capacity:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def _remove(self, key):
+        """调用方持有锁"""
+        entry = self._entries.pop(key)
+        for gram in entry.grams:
+            keys = self._index.get((key[0], gram))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[(key[0], gram)]
+
+    def snapshot(self):
+        """命中率和节省的模型调用时间"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        hits = stats['exact_hits'] + stats['similar_hits']
+        stats['hit_rate'] = round(hits / (hits + stats['misses']), 3) if hits + stats['misses'] else 0.0
+        stats['saved_seconds'] = round(stats['saved_seconds'], 3)
+        stats['timestamp'] = time.time()
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_reply_cache():
+    """进程内共享的回复缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReplyCache()
+        return _cache
@@ -0,0 +1,256 @@
+"""请求各阶段的耗时跟踪、计数指标和结构化日志
+
+span()记录一个阶段的耗时和成败，写入按阶段划分的直方图，并输出一行带请求ID的JSON日志；
+日志先放入内存队列，由后台线程格式化并写到标准输出，请求线程不会被输出阻塞。
+render()按Prometheus文本格式输出全部指标，供/metrics接口使用。
+"""
+import sys
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from config import Config
+
+# 默认的直方图分桶（秒），覆盖从毫秒级的本地处理到数十秒的识别任务
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram:
+    """累计分桶的直方图"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # 标签 -> [各分桶计数..., 总数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-2] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        samples = []
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((self.name + '_bucket',
+                                _format_labels(self.labelnames, key, [('le', repr(float(bound)))]),
+                                cumulative))
+            samples.append((self.name + '_bucket', _format_labels(self.labelnames, key, [('le', '+Inf')]),
+                            counts[-2]))
+            samples.append((self.name + '_count', _format_labels(self.labelnames, key), counts[-2]))
+            samples.append((self.name + '_sum', _format_labels(self.labelnames, key), round(counts[-1], 6)))
+        return samples
+
+
+class Registry:
+    """指标集合；collector为返回[(名称, 说明, 类型, 值)]的函数，用于导出已有模块的统计"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+        for collector in self._collectors:
+            try:
+                gauges = collector()
+            except Exception as e:
+                log_event('collector_error', error=str(e))
+                continue
+            for name, help, kind, value in gauges:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'interview_requests_total', '按接口和状态码统计的请求数', ('endpoint', 'status')))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'interview_request_seconds', '请求总耗时', ('endpoint',)))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'interview_stage_seconds', '各处理阶段耗时', ('stage',)))
+STAGE_FAILURES = REGISTRY.register(Counter(
+    'interview_stage_failures_total', '各处理阶段失败次数', ('stage', 'reason')))
+RETRIES = REGISTRY.register(Counter(
+    'interview_retries_total', '对外部服务的重试次数', ('stage',)))
+TIMEOUTS = REGISTRY.register(Counter(
+    'interview_timeouts_total', '对外部服务的超时次数', ('stage',)))
+TTS_FIRST_PACKAGE = REGISTRY.register(Histogram(
+    'tts_first_package_seconds', '语音合成首包时延'))
+FIRST_AUDIO = REGISTRY.register(Histogram(
+    'interview_first_audio_seconds', '开始生成回复到得到第一段AI语音的耗时'))
+
+
+# 请求ID在请求线程内设置，提交到线程池的任务需用contextvars.copy_context()带过去
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+
+def set_request_id(request_id=None):
+    """设置当前请求ID，为空时生成新的，返回该ID"""
+    request_id = request_id or uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    return request_id
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+# 当前请求各阶段的耗时（毫秒），用于Server-Timing响应头；线程池和协程中的阶段共享同一个dict
+_timings = contextvars.ContextVar('timings', default=None)
+
+
+def start_timings():
+    """开始收集当前请求中各span的耗时，返回{阶段: 毫秒}"""
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+def server_timing(timings, total=None):
+    """格式化为Server-Timing响应头，如：asr;dur=312.5, reply;dur=1450.0, total;dur=1890.2"""
+    entries = [f"{stage};dur={ms}" for stage, ms in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={round(total * 1000, 1)}")
+    return ', '.join(entries)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """直接把日志记录放入队列，格式化推迟到后台线程"""
+
+    def prepare(self, record):
+        return record
+
+
+class _JSONFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+logger = logging.getLogger('interview.events')
+logger.propagate = False
+logger.setLevel(logging.INFO if Config.METRICS_LOG_EVENTS else logging.WARNING)
+_log_queue = queue.SimpleQueue()
+logger.addHandler(_DeferredQueueHandler(_log_queue))
+_stdout_handler = logging.StreamHandler(sys.stdout)
+_stdout_handler.setFormatter(_JSONFormatter())
+_listener = QueueListener(_log_queue, _stdout_handler)
+_listener.start()
+
+
+def log_event(event, **fields):
+    """输出一行结构化日志（非阻塞），自动带上当前请求ID"""
+    if logger.isEnabledFor(logging.INFO):
+        fields.update(event=event, request_id=_request_id.get(), ts=round(time.time(), 3))
+        logger.info(fields)
+
+
+class Span:
+    """一个阶段的执行记录；阶段以返回值表示失败时调用fail()"""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.failed = None
+
+    def fail(self, reason):
+        self.failed = reason
+
+
+@contextmanager
+def span(stage, **fields):
+    """记录一个阶段的耗时；抛出异常或调用fail()时计为失败"""
+    current = Span(stage)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.fail(type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            # 同名阶段（如两次上传）取最长的一次
+            timings[stage] = max(timings.get(stage, 0.0), round(elapsed * 1000, 1))
+        if current.failed:
+            STAGE_FAILURES.inc(stage=stage, reason=current.failed)
+            if 'Timeout' in current.failed:
+                TIMEOUTS.inc(stage=stage)
+        log_event('span', stage=stage, ms=round(elapsed * 1000, 1),
+                  ok=not current.failed, error=current.failed, **fields)
+
+
+def render():
+    """Prometheus文本格式的全部指标"""
+    return REGISTRY.render()
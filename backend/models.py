@@ -1,12 +1,89 @@
+import threading
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from contextlib import contextmanager
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, DateTime, Text, Index, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session as _Session
 from config import Config
 
 Base = declarative_base()
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
-Session = sessionmaker(bind=engine)
+
+
+def make_engine(uri=Config.SQLALCHEMY_DATABASE_URI):
+    """创建带连接池配置的引擎；SQLite（基准测试）使用SQLAlchemy的默认连接池"""
+    if uri.startswith('sqlite'):
+        return create_engine(uri, connect_args={'check_same_thread': False})
+    return create_engine(
+        uri,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=Config.DB_POOL_PRE_PING,
+    )
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Session绑定的引擎；未用Session.configure(bind=...)指定时，首次使用才创建（导入驱动、建立连接池）"""
+    global _engine
+    bind = Session.kw.get('bind')
+    if bind is not None:
+        return bind
+    with _engine_lock:
+        if _engine is None:
+            _engine = make_engine()
+        return _engine
+
+
+class _LazySession(_Session):
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind or get_engine(), **kwargs)
+
+
+# 导入models时不连接数据库，第一次创建会话时才创建引擎
+Session = sessionmaker(class_=_LazySession)
+
+
+@contextmanager
+def session_scope():
+    """一次事务：正常结束时提交，出错时回滚，总是关闭会话归还连接"""
+    session = Session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def pool_status():
+    """连接池使用情况，用于监控；引擎尚未创建时为空"""
+    bind = Session.kw.get('bind') or _engine
+    if bind is None:
+        return {}
+    pool = bind.pool
+    stats = {}
+    for name in ('size', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+class InterviewSession(Base):
+    """一场多轮面试，每一轮是一条Interview记录"""
+    __tablename__ = 'interview_sessions'
+
+    id = Column(String(36), primary_key=True)  # uuid
+    summary = Column(Text)  # 已折叠轮次的滚动摘要
+    summarized_turns = Column(Integer, default=0)  # 已折叠进摘要的轮数
+    turn_count = Column(Integer, default=0)  # 总轮数
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Interview(Base):
     __tablename__ = 'interviews'
@@ -17,7 +94,40 @@ class Interview(Base):
     ai_response_text = Column(Text)  # AI回复文字
     ai_audio_path = Column(String(255))  # AI音频文件路径
     created_at = Column(DateTime, default=datetime.utcnow)
+    session_id = Column(String(36), ForeignKey('interview_sessions.id'), nullable=True)  # 所属面试会话
+    turn_index = Column(Integer)  # 在会话中的轮次，从1开始
+
+    __table_args__ = (
+        # 历史记录按(created_at, id)倒序做游标分页
+        Index('ix_interviews_created_at_id', 'created_at', 'id'),
+        # 加载会话最近几轮
+        Index('ix_interviews_session_turn', 'session_id', 'turn_index'),
+    )
+
+class Transcript(Base):
+    """批量识别的结果，每个录音文件一条"""
+    __tablename__ = 'transcripts'
+
+    id = Column(Integer, primary_key=True)
+    source = Column(String(255), index=True)  # 本地文件路径或对象URL
+    file_url = Column(String(255))  # 提交识别的对象URL
+    text = Column(Text)  # 全文
+    sentences = Column(Text)  # 逐句结果JSON：[{begin_time, end_time, text}]，时间单位毫秒
+    interview_id = Column(Integer, ForeignKey('interviews.id'), nullable=True)  # 回填的面试记录
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 # 创建数据库表
 def init_db():
-    Base.metadata.create_all(engine) 
\ No newline at end of file
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    # 旧版本创建的interviews表没有会话相关的列，补上
+    existing = {column['name'] for column in inspect(engine).get_columns('interviews')}
+    with engine.begin() as conn:
+        for column in (Interview.__table__.c.session_id, Interview.__table__.c.turn_index):
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE interviews ADD COLUMN {column.name} {column_type}'))
+    # 已存在的表不会被create_all补建索引，这里单独检查
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True) 
\ No newline at end of file
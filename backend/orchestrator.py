@@ -0,0 +1,152 @@
+"""按依赖关系并发执行的异步流程编排
+
+流程拆成若干阶段，每个阶段声明依赖的阶段；没有依赖关系的阶段同时执行，
+总耗时等于关键路径而不是各阶段之和。每个阶段有独立的超时，
+任一阶段失败或外部取消时，其余阶段被取消并执行已登记的回滚操作。
+
+AsyncAudioProcessor把AudioProcessor中阻塞的SDK调用放到线程池中执行，供各阶段await。
+注意：超时或取消只是不再等待线程池中的调用，已经发出的SDK请求会在后台执行完。
+"""
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from metrics import span
+from config import Config
+
+# 执行阻塞调用的线程池
+_executor = ThreadPoolExecutor(max_workers=Config.ORCHESTRATOR_WORKERS, thread_name_prefix='stage')
+
+
+class StageTimeout(Exception):
+    """阶段超时"""
+
+    def __init__(self, stage, timeout):
+        super().__init__(f"Stage {stage} timed out after {timeout}s")
+        self.stage = stage
+
+
+class Cancelled(Exception):
+    """流程被外部取消"""
+
+
+class Graph:
+    """一组带依赖关系的异步阶段
+
+    阶段函数为async def func(graph)，可以用await graph.result(name)获取其他阶段的结果，
+    既可以在add时声明依赖，也可以在阶段内部按需等待（如识别失败时才需要上传完成）。
+    """
+
+    def __init__(self, timeouts=None):
+        self.timeouts = Config.STAGE_TIMEOUTS if timeouts is None else timeouts
+        self.timings = {}  # 阶段 -> (开始, 结束)，相对流程开始的秒数
+        self._stages = {}
+        self._tasks = {}
+        self._rollbacks = []
+        self._started = None
+
+    def add(self, name, func, deps=()):
+        self._stages[name] = (func, tuple(deps))
+
+    async def result(self, name):
+        # shield：等待方被取消时不连带取消被等待的阶段
+        return await asyncio.shield(self._tasks[name])
+
+    def on_rollback(self, func):
+        """登记流程失败时需要执行的补偿操作（同步函数，在线程池中执行）"""
+        self._rollbacks.append(func)
+
+    async def _run_stage(self, name, func, deps):
+        for dep in deps:
+            await self.result(dep)
+        timeout = self.timeouts.get(name)
+        start = time.monotonic()
+        with span(name) as current:
+            try:
+                return await asyncio.wait_for(func(self), timeout)
+            except asyncio.TimeoutError:
+                current.fail('Timeout')
+                raise StageTimeout(name, timeout)
+            except asyncio.CancelledError:
+                current.fail('cancelled')
+                raise
+            finally:
+                self.timings[name] = (start - self._started, time.monotonic() - self._started)
+
+    async def _watch(self, cancelled):
+        """cancelled（threading.Event）被设置时结束流程"""
+        while not cancelled.is_set():
+            await asyncio.sleep(Config.ORCHESTRATOR_CANCEL_POLL)
+        raise Cancelled('Cancelled by client')
+
+    async def run(self, cancelled=None):
+        """执行全部阶段，返回{阶段: 结果}；失败时取消其余阶段、回滚并抛出第一个异常"""
+        self._started = time.monotonic()
+        self._tasks = {name: asyncio.ensure_future(self._run_stage(name, func, deps))
+                       for name, (func, deps) in self._stages.items()}
+        pending = set(self._tasks.values())
+        watcher = None
+        if cancelled is not None:
+            watcher = asyncio.ensure_future(self._watch(cancelled))
+            pending.add(watcher)
+
+        error = None
+        while error is None and not all(task.done() for task in self._tasks.values()):
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            error = next((task.exception() for task in done
+                          if not task.cancelled() and task.exception() is not None), None)
+        if watcher is not None:
+            watcher.cancel()
+        if error is None:
+            return {name: task.result() for name, task in self._tasks.items()}
+
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        for rollback in reversed(self._rollbacks):
+            try:
+                await loop.run_in_executor(_executor, rollback)
+            except Exception as e:
+                print(f"Error rolling back: {str(e)}")
+        raise error
+
+
+class AsyncAudioProcessor:
+    """AudioProcessor的异步包装"""
+
+    def __init__(self, processor=None, executor=None):
+        if processor is None:
+            from utils import AudioProcessor
+            processor = AudioProcessor()
+        self.processor = processor
+        self.executor = executor or _executor
+
+    async def call(self, func, *args):
+        """在线程池中执行阻塞调用，带上当前上下文（请求ID）"""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, func, *args)
+
+    def upload_bytes(self, data, extension):
+        """开始后台上传，立即返回(URL, 可await的上传结果)"""
+        url, future = self.processor.upload_bytes_async(data, extension)
+        return url, asyncio.wrap_future(future)
+
+    def upload_speech(self, text, audio):
+        url, future = self.processor.upload_speech(text, audio)
+        return url, asyncio.wrap_future(future)
+
+    async def recognize_pcm(self, pcm, sample_rate=Config.AUDIO_SAMPLE_RATE):
+        return await self.call(self.processor.recognize_pcm, pcm, sample_rate)
+
+    async def speech_to_text(self, file_url):
+        return await self.call(self.processor.speech_to_text, file_url)
+
+    async def chat_with_ai(self, user_input, messages=None):
+        return await self.call(self.processor.chat_with_ai, user_input, messages)
+
+    async def chat_and_speak(self, user_input, messages=None):
+        return await self.call(self.processor.chat_and_speak, user_input, messages)
+
+    async def synthesize(self, text):
+        return await self.call(self.processor.synthesize, text)
@@ -0,0 +1,173 @@
+"""面试记录的后台合并写入（write-behind）
+
+各请求把要写入的记录交给后台线程，后台线程把同一时间段内的多条记录放在一个事务中提交，
+并发时每轮不再各自占一个连接、各做一次提交往返。
+durable的记录到达后立即触发提交，调用方等待提交完成（上一批正在提交时新记录自然合并到下一批）；
+非durable的记录放入缓冲即返回，最多等待flush_delay秒凑批。
+非durable模式下进程崩溃会丢失尚未提交的记录，且记录提交前从数据库中读不到。
+"""
+import time
+import threading
+from concurrent.futures import Future
+from models import Session, Interview, session_scope
+from metrics import Histogram, REGISTRY, STAGE_FAILURES
+from config import Config
+
+DB_WRITE_BATCH = REGISTRY.register(Histogram(
+    'interview_db_write_batch_rows', '每次提交写入的记录数', buckets=(1, 2, 4, 8, 16, 32, 64)))
+DB_WRITE_DELAY = REGISTRY.register(Histogram(
+    'interview_db_write_delay_seconds', '记录从加入缓冲到提交完成的耗时'))
+
+
+class _Pending:
+    __slots__ = ('fields', 'future', 'added', 'durable')
+
+    def __init__(self, fields, durable):
+        self.fields = fields
+        self.future = Future()
+        self.added = time.monotonic()
+        self.durable = durable
+
+
+class InterviewWriter:
+    """合并提交Interview记录；add返回Future，结果为记录ID"""
+
+    def __init__(self, batch_size=Config.DB_WRITE_BATCH_SIZE, flush_delay=Config.DB_WRITE_FLUSH_DELAY):
+        self.batch_size = batch_size
+        self.flush_delay = flush_delay
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.stats = {'rows': 0, 'commits': 0, 'failed': 0, 'discarded': 0}
+
+    def add(self, fields, durable=Config.DB_WRITE_DURABLE):
+        """加入缓冲，返回Future；durable时应等待其结果再认为记录已保存"""
+        pending = _Pending(fields, durable)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Writer has been closed')
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+            self._buffer.append(pending)
+            self._cond.notify()
+        return pending.future
+
+    def discard(self, future):
+        """撤销一条记录：还在缓冲中的直接丢弃，已提交的从数据库删除"""
+        with self._cond:
+            for pending in self._buffer:
+                if pending.future is future:
+                    self._buffer.remove(pending)
+                    future.cancel()
+                    self.stats['discarded'] += 1
+                    return
+        try:
+            interview_id = future.result()
+        except Exception:
+            return
+        with session_scope() as session:
+            session.query(Interview).filter(Interview.id == interview_id).delete()
+        self.stats['discarded'] += 1
+
+    def flush(self):
+        """提交缓冲中的全部记录并等待完成"""
+        with self._cond:
+            futures = [pending.future for pending in self._buffer]
+            for pending in self._buffer:
+                pending.durable = True
+            self._cond.notify()
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _ready(self):
+        """是否应该提交当前缓冲（调用方持有锁），返回还需等待的秒数或None"""
+        if len(self._buffer) >= self.batch_size or self._closed:
+            return None
+        if any(pending.durable for pending in self._buffer):
+            return None
+        return self._buffer[0].added + self.flush_delay - time.monotonic()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._buffer:
+                        if self._closed:
+                            return
+                        self._cond.wait()
+                        continue
+                    wait = self._ready()
+                    if wait is None or wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                batch, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+            self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            ids = self._insert(batch)
+        except Exception as e:
+            print(f"Error writing {len(batch)} interviews: {str(e)}")
+            if len(batch) > 1:
+                # 一条坏记录会让整批回滚，逐条重试，只让出错的记录失败
+                for pending in batch:
+                    self._commit([pending])
+                return
+            STAGE_FAILURES.inc(stage='db_write', reason=type(e).__name__)
+            with self._cond:
+                self.stats['failed'] += 1
+            batch[0].future.set_exception(e)
+            return
+        now = time.monotonic()
+        DB_WRITE_BATCH.observe(len(batch))
+        with self._cond:
+            self.stats['rows'] += len(batch)
+            self.stats['commits'] += 1
+        for pending, interview_id in zip(batch, ids):
+            DB_WRITE_DELAY.observe(now - pending.added)
+            pending.future.set_result(interview_id)
+
+    def _insert(self, batch):
+        """在一个事务中写入一批记录，返回记录ID；失败时回滚并抛出异常"""
+        rows = [Interview(**pending.fields) for pending in batch]
+        session = Session()
+        try:
+            session.add_all(rows)
+            # 在提交前取ID，提交后访问属性会逐条重新查询
+            session.flush()
+            ids = [row.id for row in rows]
+            session.commit()
+            return ids
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, buffered=len(self._buffer))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """进程内共享的写入器"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = InterviewWriter()
+        return _writer
@@ -0,0 +1,99 @@
+"""回复生成与语音合成的流水线
+
+大模型的回复以增量文本流式返回，按中英文句末标点切分，
+每凑齐一句就送去合成，生成和合成在两个线程中并行，
+听到第一句语音的时间从“完整生成+整段合成”缩短到大约“第一句生成+第一句合成”。
+"""
+import queue
+import threading
+import contextvars
+
+# 句子结束标点，遇到这些字符就把已生成的文本送去合成
+SENTENCE_ENDINGS = set('。！？；!?;\n')
+
+FALLBACK_REPLY = "抱歉，系统出现了问题。"
+
+
+class SentenceSplitter:
+    """把流式增量文本切分成完整的句子"""
+
+    def __init__(self, min_length=4):
+        self.min_length = min_length
+        self.buffer = ''
+
+    def feed(self, text):
+        """追加增量文本，返回已经完整的句子列表"""
+        sentences = []
+        for char in text:
+            self.buffer += char
+            if char in SENTENCE_ENDINGS or (char == ' ' and self.buffer[-2:-1] == '.'):
+                # 太短的片段（如“好。”）和下一句合并，避免合成大量零碎音频
+                if len(self.buffer.strip()) >= self.min_length:
+                    sentences.append(self.buffer.strip())
+                    self.buffer = ''
+        return sentences
+
+    def flush(self):
+        """返回剩余未结束的文本"""
+        rest = self.buffer.strip()
+        self.buffer = ''
+        return rest
+
+
+def speak_reply(chunks, synthesize, on_audio, on_text=None):
+    """边生成边逐句合成，返回完整的回复文本
+
+    chunks: 产出增量文本的迭代器（如AudioProcessor.stream_chat）
+    synthesize(sentence, on_audio): 合成一句，音频分片按顺序交给on_audio
+    on_text(delta): 每段增量文本到达时调用（可选）
+    生成一开始就失败时改为合成兜底回复；生成到一半失败（已有部分文本）或合成失败时异常直接抛出，
+    不完整的回复不能当作完整回复保存、加入上下文或缓存。
+    """
+    sentences = queue.Queue()
+    parts = []
+    errors = []
+    stopped = threading.Event()
+
+    def produce():
+        splitter = SentenceSplitter()
+        try:
+            for delta in chunks:
+                if stopped.is_set():
+                    break
+                parts.append(delta)
+                if on_text:
+                    on_text(delta)
+                for sentence in splitter.feed(delta):
+                    sentences.put(sentence)
+            rest = splitter.flush()
+            if rest:
+                sentences.put(rest)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            sentences.put(None)
+
+    # 带上当前上下文（请求ID、各阶段耗时），生成线程中记录的日志才能对应到请求
+    producer = threading.Thread(target=contextvars.copy_context().run, args=(produce,), daemon=True)
+    producer.start()
+    try:
+        while True:
+            sentence = sentences.get()
+            if sentence is None:
+                break
+            synthesize(sentence, on_audio)
+    finally:
+        # 合成出错时让生成线程尽快退出
+        stopped.set()
+    producer.join()
+
+    if errors and not parts:
+        print(f"Error in stream_reply: {str(errors[0])}")
+        if on_text:
+            on_text(FALLBACK_REPLY)
+        synthesize(FALLBACK_REPLY, on_audio)
+        return FALLBACK_REPLY
+    if errors:
+        print(f"Reply stream broke off after {len(''.join(parts))} characters")
+        raise errors[0]
+    return ''.join(parts)
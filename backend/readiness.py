@@ -0,0 +1,127 @@
+"""就绪检查和后台预热
+
+启动时不导入dashscope、oss2，也不连接数据库（见clients.py、models.py），各项在第一次使用时初始化。
+/api/ready第一次被调用（或直接运行app.py启动）时在后台线程中依次预热：
+    database  创建引擎并执行一次查询，连接池中留下一个可用连接
+    dashscope 导入SDK和实时识别、流式合成的回调模块，设置API key
+    storage   OSS存储时查询一次对象，建立到OSS的长连接
+    tts_pool  按TTS_POOL_SIZE预先建立语音合成器的WebSocket连接
+全部完成前返回503，自动扩缩容的新实例先通过存活检查，预热完成后再接收流量；
+有步骤失败时，下一次就绪检查只重试失败的步骤。
+"""
+import time
+import threading
+from sqlalchemy import text
+from models import get_engine
+from clients import get_pool, get_dashscope
+from config import Config
+
+
+def warm_database():
+    with get_engine().connect() as conn:
+        conn.execute(text('SELECT 1'))
+
+
+def warm_dashscope():
+    get_dashscope()
+    import realtime  # noqa: F401
+
+
+def warm_storage():
+    if Config.STORAGE_BACKEND == 'oss':
+        # 查询一个不存在的对象，404视为正常
+        get_pool().bucket.object_exists('__healthcheck__')
+
+
+def warm_tts_pool():
+    get_pool().warm_tts()
+
+
+STEPS = (
+    ('database', warm_database),
+    ('dashscope', warm_dashscope),
+    ('storage', warm_storage),
+    ('tts_pool', warm_tts_pool),
+)
+
+
+class Warmup:
+    """在后台线程中依次执行预热步骤，记录每一步的状态和耗时"""
+
+    PENDING, WARMING, READY, FAILED = 'pending', 'warming', 'ready', 'failed'
+
+    def __init__(self, steps=STEPS):
+        self.steps = steps
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started = None
+        self.components = {name: {'status': self.PENDING} for name, _ in steps}
+        self.stats = {'runs': 0, 'failures': 0, 'ready_seconds': 0.0}
+
+    @property
+    def ready(self):
+        with self._lock:
+            return all(component['status'] == self.READY for component in self.components.values())
+
+    def start(self):
+        """开始后台预热；正在预热或已全部就绪时什么也不做"""
+        if self.ready:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._started is None:
+                self._started = time.perf_counter()
+            self.stats['runs'] += 1
+            self._thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        for name, func in self.steps:
+            with self._lock:
+                if self.components[name]['status'] == self.READY:
+                    continue
+                self.components[name] = {'status': self.WARMING}
+            start = time.perf_counter()
+            try:
+                func()
+                component = {'status': self.READY}
+            except Exception as e:
+                print(f"Warmup of {name} failed: {str(e)}")
+                component = {'status': self.FAILED, 'error': str(e)}
+            component['seconds'] = round(time.perf_counter() - start, 3)
+            with self._lock:
+                self.components[name] = component
+                if component['status'] == self.FAILED:
+                    self.stats['failures'] += 1
+        if self.ready:
+            with self._lock:
+                self.stats['ready_seconds'] = round(time.perf_counter() - self._started, 3)
+            print(f"Warmup finished in {self.stats['ready_seconds']:.2f}s")
+
+    def wait(self, timeout=None):
+        """等待本次预热结束，返回是否全部就绪"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.ready
+
+    def snapshot(self):
+        ready = self.ready
+        with self._lock:
+            return {'ready': ready, 'components': {name: dict(component)
+                                                   for name, component in self.components.items()},
+                    **self.stats}
+
+
+_warmup = None
+_warmup_lock = threading.Lock()
+
+
+def get_warmup():
+    """进程内共享的预热器"""
+    global _warmup
+    with _warmup_lock:
+        if _warmup is None:
+            _warmup = Warmup()
+        return _warmup
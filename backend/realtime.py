@@ -0,0 +1,77 @@
+"""实时识别和流式合成的dashscope回调
+
+回调类要继承dashscope的基类，定义时就需要导入dashscope，因此放在单独的模块中，
+由utils在第一次实时识别或流式合成时才导入，启动时不加载dashscope。
+"""
+from dashscope.audio.asr import Recognition, RecognitionCallback, RecognitionResult
+from dashscope.audio.tts_v2 import ResultCallback
+from clients import get_dashscope
+from resilience import RETRYABLE_STATUS, UpstreamError
+
+
+class StreamingRecognizer(RecognitionCallback):
+    """实时识别：feed()送入音频，finish()等待并返回完整识别文本"""
+
+    def __init__(self, sample_rate, on_partial=None):
+        self.on_partial = on_partial
+        self.sentences = []
+        self.error = None
+        self.status_code = None
+        self.stopped = False
+        get_dashscope()
+        self.recognition = Recognition(
+            model='paraformer-realtime-v2',
+            format='pcm',
+            sample_rate=sample_rate,
+            callback=self,
+            language_hints=['zh', 'en']
+        )
+        self.recognition.start()
+
+    def on_event(self, result: RecognitionResult):
+        sentence = result.get_sentence()
+        if not sentence or 'text' not in sentence:
+            return
+        if RecognitionResult.is_sentence_end(sentence):
+            self.sentences.append(sentence['text'])
+            partial = ''.join(self.sentences)
+        else:
+            partial = ''.join(self.sentences) + sentence['text']
+        if self.on_partial:
+            self.on_partial(partial)
+
+    def on_error(self, result: RecognitionResult):
+        self.error = result.message
+        self.status_code = result.status_code
+
+    def feed(self, chunk):
+        self.recognition.send_audio_frame(chunk)
+
+    def finish(self):
+        self.stopped = True
+        self.recognition.stop()
+        if self.error:
+            if self.status_code in RETRYABLE_STATUS:
+                raise UpstreamError(self.status_code, self.error)
+            raise RuntimeError(f"Recognition failed: {self.error}")
+        return ''.join(self.sentences)
+
+    def close(self):
+        """放弃本次识别（客户端断开或重新开始），结束识别会话，不抛出异常；已经finish过时什么也不做"""
+        if self.stopped:
+            return
+        self.stopped = True
+        try:
+            self.recognition.stop()
+        except Exception as e:
+            print(f"Error closing recognition: {str(e)}")
+
+
+class AudioDataCallback(ResultCallback):
+    """把语音合成的音频分片转交给on_data"""
+
+    def __init__(self, on_data):
+        self.on_data_handler = on_data
+
+    def on_data(self, data):
+        self.on_data_handler(data)
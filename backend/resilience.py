@@ -0,0 +1,446 @@
+"""调用外部服务（OSS、语音识别、大模型、语音合成）的容错策略
+
+每个外部依赖一个Policy，参数都来自Config：
+    超时：调用放在该依赖专用的线程池中执行，超时后调用方不再等待；
+          线程池大小即该依赖最多占用的线程数，上游变慢时不会拖住全部工作线程
+    重试：有限次数，退避时间为[0, min(上限, 基数*2^n)]内的随机值（full jitter），避免同时重试；
+          只重试retry_on判断为暂时性的错误（默认为超时、连接错误、5xx和429），其余错误直接抛出
+    熔断：连续失败达到阈值后直接失败，冷却时间过后放行一个试探请求，成功才恢复；
+          不可重试的错误说明上游能正常响应，不计入熔断
+    对冲：延迟敏感的调用（语音合成）超过一定时间还没有结果时再发一个相同请求，取先返回的
+注意：超时只是不再等待，已经发出的SDK请求仍会在线程池中执行完；
+回调式的流（语音合成）超时或失败后，该次尝试的回调被关闭，不会再产出数据；
+迭代器式的流（大模型）在线程池中迭代，首项和相邻两项之间的等待都受超时限制，超时后停止迭代。
+"""
+import time
+import queue
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+from metrics import RETRIES, TIMEOUTS, STAGE_FAILURES
+from config import Config
+
+# 这些HTTP状态码表示上游暂时不可用，可以重试
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+# 本地文件错误虽然也是OSError，重试不会成功
+_LOCAL_ERRORS = (FileNotFoundError, FileExistsError, PermissionError, IsADirectoryError, NotADirectoryError)
+# 延迟导入的SDK中表示暂时不可用的异常
+_TRANSIENT_NAMES = ('ServiceUnavailableError', 'TimeoutException')
+
+# 对冲请求的外层等待放在单独的线程池中，避免与各依赖的线程池互相等待
+_hedge_executor = ThreadPoolExecutor(max_workers=Config.DEPENDENCY_WORKERS, thread_name_prefix='hedge')
+
+
+class CircuitOpen(Exception):
+    """熔断中，调用未发出"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} is unavailable, retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CallTimeout(Exception):
+    """调用超时"""
+
+    def __init__(self, name, timeout):
+        super().__init__(f"{name} call timed out after {timeout}s")
+        self.name = name
+
+
+class PartialFailure(Exception):
+    """已经产出了部分结果后失败，重试会产生重复的数据，不再重试"""
+
+
+class UpstreamError(Exception):
+    """上游返回了可重试的错误状态"""
+
+    def __init__(self, status_code, message=''):
+        super().__init__(f"Status {status_code}: {message}")
+        self.status_code = status_code
+
+
+def _status_of(e):
+    """异常携带的状态码：oss2为status，requests为response.status_code，dashscope为status_code或http_code"""
+    for name in ('status_code', 'status', 'http_code'):
+        status = getattr(e, name, None)
+        if isinstance(status, int):
+            return status
+    status = getattr(getattr(e, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(e):
+    """默认的重试条件：超时、连接错误和表示上游暂时不可用的状态码；参数、鉴权、404等错误重试也不会成功"""
+    if isinstance(e, PartialFailure) and e.__cause__ is not None:
+        e = e.__cause__
+    if isinstance(e, (CallTimeout, UpstreamError)) or type(e).__name__ in _TRANSIENT_NAMES:
+        return True
+    status = _status_of(e)
+    if status is not None:
+        # oss2用负数表示网络错误
+        return status in RETRYABLE_STATUS or status < 0
+    # 超时、连接错误（包括requests的异常）都是OSError
+    return isinstance(e, OSError) and not isinstance(e, _LOCAL_ERRORS)
+
+
+def check_status(response):
+    """DashScope的响应：可重试的状态码抛出UpstreamError，其余原样返回由调用方处理"""
+    if getattr(response, 'status_code', None) in RETRYABLE_STATUS:
+        raise UpstreamError(response.status_code, getattr(response, 'message', ''))
+    return response
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failures=Config.BREAKER_FAILURES, reset_timeout=Config.BREAKER_RESET_TIMEOUT):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = CircuitBreaker.CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """返回None表示放行，否则返回还需等待的秒数"""
+        with self._lock:
+            if self.state == CircuitBreaker.CLOSED:
+                return None
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            # 冷却结束，只放行一个试探请求
+            if self._probing:
+                return self.reset_timeout
+            self.state = CircuitBreaker.HALF_OPEN
+            self._probing = True
+            return None
+
+    def success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._probing = False
+            self.state = CircuitBreaker.CLOSED
+
+    def failure(self):
+        """返回True表示本次失败使熔断打开"""
+        with self._lock:
+            self._consecutive += 1
+            self._probing = False
+            if self.state == CircuitBreaker.HALF_OPEN or self._consecutive >= self.failures:
+                opened = self.state != CircuitBreaker.OPEN
+                self.state = CircuitBreaker.OPEN
+                self._opened_at = time.monotonic()
+                return opened
+            return False
+
+
+class Policy:
+    """一个外部依赖的超时、重试、熔断和对冲策略"""
+
+    def __init__(self, name, timeout=None, retries=0, workers=Config.DEPENDENCY_WORKERS,
+                 backoff=Config.RETRY_BACKOFF, max_backoff=Config.RETRY_MAX_BACKOFF,
+                 breaker=None, hedge_delay=None, retry_on=is_transient):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_on = retry_on
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_delay = hedge_delay
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'failures': 0, 'retries': 0, 'timeouts': 0,
+                      'rejected': 0, 'opened': 0, 'hedges': 0, 'hedge_wins': 0, 'not_retried': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _submit(self, func, *args, **kwargs):
+        # 带上当前上下文（请求ID）
+        return self._executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+    def _submit_call(self, func, *args):
+        """在对冲线程池中执行一次完整的call"""
+        return _hedge_executor.submit(contextvars.copy_context().run, self.call, func, *args)
+
+    def _submit_stream(self, func, on_data, *args):
+        """在对冲线程池中执行一次完整的_call_stream"""
+        return _hedge_executor.submit(contextvars.copy_context().run, self._call_stream, func, on_data, *args)
+
+    def _check_breaker(self):
+        retry_in = self.breaker.before_call()
+        if retry_in is not None:
+            self._count('rejected')
+            STAGE_FAILURES.inc(stage=self.name, reason='CircuitOpen')
+            raise CircuitOpen(self.name, retry_in)
+
+    def _failed(self, e):
+        """记录一次失败，返回是否可以重试"""
+        self._count('failures')
+        if not self.retry_on(e):
+            self._count('not_retried')
+            # 上游正常响应了（或是调用方的错误），不计入熔断；半开时也结束本次试探
+            self.breaker.success()
+            return False
+        if self.breaker.failure():
+            self._count('opened')
+            print(f"Circuit for {self.name} opened after: {str(e)}")
+        return True
+
+    def _sleep_before_retry(self, attempt):
+        self._count('retries')
+        RETRIES.inc(stage=self.name)
+        time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def _attempt(self, func, args, kwargs):
+        """执行一次调用，设置了超时时在专用线程池中执行"""
+        if self.timeout is None:
+            return func(*args, **kwargs)
+        future = self._submit(func, *args, **kwargs)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            self._count('timeouts')
+            TIMEOUTS.inc(stage=self.name)
+            raise CallTimeout(self.name, self.timeout)
+
+    def call(self, func, *args, **kwargs):
+        """带超时、重试和熔断地调用func，最后一次失败的异常原样抛出"""
+        self._count('calls')
+        for attempt in range(self.retries + 1):
+            self._check_breaker()
+            try:
+                result = self._attempt(func, args, kwargs)
+            except Exception as e:
+                if not self._failed(e) or attempt == self.retries or isinstance(e, PartialFailure):
+                    raise
+                print(f"Retrying {self.name} after error: {str(e)}")
+                self._sleep_before_retry(attempt)
+                continue
+            self.breaker.success()
+            return result
+
+    def stream(self, func, *args, **kwargs):
+        """func返回迭代器；在产出第一项之前失败时重试，之后的失败直接抛出（已产出的内容无法撤回）
+
+        设置了超时时，等待第一项和相邻两项之间的时间超过timeout都抛出CallTimeout
+        """
+        self._count('calls')
+        for attempt in range(self.retries + 1):
+            self._check_breaker()
+            started = False
+            try:
+                items = func(*args, **kwargs) if self.timeout is None else self._timed_items(func, args, kwargs)
+                for item in items:
+                    if not started:
+                        started = True
+                        self.breaker.success()
+                    yield item
+                if not started:
+                    self.breaker.success()
+                return
+            except GeneratorExit:
+                raise
+            except Exception as e:
+                if not self._failed(e) or started or attempt == self.retries:
+                    raise
+                print(f"Retrying {self.name} after error: {str(e)}")
+                self._sleep_before_retry(attempt)
+
+    def _timed_items(self, func, args, kwargs):
+        """在专用线程池中迭代func的结果，逐项经闸门交给调用方，每一项最多等待timeout秒"""
+        items = queue.Queue()
+        gate = _Gate(items.put)
+        self._submit(_pump, gate, func, args, kwargs)
+        try:
+            while True:
+                try:
+                    kind, value = items.get(timeout=self.timeout)
+                except queue.Empty:
+                    self._count('timeouts')
+                    TIMEOUTS.inc(stage=self.name)
+                    raise CallTimeout(self.name, self.timeout)
+                if kind == 'error':
+                    raise value
+                if kind == 'done':
+                    return
+                yield value
+        finally:
+            # 超时或调用方不再读取时，让迭代线程在下一项到达后停止
+            gate.close()
+
+    def _call_stream(self, func, on_data, *args):
+        """func(on_data, *args)以回调的方式产出数据，带超时、重试和熔断地调用
+
+        每次尝试的回调经过一个闸门，超时或失败后关闭，被放弃的尝试不能再产出数据；
+        已经产出过数据后的失败（包括超时）包装成PartialFailure，不再重试
+        """
+        self._count('calls')
+        for attempt in range(self.retries + 1):
+            self._check_breaker()
+            gate = _Gate(on_data)
+            try:
+                result = self._attempt(func, (gate.emit,) + args, {})
+            except Exception as e:
+                gate.close()
+                retryable = self._failed(e)
+                if gate.sent and not isinstance(e, PartialFailure):
+                    raise PartialFailure(f"failed after partial output: {str(e)}") from e
+                if not retryable or gate.sent or attempt == self.retries:
+                    raise
+                print(f"Retrying {self.name} after error: {str(e)}")
+                self._sleep_before_retry(attempt)
+                continue
+            self.breaker.success()
+            return result
+
+    def hedged(self, func, *args):
+        """hedge_delay秒内没有返回时再发起一个相同的调用，返回先成功的结果
+
+        两个调用都失败时抛出先发起的那个的异常；未设置hedge_delay时等同于call
+        """
+        if self.hedge_delay is None:
+            return self.call(func, *args)
+        primary = self._submit_call(func, *args)
+        done, _ = wait([primary], timeout=self.hedge_delay)
+        if done and primary.exception() is None:
+            return primary.result()
+        if not done:
+            self._count('hedges')
+        backup = self._submit_call(func, *args)
+        pending = {primary, backup}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count('hedge_wins')
+                    return future.result()
+        return primary.result()
+
+    def hedged_stream(self, func, on_data, *args):
+        """func(on_data, *args)以回调的方式流式产出数据（如语音合成）
+
+        hedge_delay秒内还没有收到第一段数据时再发起一个相同的请求，先产出数据的一路胜出，
+        另一路的数据直接丢弃。返回胜出一路的返回值。已经产出数据后失败的一路不重试。
+        """
+        if self.hedge_delay is None:
+            return self._call_stream(func, on_data, *args)
+        lock = threading.Lock()
+        first_data = threading.Event()
+        winner = []
+
+        def emitter(index):
+            def emit(data):
+                with lock:
+                    if not winner:
+                        winner.append(index)
+                        first_data.set()
+                if winner[0] == index:
+                    on_data(data)
+            return emit
+
+        futures = [self._submit_stream(func, emitter(0), *args)]
+        deadline = time.monotonic() + self.hedge_delay
+        while not first_data.is_set() and not futures[0].done():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            first_data.wait(min(remaining, 0.01))
+        if not first_data.is_set():
+            if not futures[0].done():
+                self._count('hedges')
+            if not futures[0].done() or futures[0].exception() is not None:
+                futures.append(self._submit_stream(func, emitter(1), *args))
+
+        # 等待胜出的一路结束；都还没有数据时等到有一路产出数据或全部结束
+        while True:
+            if winner:
+                result = futures[winner[0]].result()
+                if winner[0] == 1:
+                    self._count('hedge_wins')
+                return result
+            if all(future.done() for future in futures):
+                failed = next((future for future in futures if future.exception() is not None), None)
+                return (failed or futures[0]).result()
+            wait([future for future in futures if not future.done()], timeout=0.01)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['state'] = self.breaker.state
+        return stats
+
+
+class _Gate:
+    """一次流式尝试的输出闸门：close()返回后这次尝试不会再产出数据"""
+
+    def __init__(self, on_data):
+        self.on_data = on_data
+        self.sent = False
+        self._open = True
+        self._lock = threading.Lock()
+
+    def emit(self, data):
+        """交给on_data，闸门已关闭时丢弃并返回False"""
+        with self._lock:
+            if not self._open:
+                return False
+            self.sent = True
+            self.on_data(data)
+            return True
+
+    def close(self):
+        with self._lock:
+            self._open = False
+
+
+def _pump(gate, func, args, kwargs):
+    """迭代func的结果，逐项经闸门发出(类型, 值)，闸门关闭后停止迭代"""
+    try:
+        for item in func(*args, **kwargs):
+            if not gate.emit(('item', item)):
+                return
+        gate.emit(('done', None))
+    except Exception as e:
+        gate.emit(('error', e))
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(name):
+    """进程内共享的依赖策略，参数取自Config.DEPENDENCY_*"""
+    with _policies_lock:
+        policy = _policies.get(name)
+        if policy is None:
+            policy = Policy(
+                name,
+                timeout=Config.DEPENDENCY_TIMEOUTS.get(name),
+                retries=Config.DEPENDENCY_RETRIES.get(name, 0),
+                hedge_delay=Config.TTS_HEDGE_DELAY if name == 'tts' else None,
+            )
+            _policies[name] = policy
+        return policy
+
+
+def snapshot():
+    """各依赖的统计，熔断状态用数值表示（0关闭，1半开，2打开）"""
+    states = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+    with _policies_lock:
+        policies = list(_policies.values())
+    stats = {}
+    for policy in policies:
+        for key, value in policy.snapshot().items():
+            stats[f"{policy.name}_{key}"] = states[value] if key == 'state' else value
+    return stats
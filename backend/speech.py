@@ -0,0 +1,150 @@
+"""AI语音的输出格式
+
+cosyvoice按PCM16单声道合成，每条回复在本地用libsndfile编码为一个完整的MP3或Ogg Opus：
+    逐句合成的分片是PCM，直接拼接即可；原先逐句返回的MP3拼在一起，播放器读到的时长只有第一句
+    码率由TTS_BITRATE指定，容器中写入标题（回复文本）和音色
+    SpeechEncoder边合成边编码，新编码出的数据（MP3按帧、Ogg按页）立即交给回调，
+    实时接口的客户端收到第一帧就能开始播放
+"""
+import io
+import threading
+import numpy as np
+import soundfile as sf
+from config import Config
+
+# 格式 -> (扩展名, libsndfile格式, 子类型)
+FORMATS = {
+    'mp3': ('.mp3', 'MP3', 'MPEG_LAYER_III'),
+    'opus': ('.ogg', 'OGG', 'OPUS'),
+    'wav': ('.wav', 'WAV', 'PCM_16'),
+}
+# cosyvoice支持的PCM采样率
+SYNTHESIS_SAMPLE_RATES = (8000, 16000, 22050, 24000, 44100, 48000)
+OPUS_SAMPLE_RATES = (8000, 16000, 24000, 48000)
+
+
+def _bitrate_range(name, sample_rate):
+    """libsndfile把compression_level 0~1线性映射到的码率区间（bps），从高到低"""
+    if name == 'opus':
+        return 256000, 6000
+    if sample_rate >= 32000:
+        return 320000, 32000  # MPEG-1
+    if sample_rate >= 16000:
+        return 160000, 8000  # MPEG-2
+    return 64000, 8000  # MPEG-2.5
+
+
+class SpeechFormat:
+    """合成和编码参数"""
+
+    def __init__(self, name=Config.TTS_FORMAT, bitrate=Config.TTS_BITRATE, sample_rate=Config.TTS_SAMPLE_RATE):
+        if name not in FORMATS:
+            raise ValueError(f"Unsupported speech format: {name}")
+        if sample_rate not in SYNTHESIS_SAMPLE_RATES or (name == 'opus' and sample_rate not in OPUS_SAMPLE_RATES):
+            raise ValueError(f"Unsupported sample rate for {name}: {sample_rate}")
+        self.name = name
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.extension, self._format, self._subtype = FORMATS[name]
+
+    @property
+    def variant(self):
+        """编码后音频的缓存区分标记"""
+        return f"{self.name}-{self.bitrate}-{self.sample_rate}"
+
+    @property
+    def pcm_variant(self):
+        """合成出的PCM分片的缓存区分标记"""
+        return f"pcm-{self.sample_rate}"
+
+    def synthesis_format(self):
+        """cosyvoice的输出格式"""
+        from dashscope.audio.tts_v2 import AudioFormat
+        return AudioFormat[f"PCM_{self.sample_rate}HZ_MONO_16BIT"]
+
+    def compression_level(self):
+        high, low = _bitrate_range(self.name, self.sample_rate)
+        level = (high - self.bitrate) / float(high - low)
+        # MP3的compression_level为1时libsndfile报错
+        return min(max(level, 0.0), 0.99)
+
+    def open(self, file):
+        """以写入方式打开编码器"""
+        options = {}
+        if self.name != 'wav':
+            options['compression_level'] = self.compression_level()
+        if self.name == 'mp3':
+            options['bitrate_mode'] = 'CONSTANT'
+        return sf.SoundFile(file, 'w', samplerate=self.sample_rate, channels=1,
+                            format=self._format, subtype=self._subtype, **options)
+
+    def encode(self, pcm, title=None):
+        """把完整的PCM16编码为一个文件"""
+        encoder = SpeechEncoder(self, title=title)
+        encoder.feed(pcm)
+        return encoder.close()
+
+
+class SpeechEncoder:
+    """流式编码：feed()写入PCM16分片，新编码出的数据交给on_data，close()返回完整的文件
+
+    MP3在close时会回写文件头（时长），流式收到的数据与最终文件只在文件头上不同
+    """
+
+    def __init__(self, speech_format=None, on_data=None, title=None):
+        self.format = speech_format or get_speech_format()
+        self.on_data = on_data
+        self.samples = 0
+        self._sink = io.BytesIO()
+        self._file = self.format.open(self._sink)
+        # 元数据要在写入音频之前设置
+        self._file.artist = Config.TTS_VOICE
+        if title:
+            self._file.title = title
+        self._emitted = 0
+        self._remainder = b''
+
+    def feed(self, pcm):
+        data = self._remainder + bytes(pcm)
+        usable = len(data) - len(data) % 2
+        self._remainder = data[usable:]
+        if usable:
+            self._file.write(np.frombuffer(data[:usable], dtype=np.int16))
+            self.samples += usable // 2
+            self._emit()
+
+    def _emit(self):
+        """把文件末尾新写入的数据交给on_data（回写文件头不算新数据）"""
+        with self._sink.getbuffer() as view:
+            chunk = bytes(view[self._emitted:])
+        if chunk:
+            self._emitted += len(chunk)
+            if self.on_data:
+                self.on_data(chunk)
+
+    @property
+    def duration(self):
+        return self.samples / float(self.format.sample_rate)
+
+    def close(self):
+        """结束编码，返回完整的文件；没有写入任何音频时返回b''"""
+        if self._file.closed:
+            return self._sink.getvalue() if self.samples else b''
+        self._file.close()
+        if not self.samples:
+            return b''
+        self._emit()
+        return self._sink.getvalue()
+
+
+_format = None
+_format_lock = threading.Lock()
+
+
+def get_speech_format():
+    """按Config.TTS_*创建的输出格式"""
+    global _format
+    with _format_lock:
+        if _format is None:
+            _format = SpeechFormat()
+        return _format
@@ -0,0 +1,176 @@
+"""音频文件存储
+
+OSSStorage：上传到阿里云OSS，支持直接上传内存数据、大文件分片上传和断点续传
+LocalStorage：写到本地目录，可选用HTTP服务对外提供，用于离线测试
+
+对象名在上传前就确定，调用方可以先拿到URL，让上传在后台与其他环节并行。
+上传的对象按扩展名带上Content-Type，浏览器可以边下载边播放；对象名唯一、内容不变，允许长期缓存。
+oss2在首次上传时才导入（见clients.py）。
+"""
+import os
+import abc
+import uuid
+import shutil
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from metrics import span
+from resilience import get_policy
+from config import Config
+
+# 后台上传使用的线程池
+_executor = ThreadPoolExecutor(max_workers=Config.UPLOAD_WORKERS, thread_name_prefix='upload')
+
+
+CONTENT_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.ogg': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.wav': 'audio/wav',
+    '.webm': 'audio/webm',
+    '.m4a': 'audio/mp4',
+}
+
+
+def object_headers(name):
+    """上传对象的HTTP头"""
+    headers = {'Cache-Control': Config.AUDIO_CACHE_CONTROL}
+    content_type = CONTENT_TYPES.get(os.path.splitext(name)[1].lower())
+    if content_type:
+        headers['Content-Type'] = content_type
+    return headers
+
+
+def new_object_name(extension):
+    """生成唯一的对象名"""
+    return str(uuid.uuid4()) + extension
+
+
+class Storage(abc.ABC):
+    """存储后端的公共接口"""
+
+    @abc.abstractmethod
+    def url_for(self, name):
+        """对象的访问地址"""
+
+    @abc.abstractmethod
+    def put_bytes(self, name, data):
+        """上传内存中的数据，返回URL"""
+
+    @abc.abstractmethod
+    def put_file(self, name, local_file_path):
+        """上传本地文件，返回URL"""
+
+    def put_bytes_async(self, data, extension):
+        """后台上传，立即返回(URL, Future)；Future完成表示对象已可访问"""
+        name = new_object_name(extension)
+        # 带上当前请求的上下文，上传耗时的日志里才有请求ID
+        context = contextvars.copy_context()
+        return self.url_for(name), _executor.submit(context.run, self._timed_put, name, data)
+
+    def _timed_put(self, name, data):
+        with span('upload', bytes=len(data)):
+            return self.put_bytes(name, data)
+
+
+class OSSStorage(Storage):
+    def __init__(self, clients):
+        self.clients = clients
+
+    @property
+    def bucket(self):
+        return self.clients.bucket
+
+    def url_for(self, name):
+        return f"https://{Config.OSS_BUCKET}.oss-{Config.OSS_REGION}.aliyuncs.com/{name}"
+
+    def put_bytes(self, name, data):
+        if len(data) >= Config.OSS_MULTIPART_THRESHOLD:
+            # 分片上传按分片重试，外层不再整体重试
+            self._put_multipart(name, data)
+        else:
+            get_policy('oss').call(self.bucket.put_object, name, data, headers=object_headers(name))
+        return self.url_for(name)
+
+    def _put_multipart(self, name, data):
+        """较长的回答分片上传，单个分片失败只重传该分片"""
+        import oss2
+        policy = get_policy('oss')
+        part_size = oss2.determine_part_size(len(data), preferred_size=Config.OSS_PART_SIZE)
+        upload_id = policy.call(self.bucket.init_multipart_upload, name, headers=object_headers(name)).upload_id
+        try:
+            parts = []
+            for number, offset in enumerate(range(0, len(data), part_size), start=1):
+                chunk = data[offset:offset + part_size]
+                result = policy.call(self.bucket.upload_part, name, upload_id, number, chunk)
+                parts.append(oss2.models.PartInfo(number, result.etag))
+            policy.call(self.bucket.complete_multipart_upload, name, upload_id, parts)
+        except Exception:
+            # 取消失败只记录，抛出的仍是上传本身的错误
+            try:
+                self.bucket.abort_multipart_upload(name, upload_id)
+            except Exception as e:
+                print(f"Error aborting multipart upload {name}: {str(e)}")
+            raise
+
+    def put_file(self, name, local_file_path):
+        import oss2
+        # 超过阈值时自动分片上传，进度记录在本地，中断后再次上传（包括重试）会从断点继续
+        get_policy('oss').call(
+            oss2.resumable_upload, self.bucket, name, local_file_path,
+            store=oss2.ResumableStore(root=Config.OSS_RESUMABLE_DIR),
+            headers=object_headers(name),
+            multipart_threshold=Config.OSS_MULTIPART_THRESHOLD,
+            part_size=Config.OSS_PART_SIZE,
+            num_threads=2
+        )
+        return self.url_for(name)
+
+
+class LocalStorage(Storage):
+    """本地目录存储；base_url为空时返回file://地址"""
+
+    def __init__(self, root, base_url=None):
+        self.root = root
+        self.base_url = base_url
+        os.makedirs(root, exist_ok=True)
+
+    def url_for(self, name):
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{name}"
+        return 'file://' + os.path.abspath(os.path.join(self.root, name))
+
+    def put_bytes(self, name, data):
+        with open(os.path.join(self.root, name), 'wb') as f:
+            f.write(data)
+        return self.url_for(name)
+
+    def put_file(self, name, local_file_path):
+        shutil.copyfile(local_file_path, os.path.join(self.root, name))
+        return self.url_for(name)
+
+    def serve(self, host='127.0.0.1', port=0):
+        """在后台线程中用HTTP提供该目录，返回服务器对象"""
+        handler = partial(_ObjectHandler, directory=self.root)
+        server = ThreadingHTTPServer((host, port), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.base_url = f"http://{host}:{server.server_address[1]}"
+        return server
+
+
+class _ObjectHandler(SimpleHTTPRequestHandler):
+    """与OSS对象相同的Content-Type和缓存头"""
+    extensions_map = dict(SimpleHTTPRequestHandler.extensions_map, **CONTENT_TYPES)
+
+    def end_headers(self):
+        self.send_header('Cache-Control', Config.AUDIO_CACHE_CONTROL)
+        super().end_headers()
+
+
+def create_storage(clients):
+    """按Config.STORAGE_BACKEND创建存储后端，clients为clients.ClientPool"""
+    if Config.STORAGE_BACKEND == 'local':
+        return LocalStorage(Config.LOCAL_STORAGE_DIR, Config.LOCAL_STORAGE_URL)
+    return OSSStorage(clients)
@@ -0,0 +1,253 @@
+"""实时面试WebSocket服务
+
+客户端边录音边发送PCM16单声道音频帧，服务端同时做实时识别；
+录音结束后流式获取AI回复，按句切分并逐句合成语音，第一句合成出来就推回客户端。
+
+协议（同一连接可进行多轮）：
+    客户端 -> 服务端
+        {"type": "start", "sample_rate": 16000,   开始一轮回答（参数均可省略，
+         "session_id": ...}                       同一连接上后续轮次沿用上一轮的会话）
+        <二进制帧>                                 PCM16音频分片
+        {"type": "stop"}                          回答结束
+    服务端 -> 客户端
+        {"type": "ready", "session_id": ...}      可以开始发送音频
+        {"type": "partial", "text": ...}          中间识别结果
+        {"type": "transcript", "text": ...}       最终识别结果
+        {"type": "token", "text": ...}            AI回复增量文本
+        <二进制帧>                                 AI语音分片（Config.TTS_FORMAT编码，本轮各帧依次拼接即完整文件）
+        {"type": "done", ...}                     本轮结束，包含入库后的记录和各阶段耗时
+        {"type": "error", "error": ...}           本轮失败
+"""
+import json
+import time
+import asyncio
+import websockets
+import numpy as np
+from audio import NormalizedAudio
+from models import Interview, session_scope
+from persistence import get_writer
+from utils import AudioProcessor
+from conversation import get_session_store
+from pipeline import speak_reply
+from speech import get_speech_format, SpeechEncoder
+from config import Config
+
+
+class DashScopeBackends:
+    """基于AudioProcessor的实时识别、流式对话、语音合成和OSS上传"""
+
+    def __init__(self, processor=None):
+        self.processor = processor or AudioProcessor()
+
+    def open_recognizer(self, sample_rate, on_partial):
+        return self.processor.open_recognizer(sample_rate, on_partial)
+
+    def stream_reply(self, user_text, messages=None):
+        return self.processor.stream_chat(user_text, messages)
+
+    def summarize(self, summary, turns):
+        return self.processor.summarize(summary, turns)
+
+    def synthesize(self, text, on_audio):
+        self.processor.stream_speech(text, on_audio)
+
+    def upload_async(self, data, extension):
+        return self.processor.upload_bytes_async(data, extension)
+
+
+class InterviewTurn:
+    """一轮面试问答：识别 -> 流式回复 -> 逐句合成 -> 入库"""
+
+    def __init__(self, backends, sample_rate, emit, session_id=None):
+        self.backends = backends
+        self.sessions = get_session_store()
+        self.context = self.sessions.get_or_create(session_id)
+        self.sample_rate = sample_rate
+        self.emit = emit
+        self.user_audio = bytearray()
+        # 合成出的PCM边合成边编码，编码出的数据立即推给客户端
+        self.encoder = SpeechEncoder(on_data=self._send_audio)
+        self.timings = {}
+        self.stopped_at = None
+        self.turn_index = None  # 在finish中分配
+        self.recognizer = backends.open_recognizer(
+            sample_rate, lambda text: emit({'type': 'partial', 'text': text})
+        )
+
+    def feed(self, chunk):
+        """收到一段用户音频（识别SDK会发送数据，在工作线程中调用）"""
+        self.user_audio.extend(chunk)
+        self.recognizer.feed(chunk)
+
+    def abort(self):
+        """本轮没有说完就被放弃时结束实时识别会话，否则识别会话和线程要等服务端超时才释放"""
+        self.recognizer.close()
+
+    def _mark(self, name):
+        """记录从用户说完到当前阶段的耗时（毫秒），只记录第一次"""
+        if name not in self.timings:
+            self.timings[name] = round((time.monotonic() - self.stopped_at) * 1000, 1)
+
+    def _on_audio(self, pcm):
+        self.encoder.feed(pcm)
+
+    def _send_audio(self, data):
+        self._mark('first_audio_ms')
+        self.emit(data)
+
+    def finish(self):
+        """用户说完后执行剩余流程（在工作线程中运行），返回done消息"""
+        self.stopped_at = time.monotonic()
+        self.turn_index = self.context.next_turn()
+        # 用户音频已经完整，归档上传与识别、回复并行进行
+        pcm = np.frombuffer(bytes(self.user_audio), dtype=np.int16)
+        user_upload = self.backends.upload_async(
+            NormalizedAudio(pcm, self.sample_rate).to_wav_bytes(), '.wav'
+        )
+        user_text = self.recognizer.finish()
+        self._mark('transcript_ms')
+        if not user_text:
+            raise ValueError('Speech to text failed')
+        self.emit({'type': 'transcript', 'text': user_text})
+
+        ai_response = self._respond(user_text)
+        self._mark('reply_done_ms')
+
+        interview_id, user_audio_url, ai_audio_url = self._persist(user_text, ai_response, user_upload)
+        self.sessions.record_turn(self.context, user_text, ai_response, self.turn_index)
+        self._mark('total_ms')
+        return {
+            'type': 'done',
+            'id': interview_id,
+            'session_id': self.context.session_id,
+            'user_text': user_text,
+            'ai_response': ai_response,
+            'user_audio_url': user_audio_url,
+            'ai_audio_url': ai_audio_url,
+            'timings': self.timings
+        }
+
+    def _on_text(self, delta):
+        self._mark('first_token_ms')
+        self.emit({'type': 'token', 'text': delta})
+
+    def _respond(self, user_text):
+        """流式获取回复并逐句合成；生成和合成在两个线程中并行"""
+        messages = self.context.build_messages(user_text)
+        return speak_reply(self.backends.stream_reply(user_text, messages),
+                           self.backends.synthesize, self._on_audio, self._on_text)
+
+    def _persist(self, user_text, ai_response, user_upload):
+        """等待双方音频上传完成并保存面试记录"""
+        user_audio_url, user_future = user_upload
+        ai_audio_url, ai_future = self.backends.upload_async(self.encoder.close(), get_speech_format().extension)
+        user_future.result()
+        ai_future.result()
+
+        fields = {
+            'user_audio_path': user_audio_url,
+            'user_text': user_text,
+            'ai_response_text': ai_response,
+            'ai_audio_path': ai_audio_url,
+            'session_id': self.context.session_id,
+            'turn_index': self.turn_index,
+        }
+        if Config.DB_WRITE_BEHIND:
+            # 需要记录ID，总是等待提交完成
+            return get_writer().add(fields, durable=True).result(), user_audio_url, ai_audio_url
+        with session_scope() as session:
+            interview = Interview(**fields)
+            session.add(interview)
+            session.flush()
+            return interview.id, user_audio_url, ai_audio_url
+
+
+async def handle_connection(websocket, backends):
+    """处理一个WebSocket连接上的多轮面试"""
+    loop = asyncio.get_running_loop()
+    outbox = asyncio.Queue()
+
+    def emit(message):
+        # 可能在工作线程中调用，统一投递到事件循环
+        loop.call_soon_threadsafe(outbox.put_nowait, message)
+
+    async def pump():
+        while True:
+            message = await outbox.get()
+            if isinstance(message, dict):
+                message = json.dumps(message, ensure_ascii=False)
+            await websocket.send(message)
+
+    sender = asyncio.create_task(pump())
+    turn = None
+    session_id = None
+    try:
+        async for message in websocket:
+            if isinstance(message, bytes):
+                if turn is None:
+                    emit({'type': 'error', 'error': 'Send a start message first'})
+                    continue
+                # 逐帧等待，保持音频顺序，同时不在事件循环中做SDK的网络发送
+                await loop.run_in_executor(None, turn.feed, message)
+                continue
+
+            try:
+                command = json.loads(message)
+            except ValueError:
+                emit({'type': 'error', 'error': 'Invalid message'})
+                continue
+
+            if command.get('type') == 'start':
+                sample_rate = int(command.get('sample_rate', Config.STREAM_SAMPLE_RATE))
+                session_id = command.get('session_id') or session_id
+                if turn is not None:
+                    current, turn = turn, None
+                    await loop.run_in_executor(None, current.abort)
+                try:
+                    turn = await loop.run_in_executor(
+                        None, InterviewTurn, backends, sample_rate, emit, session_id
+                    )
+                    session_id = turn.context.session_id
+                    emit({'type': 'ready', 'session_id': session_id})
+                except Exception as e:
+                    print(f"Error starting recognition: {str(e)}")
+                    emit({'type': 'error', 'error': str(e)})
+            elif command.get('type') == 'stop' and turn is not None:
+                current, turn = turn, None
+                try:
+                    emit(await loop.run_in_executor(None, current.finish))
+                except Exception as e:
+                    print(f"Error processing interview stream: {str(e)}")
+                    emit({'type': 'error', 'error': str(e)})
+            else:
+                emit({'type': 'error', 'error': 'Unknown command'})
+    except websockets.ConnectionClosed:
+        pass
+    finally:
+        # 客户端在一轮中途断开
+        if turn is not None:
+            await loop.run_in_executor(None, turn.abort)
+        # 等待已排队的消息发送完毕
+        while not outbox.empty() and not websocket.closed:
+            await asyncio.sleep(0.01)
+        sender.cancel()
+
+
+async def serve(host=Config.STREAM_HOST, port=Config.STREAM_PORT, backends=None, ready=None):
+    """启动WebSocket服务，ready(可选)为启动完成后设置的threading.Event"""
+    backends = backends or DashScopeBackends()
+    # 会话缓存在启动时绑定摘要函数
+    get_session_store(backends.summarize)
+
+    async def handler(websocket, path=None):
+        await handle_connection(websocket, backends)
+
+    async with websockets.serve(handler, host, port, max_size=None):
+        print(f"Interview stream server listening on ws://{host}:{port}")
+        if ready is not None:
+            ready.set()
+        await asyncio.Future()
+
+
+if __name__ == '__main__':
+    asyncio.run(serve())
@@ -0,0 +1,192 @@
+"""录音文件识别任务的统一跟踪器
+
+所有请求提交的paraformer任务由一个后台线程集中轮询，轮询间隔按任务自适应退避；
+请求方拿到一个Future等待结果，不再每个请求占用一个线程反复sleep+fetch。
+"""
+import time
+import threading
+from http import HTTPStatus
+from concurrent.futures import Future, ThreadPoolExecutor
+from metrics import STAGE_FAILURES, TIMEOUTS
+from resilience import get_policy, check_status
+from clients import get_dashscope
+from config import Config
+
+
+class TranscriptionFailed(Exception):
+    """识别任务失败"""
+
+
+def parse_transcription(result):
+    """解析识别结果JSON，返回(全文, 句子列表)
+
+    句子为{'begin_time', 'end_time', 'text'}，时间单位毫秒；多声道时按声道顺序拼接
+    """
+    text = []
+    sentences = []
+    for transcript in result.get('transcripts') or []:
+        parts = [sentence for sentence in transcript.get('sentences') or [] if sentence.get('text')]
+        sentences.extend({'begin_time': sentence.get('begin_time'),
+                          'end_time': sentence.get('end_time'),
+                          'text': sentence['text']} for sentence in parts)
+        text.append(transcript.get('text') or ''.join(sentence['text'] for sentence in parts))
+    return ''.join(text), sentences
+
+
+def submit_transcription(client, **kwargs):
+    """提交录音文件识别任务，可重试的错误状态抛出UpstreamError（在get_policy('asr')中调用）"""
+    return check_status(client.async_call(**kwargs))
+
+
+def fetch_url(http, url):
+    """下载识别结果JSON，可重试的错误状态抛出UpstreamError"""
+    return check_status(http.get(url, timeout=10))
+
+
+class _Job:
+    __slots__ = ('task_id', 'future', 'interval', 'created', 'next_poll', 'deadline', 'polling')
+
+    def __init__(self, task_id, future, interval, first_poll, deadline):
+        self.task_id = task_id
+        self.future = future
+        self.interval = interval
+        self.created = time.monotonic()
+        self.next_poll = self.created + first_poll
+        self.deadline = self.created + deadline
+        self.polling = False
+
+
+class TranscriptionTracker:
+    """集中轮询识别任务状态，client需提供fetch(task=task_id)，默认为dashscope的Transcription"""
+
+    def __init__(self, client=None,
+                 initial_interval=Config.ASR_POLL_INITIAL_INTERVAL,
+                 max_interval=Config.ASR_POLL_MAX_INTERVAL,
+                 backoff=Config.ASR_POLL_BACKOFF,
+                 workers=Config.ASR_POLL_WORKERS):
+        self._client = client
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asr-poll')
+        self._thread = None
+        self._closed = False
+        # 近期任务完成耗时的滑动平均，用于推迟首次查询，避免任务刚提交就频繁查询
+        self._expected_duration = None
+        self.stats = {'tracked': 0, 'fetches': 0, 'succeeded': 0, 'failed': 0, 'timed_out': 0}
+
+    @property
+    def client(self):
+        if self._client is None:
+            get_dashscope()
+            from dashscope.audio.asr import Transcription
+            self._client = Transcription
+        return self._client
+
+    def track(self, task_id, timeout=Config.ASR_TIMEOUT):
+        """开始跟踪任务，返回Future：成功时结果为任务的output，失败时抛出TranscriptionFailed/TimeoutError"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Tracker has been shut down')
+            first_poll = self.initial_interval
+            if self._expected_duration is not None:
+                first_poll = max(first_poll, self._expected_duration * 0.8)
+            self._jobs[task_id] = _Job(task_id, future, self.initial_interval, first_poll, timeout)
+            self.stats['tracked'] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='asr-tracker', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def pending(self):
+        with self._cond:
+            return len(self._jobs)
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            for job in self._jobs.values():
+                job.future.cancel()
+            self._jobs.clear()
+            self._cond.notify()
+        self._pool.shutdown(wait=True)
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                wait = None
+                for job in list(self._jobs.values()):
+                    if job.future.cancelled():
+                        del self._jobs[job.task_id]
+                    elif job.polling:
+                        continue
+                    elif now >= job.deadline:
+                        del self._jobs[job.task_id]
+                        self.stats['timed_out'] += 1
+                        TIMEOUTS.inc(stage='asr_poll')
+                        job.future.set_exception(TimeoutError(f"Transcription {job.task_id} timed out"))
+                    elif now >= job.next_poll:
+                        job.polling = True
+                        self._pool.submit(self._poll, job)
+                    else:
+                        until = min(job.next_poll, job.deadline) - now
+                        wait = until if wait is None else min(wait, until)
+                self._cond.wait(wait)
+
+    def _poll(self, job):
+        """查询一次任务状态（在线程池中执行）"""
+        status = None
+        output = None
+        try:
+            response = get_policy('asr').call(lambda: check_status(self.client.fetch(task=job.task_id)))
+            if response.status_code == HTTPStatus.OK and response.output is not None:
+                output = response.output
+                status = output['task_status']
+            else:
+                print(f"Error in fetch for {job.task_id}: Status {response.status_code}")
+                STAGE_FAILURES.inc(stage='asr_poll', reason=f"status_{response.status_code}")
+        except Exception as e:
+            print(f"Error fetching transcription {job.task_id}: {str(e)}")
+            STAGE_FAILURES.inc(stage='asr_poll', reason=type(e).__name__)
+
+        with self._cond:
+            self.stats['fetches'] += 1
+            if job.future.cancelled():
+                self._jobs.pop(job.task_id, None)
+            elif status == 'SUCCEEDED':
+                self._jobs.pop(job.task_id, None)
+                self.stats['succeeded'] += 1
+                duration = time.monotonic() - job.created
+                if self._expected_duration is None:
+                    self._expected_duration = duration
+                else:
+                    self._expected_duration = 0.8 * self._expected_duration + 0.2 * duration
+                job.future.set_result(output)
+            elif status in ('PENDING', 'RUNNING', None):
+                # 未完成或查询出错，退避后再查
+                job.interval = min(job.interval * self.backoff, self.max_interval)
+                job.next_poll = time.monotonic() + job.interval
+                job.polling = False
+            else:
+                self._jobs.pop(job.task_id, None)
+                self.stats['failed'] += 1
+                job.future.set_exception(TranscriptionFailed(f"Task {job.task_id} status: {status}"))
+            self._cond.notify()
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker():
+    """进程内共享的跟踪器"""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = TranscriptionTracker()
+        return _tracker
@@ -0,0 +1,290 @@
+"""语音合成结果缓存
+
+面试官的很多话是重复的（开场白、常见追问、出错时的兜底回复），
+按(文本, 格式, 模型, 音色)的哈希缓存合成出的音频：
+    内存层：最近使用的音频，按总字节数限制
+    磁盘层：data/ai_voice下的文件（扩展名与格式一致，逐句的PCM为.pcm），超过容量时删除最久未使用的
+大部分回复只出现一次，新合成的音频只放入内存层；预热的常用语句、第二次合成或在内存层命中的语句
+才由后台线程写入磁盘，请求路径上没有磁盘写入。
+同一段音频上传过一次后记录其URL，再次命中时合成和上传都可以跳过。
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from speech import FORMATS
+from config import Config
+
+# 磁盘层的音频文件扩展名
+AUDIO_EXTENSIONS = {extension for extension, _, _ in FORMATS.values()} | {'.pcm', '.bin'}
+# 最多记住多少个只合成过一次的语句
+SEEN_LIMIT = 4096
+
+
+def variant_extension(variant):
+    """磁盘文件的扩展名：编码后的回复取格式的扩展名，逐句的PCM为.pcm"""
+    name = variant.split('-', 1)[0]
+    if name in FORMATS:
+        return FORMATS[name][0]
+    return '.pcm' if name == 'pcm' else '.bin'
+
+
+def cache_key(text, variant='', model=Config.TTS_MODEL, voice=Config.TTS_VOICE):
+    """按文本、格式（variant，如逐句的PCM和编码后的整条回复）、模型和音色计算缓存键"""
+    raw = f"{model}\n{voice}\n{variant}\n{text.strip()}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """两级（内存+磁盘）的合成音频缓存，线程安全"""
+
+    def __init__(self, directory=Config.TTS_CACHE_DIR, memory_bytes=Config.TTS_CACHE_MEMORY_BYTES,
+                 disk_bytes=Config.TTS_CACHE_DISK_BYTES, pinned=None):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        # 第一次合成就写入磁盘的语句
+        self.pinned = {text.strip() for text in (Config.TTS_PREWARM_PHRASES if pinned is None else pinned)}
+        self._memory = OrderedDict()  # key -> 音频
+        self._memory_size = 0
+        self._disk = OrderedDict()  # key -> 文件大小，按最近使用排序
+        self._disk_size = 0
+        self._extensions = {}  # key -> 磁盘文件的扩展名
+        self._urls = {}
+        self._seen = OrderedDict()  # 只合成过一次、没有写入磁盘的key -> 扩展名
+        self._writing = set()  # 等待后台写入磁盘的key
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tts-cache')
+        self._lock = threading.Lock()
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'url_hits': 0,
+            'stores': 0,
+            'disk_writes': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+        }
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key + extension)
+
+    def _scan(self):
+        """启动时按访问时间恢复磁盘层的LRU顺序"""
+        entries = []
+        for name in os.listdir(self.directory):
+            key, extension = os.path.splitext(name)
+            path = os.path.join(self.directory, name)
+            if extension in AUDIO_EXTENSIONS:
+                stat = os.stat(path)
+                entries.append((stat.st_atime, key, stat.st_size))
+                self._extensions[key] = extension
+            elif extension == '.url':
+                with open(path, encoding='utf-8') as f:
+                    self._urls[key] = f.read().strip()
+            elif extension == '.tmp':
+                # 上次运行中写了一半的文件
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+        # 音频已被删除的URL记录没有意义
+        self._urls = {key: url for key, url in self._urls.items() if key in self._disk}
+
+    def get(self, text, variant=''):
+        """返回缓存的音频，未命中时返回None"""
+        key = cache_key(text, variant)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                elif key in self._seen:
+                    # 重复出现的语句
+                    self._persist(key, audio, self._seen.pop(key))
+                self.stats['memory_hits'] += 1
+                return audio
+            if key not in self._disk:
+                self.stats['misses'] += 1
+                return None
+            self._disk.move_to_end(key)
+            path = self._path(key, self._extensions[key])
+        try:
+            with open(path, 'rb') as f:
+                audio = f.read()
+        except OSError:
+            # 文件被外部删除
+            with self._lock:
+                self._forget(key)
+                self.stats['misses'] += 1
+            return None
+        with self._lock:
+            self.stats['disk_hits'] += 1
+            self._remember(key, audio)
+        return audio
+
+    def get_url(self, text, variant=''):
+        """返回已上传过的音频URL，没有时返回None（不计入未命中，调用方接着会查音频）"""
+        key = cache_key(text, variant)
+        with self._lock:
+            url = self._urls.get(key)
+            if url:
+                self.stats['url_hits'] += 1
+            return url
+
+    def put(self, text, audio, variant=''):
+        """缓存一段合成结果：放入内存层，常用或重复出现的语句在后台写入磁盘"""
+        if not audio:
+            return
+        key = cache_key(text, variant)
+        extension = variant_extension(variant)
+        with self._lock:
+            self.stats['stores'] += 1
+            self._remember(key, audio)
+            if text.strip() in self.pinned or self._seen.pop(key, None) is not None:
+                self._persist(key, audio, extension)
+            else:
+                self._seen[key] = extension
+                if len(self._seen) > SEEN_LIMIT:
+                    self._seen.popitem(last=False)
+
+    def flush(self):
+        """等待已提交的磁盘写入完成"""
+        self._writer.submit(lambda: None).result()
+
+    def _persist(self, key, audio, extension):
+        """提交到后台写入磁盘（调用方持有锁）"""
+        if key in self._writing:
+            return
+        self._writing.add(key)
+        self._writer.submit(self._write, key, audio, extension)
+
+    def _write(self, key, audio, extension):
+        path = self._path(key, extension)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(audio)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing TTS cache: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            with self._lock:
+                self._writing.discard(key)
+                self._urls.pop(key, None)
+            return
+        with self._lock:
+            self._writing.discard(key)
+            self.stats['disk_writes'] += 1
+            if key in self._disk:
+                self._disk_size -= self._disk.pop(key)
+            self._disk[key] = len(audio)
+            self._disk_size += len(audio)
+            self._extensions[key] = extension
+            self._evict_disk()
+
+    def put_url(self, text, url, variant=''):
+        """记录音频上传后的URL"""
+        key = cache_key(text, variant)
+        with self._lock:
+            # 只合成过一次的语句不记录
+            if key not in self._disk and key not in self._writing:
+                return
+            self._urls[key] = url
+        try:
+            with open(self._path(key, '.url'), 'w', encoding='utf-8') as f:
+                f.write(url)
+        except OSError as e:
+            print(f"Error writing TTS cache: {str(e)}")
+
+    def _remember(self, key, audio):
+        """放入内存层（调用方持有锁）"""
+        if len(audio) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key))
+        self._memory[key] = audio
+        self._memory_size += len(audio)
+        while self._memory_size > self.memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= len(old)
+            self.stats['memory_evictions'] += 1
+
+    def _forget(self, key):
+        """从各层移除（调用方持有锁），返回磁盘文件的扩展名"""
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key))
+        if key in self._disk:
+            self._disk_size -= self._disk.pop(key)
+        self._urls.pop(key, None)
+        return self._extensions.pop(key, None)
+
+    def _evict_disk(self):
+        """删除最久未使用的文件直到不超过容量（调用方持有锁）"""
+        while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+            key = next(iter(self._disk))
+            audio_extension = self._forget(key)
+            self.stats['disk_evictions'] += 1
+            for extension in (audio_extension, '.url'):
+                try:
+                    os.remove(self._path(key, extension))
+                except OSError:
+                    pass
+
+    def snapshot(self):
+        """命中率和容量统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(
+                memory_entries=len(self._memory),
+                memory_bytes=self._memory_size,
+                disk_entries=len(self._disk),
+                disk_bytes=self._disk_size,
+                pending_writes=len(self._writing),
+                urls=len(self._urls),
+            )
+        # 命中已上传URL的查询不会再查音频，也计入命中
+        hits = stats['memory_hits'] + stats['disk_hits'] + stats['url_hits']
+        stats['hit_rate'] = round(hits / (hits + stats['misses']), 3) if hits + stats['misses'] else 0.0
+        stats['timestamp'] = time.time()
+        return stats
+
+
+def prewarm(processor, phrases=None):
+    """预先合成并上传常用语句，processor为utils.AudioProcessor"""
+    phrases = Config.TTS_PREWARM_PHRASES if phrases is None else phrases
+    warmed = 0
+    for phrase in phrases:
+        try:
+            url, upload = processor.synthesize_and_upload(phrase)
+            if url:
+                upload.result()
+                warmed += 1
+        except Exception as e:
+            print(f"Error prewarming TTS cache for {phrase!r}: {str(e)}")
+    print(f"TTS cache prewarmed {warmed}/{len(phrases)} phrases")
+    return warmed
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache():
+    """进程内共享的合成缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache()
+        return _cache
@@ -0,0 +1,125 @@
+"""上传文件的处理
+
+SpooledRequest：上传的音频在内存中缓冲，超过UPLOAD_SPOOL_BYTES才落到临时文件，
+    请求体总大小由MAX_CONTENT_LENGTH限制（超出返回413）。
+    werkzeug默认超过500KB就写临时文件，几十秒的wav录音每个请求都要写一次磁盘。
+Janitor：后台定期清理data/spool中应用自己产生的临时音频文件（默认关闭，JANITOR_ENABLED=1时启用），
+    先删除超过保留时间的，总大小仍超过配额时从最旧的开始删除。
+    只能配置为应用独占的目录，data/my_voice中的样例录音和旧版本遗留的上传文件同名规则，无法区分。
+"""
+import os
+import time
+import threading
+from tempfile import SpooledTemporaryFile
+from flask import Request
+from config import Config
+
+
+class SpooledRequest(Request):
+    """上传文件在内存中缓冲的请求类"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=Config.UPLOAD_SPOOL_BYTES, mode='rb+')
+
+
+class Janitor:
+    """按保留时间和总大小清理目录中的文件（只处理目录下一层的文件，不进入子目录）"""
+
+    def __init__(self, directories=None, max_age=Config.JANITOR_MAX_AGE,
+                 max_bytes=Config.JANITOR_MAX_BYTES, grace=Config.JANITOR_GRACE):
+        self.directories = Config.JANITOR_DIRS if directories is None else directories
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        # 最近修改过的文件可能还在写入，不删除
+        self.grace = grace
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'sweeps': 0, 'deleted': 0, 'deleted_bytes': 0, 'errors': 0,
+                      'files': 0, 'bytes': 0}
+
+    def _files(self):
+        files = []
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+                except OSError:
+                    continue
+        files.sort()
+        return files
+
+    def _delete(self, path, size):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return True
+        except OSError as e:
+            print(f"Error deleting {path}: {str(e)}")
+            self.stats['errors'] += 1
+            return False
+        self.stats['deleted'] += 1
+        self.stats['deleted_bytes'] += size
+        return True
+
+    def sweep(self, now=None):
+        """清理一次，返回删除的文件数"""
+        now = time.time() if now is None else now
+        with self._lock:
+            files = self._files()
+            total = sum(size for _, size, _ in files)
+            before = self.stats['deleted']
+            kept = []
+            for mtime, size, path in files:
+                if now - mtime > self.max_age and self._delete(path, size):
+                    total -= size
+                else:
+                    kept.append((mtime, size, path))
+            # 按修改时间从旧到新删除，直到总大小不超过配额
+            for mtime, size, path in kept:
+                if total <= self.max_bytes:
+                    break
+                if now - mtime > self.grace and self._delete(path, size):
+                    total -= size
+            self.stats['sweeps'] += 1
+            self.stats['files'] = len(files) - (self.stats['deleted'] - before)
+            self.stats['bytes'] = total
+            return self.stats['deleted'] - before
+
+    def start(self, interval=Config.JANITOR_INTERVAL):
+        """启动后台清理线程（重复调用无效）"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(interval,), name='janitor', daemon=True)
+            self._thread.start()
+
+    def _run(self, interval):
+        while True:
+            try:
+                deleted = self.sweep()
+                if deleted:
+                    print(f"Janitor deleted {deleted} orphaned files")
+            except Exception as e:
+                print(f"Error in janitor: {str(e)}")
+            time.sleep(interval)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+_janitor = None
+_janitor_lock = threading.Lock()
+
+
+def get_janitor():
+    """进程内共享的清理器"""
+    global _janitor
+    with _janitor_lock:
+        if _janitor is None:
+            _janitor = Janitor()
+        return _janitor
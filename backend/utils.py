@@ -1,43 +1,32 @@
 import os
-import uuid
-import oss2
-from oss2.credentials import EnvironmentVariableCredentialsProvider
-import dashscope
-from dashscope.audio.asr import Transcription
-from dashscope.audio.tts_v2 import SpeechSynthesizer
 from config import Config
 from http import HTTPStatus
-import json
 import time
-import requests
+from transcription import get_tracker, parse_transcription, submit_transcription, fetch_url
+from clients import get_pool, get_dashscope
+from storage import create_storage, new_object_name
+from tts_cache import get_tts_cache
+from llm_cache import get_reply_cache
+from concurrent.futures import Future
+from conversation import SYSTEM_PROMPT
+from pipeline import speak_reply
+from resilience import get_policy, check_status
+from speech import get_speech_format, SpeechEncoder
+from metrics import log_event, TTS_FIRST_PACKAGE, FIRST_AUDIO
 
 class AudioProcessor:
-    def __init__(self):
-        # 设置 dashscope API key
-        dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
-        print(f"DashScope API Key: {dashscope.api_key}")  # 打印API key用于调试
-        
-        # 初始化语音合成器
-        self.synthesizer = SpeechSynthesizer(model="cosyvoice-v1", voice="loongbella")
-        
-        # 设置OSS
-        try:
-            # 使用V4签名认证
-            self.auth = oss2.ProviderAuthV4(EnvironmentVariableCredentialsProvider())
-            endpoint = f"https://oss-{Config.OSS_REGION}.aliyuncs.com"
-            print(f"OSS Endpoint: {endpoint}")
-            
-            # 创建Bucket实例，指定存储空间的名称和Region信息
-            self.bucket = oss2.Bucket(
-                self.auth, 
-                endpoint, 
-                Config.OSS_BUCKET,
-                region=Config.OSS_REGION
-            )
-            print("OSS initialized successfully")
-        except Exception as e:
-            print(f"Error initializing OSS: {str(e)}")
-            raise
+    def __init__(self, tracker=None):
+        # 识别任务跟踪器，默认使用进程内共享的实例
+        self.tracker = tracker or get_tracker()
+
+        # OSS、HTTP会话和语音合成器都从进程内共享的客户端池获取
+        self.clients = get_pool()
+        self.storage = create_storage(self.clients)
+
+        # 合成结果缓存，命中时跳过合成和上传
+        self.tts_cache = get_tts_cache() if Config.TTS_CACHE_ENABLED else None
+        # 常见短句的回复缓存，命中时不调用模型
+        self.reply_cache = get_reply_cache() if Config.LLM_CACHE_ENABLED else None
 
     def upload_to_oss(self, local_file_path):
         """上传文件到OSS"""
@@ -54,36 +43,44 @@ class AudioProcessor:
             print(f"File size: {file_size} bytes")
             
             # 生成唯一的文件名
-            file_name = str(uuid.uuid4()) + os.path.splitext(local_file_path)[1]
+            file_name = new_object_name(os.path.splitext(local_file_path)[1])
             print(f"Generated OSS object name: {file_name}")
             
-            # 上传文件
-            self.bucket.put_object_from_file(file_name, local_file_path)
-            
-            # 生成文件URL
-            file_url = f"https://{Config.OSS_BUCKET}.oss-{Config.OSS_REGION}.aliyuncs.com/{file_name}"
+            # 上传文件（大文件自动分片、断点续传）
+            file_url = self.storage.put_file(file_name, local_file_path)
             print(f"File uploaded successfully. URL: {file_url}")
             return file_url
         except Exception as e:
             print(f"Error uploading to OSS: {str(e)}")
             return None
 
+    def upload_bytes(self, data, extension):
+        """直接上传内存中的音频数据，不落盘"""
+        try:
+            file_url = self.storage.put_bytes(new_object_name(extension), data)
+            print(f"Uploaded {len(data)} bytes. URL: {file_url}")
+            return file_url
+        except Exception as e:
+            print(f"Error uploading to OSS: {str(e)}")
+            return None
+
+    def upload_bytes_async(self, data, extension):
+        """后台上传内存中的音频数据，立即返回(URL, Future)"""
+        return self.storage.put_bytes_async(data, extension)
+
     def get_transcription_result(self, transcription_url):
         """从转录URL获取结果"""
         try:
             print(f"Fetching transcription from URL: {transcription_url}")
-            response = requests.get(transcription_url)
+            response = get_policy('asr').call(fetch_url, self.clients.http, transcription_url)
             if response.status_code == 200:
                 result = response.json()
-                print(f"Transcription response: {json.dumps(result, indent=2)}")
+                log_event('transcription_fetched', transcripts=len(result.get('transcripts') or []))
                 
-                # 检查并提取文本内容
-                if 'transcripts' in result and result['transcripts']:
-                    for transcript in result['transcripts']:
-                        if 'sentences' in transcript:
-                            for sentence in transcript['sentences']:
-                                if 'text' in sentence:
-                                    return sentence['text']
+                # 提取全部句子的文本，长回答不止一句
+                text, _ = parse_transcription(result)
+                if text:
+                    return text
                 print("No text found in transcription response")
                 return None
             else:
@@ -100,12 +97,13 @@ class AudioProcessor:
             print(f"Starting speech to text conversion for URL: {file_url}")
             
             # 调用语音识别
-            response = Transcription.async_call(
+            response = get_policy('asr').call(
+                submit_transcription, self.tracker.client,
                 model='paraformer-v2',
                 file_urls=[file_url],
                 language_hints=['zh', 'en']
             )
-            print(f"Initial response: {response}")
+            print(f"Initial response status: {response.status_code}")
             
             if response.status_code != HTTPStatus.OK:
                 print(f"Error in initial call: Status {response.status_code}")
@@ -115,61 +113,22 @@ class AudioProcessor:
                 print("Error: response.output is None")
                 return None
             
-            task_id = response.output.task_id
+            task_id = response.output['task_id']
             print(f"Task ID: {task_id}")
             
-            # 等待任务完成
-            max_retries = 30
-            retry_count = 0
-            while retry_count < max_retries:
-                # 获取任务状态
-                response = Transcription.fetch(task=task_id)
-                print(f"Fetch response: {response}")
-                
-                if not hasattr(response, 'output') or response.output is None:
-                    print("Invalid response format")
-                    retry_count += 1
-                    time.sleep(1)
-                    continue
-                
-                if response.status_code != HTTPStatus.OK:
-                    print(f"Error in fetch: Status {response.status_code}")
-                    retry_count += 1
-                    time.sleep(1)
-                    continue
-                
-                # 将响应转换为字典以便访问
-                response_dict = json.loads(str(response))
-                print(f"Response dict: {json.dumps(response_dict, indent=2)}")
-                
-                if response_dict['output']['task_status'] == 'SUCCEEDED':
-                    print("Task succeeded")
-                    # 检查结果列表
-                    results = response_dict['output'].get('results', [])
-                    if results:
-                        for result in results:
-                            transcription_url = result.get('transcription_url')
-                            if transcription_url:
-                                print(f"Found transcription URL: {transcription_url}")
-                                # 获取转录结果
-                                text = self.get_transcription_result(transcription_url)
-                                if text:
-                                    print(f"Final transcription result: {text}")
-                                    return text
-                    print("No transcription URL found in response")
-                    return None
-                elif response_dict['output']['task_status'] == 'FAILED':
-                    print("Task failed")
-                    return None
-                elif response_dict['output']['task_status'] in ['PENDING', 'RUNNING']:
-                    print(f"Task status: {response_dict['output']['task_status']}, waiting...")
-                    time.sleep(1)
-                    retry_count += 1
-                else:
-                    print(f"Unknown task status: {response_dict['output']['task_status']}")
-                    return None
-            
-            print("Task timed out")
+            # 由共享的跟踪器轮询任务状态，这里只等待结果
+            output = self.tracker.track(task_id).result()
+            print("Task succeeded")
+            for result in output.get('results') or []:
+                transcription_url = result.get('transcription_url')
+                if transcription_url:
+                    print(f"Found transcription URL: {transcription_url}")
+                    # 获取转录结果
+                    text = self.get_transcription_result(transcription_url)
+                    if text:
+                        print(f"Final transcription result: {text}")
+                        return text
+            print("No transcription URL found in response")
             return None
             
         except Exception as e:
@@ -177,35 +136,107 @@ class AudioProcessor:
             print(f"Full error details: {str(e.__class__.__name__)}: {str(e)}")
             return None
 
-    def text_to_speech(self, text, output_path):
-        """文本转语音"""
+    def synthesize(self, text):
+        """文本转语音，返回按Config.TTS_FORMAT编码的音频数据"""
+        speech_format = get_speech_format()
         try:
+            if self.tts_cache is not None:
+                audio = self.tts_cache.get(text, speech_format.variant)
+                if audio:
+                    print(f"TTS cache hit: {text}")
+                    return audio
+
             print(f"Converting text to speech: {text}")
             
-            # 使用cosyvoice-v1模型生成语音
-            audio = self.synthesizer.call(text)
-            print(f"[Metric] requestId: {self.synthesizer.get_last_request_id()}, "
-                  f"first package delay ms: {self.synthesizer.get_first_package_delay()}")
-            
-            # 保存音频文件
-            with open(output_path, 'wb') as f:
-                f.write(audio)
-            print(f"Speech file saved to: {output_path}")
-            return True
+            # 使用cosyvoice-v1模型合成PCM，配置了TTS_HEDGE_DELAY时慢请求会再发一次
+            pcm = get_policy('tts').hedged(self._synthesize, text)
+            if not pcm:
+                return None
+            audio = speech_format.encode(pcm, title=text)
+            if self.tts_cache is not None:
+                self.tts_cache.put(text, audio, speech_format.variant)
+            return audio
                 
         except Exception as e:
             print(f"Error in text_to_speech: {str(e)}")
             print(f"Full error details: {str(e.__class__.__name__)}: {str(e)}")
+            return None
+
+    def _synthesize(self, text):
+        with self.clients.synthesizer() as synthesizer:
+            audio = synthesizer.call(text)
+            _record_first_package(synthesizer)
+        return audio
+
+    def synthesize_and_upload(self, text):
+        """文本转语音并在后台上传，返回(URL, Future)；合成失败时返回(None, None)
+
+        同样的文本上传过一次后直接返回已有的URL，不再合成和上传
+        """
+        if self.tts_cache is not None:
+            url = self.tts_cache.get_url(text, get_speech_format().variant)
+            if url:
+                print(f"TTS cache hit (uploaded): {url}")
+                done = Future()
+                done.set_result(url)
+                return url, done
+
+        audio = self.synthesize(text)
+        if not audio:
+            return None, None
+        return self.upload_speech(text, audio, cached=True)
+
+    def upload_speech(self, text, audio, cached=False):
+        """后台上传text合成出的音频（Config.TTS_FORMAT），返回(URL, Future)；上传过的文本直接返回已有URL
+
+        cached: 音频已由synthesize放入缓存，不再重复放入（第二次放入会被当作重复出现的语句写入磁盘）
+        """
+        speech_format = get_speech_format()
+        if self.tts_cache is None:
+            return self.upload_bytes_async(audio, speech_format.extension)
+
+        url = self.tts_cache.get_url(text, speech_format.variant)
+        if url:
+            done = Future()
+            done.set_result(url)
+            return url, done
+
+        if not cached:
+            self.tts_cache.put(text, audio, speech_format.variant)
+        url, upload = self.upload_bytes_async(audio, speech_format.extension)
+
+        def remember(future):
+            if future.exception() is None:
+                self.tts_cache.put_url(text, url, speech_format.variant)
+        upload.add_done_callback(remember)
+        return url, upload
+
+    def text_to_speech(self, text, output_path):
+        """文本转语音并保存到文件，扩展名应与Config.TTS_FORMAT一致（见get_speech_format().extension）"""
+        audio = self.synthesize(text)
+        if not audio:
             return False
+        with open(output_path, 'wb') as f:
+            f.write(audio)
+        print(f"Speech file saved to: {output_path}")
+        return True
 
-    def chat_with_ai(self, user_input):
-        """与AI模型对话"""
+    def chat_with_ai(self, user_input, messages=None):
+        """与AI模型对话，messages为包含上下文的完整消息列表（可选）"""
         try:
+            if self.reply_cache is not None:
+                cached = self.reply_cache.get(user_input, messages)
+                if cached:
+                    print(f"AI response (cached): {cached}")
+                    return cached
+
             print(f"Sending message to AI: {user_input}")
-            response = dashscope.Generation.call(
+            start = time.perf_counter()
+            response = get_policy('llm').call(
+                _generate,
                 model='qwen-plus',
-                messages=[
-                    {'role': 'system', 'content': '你是一个专业的面试官，请用专业、友好的语气进行面试。'},
+                messages=messages or [
+                    {'role': 'system', 'content': SYSTEM_PROMPT},
                     {'role': 'user', 'content': user_input}
                 ]
             )
@@ -213,6 +244,8 @@ class AudioProcessor:
             if response.status_code == HTTPStatus.OK:
                 result = response.output.text
                 print(f"AI response: {result}")
+                if self.reply_cache is not None:
+                    self.reply_cache.put(user_input, result, messages, time.perf_counter() - start)
                 return result
             
             print(f"Chat failed with status: {response.status_code}")
@@ -220,4 +253,145 @@ class AudioProcessor:
             return "抱歉，我现在无法回答您的问题。"
         except Exception as e:
             print(f"Error in chat_with_ai: {str(e)}")
-            return "抱歉，系统出现了问题。" 
\ No newline at end of file
+            return "抱歉，系统出现了问题。" 
+
+    def chat_and_speak(self, user_input, messages=None, on_audio=None):
+        """流式对话并逐句合成语音，返回(回复文本, 编码后的完整音频)；失败时返回(None, None)
+
+        on_audio(data)：编码出的音频按顺序到达时调用（可选），依次拼接即为完整文件，
+        可用来边合成边写文件或推送给客户端
+        """
+        encoder = SpeechEncoder(on_data=on_audio)
+        start = time.perf_counter()
+
+        def collect(pcm):
+            if not encoder.samples:
+                FIRST_AUDIO.observe(time.perf_counter() - start)
+            encoder.feed(pcm)
+
+        try:
+            reply = speak_reply(self.stream_chat(user_input, messages), self.stream_speech, collect)
+            print(f"AI response: {reply}")
+            return reply, encoder.close()
+        except Exception as e:
+            print(f"Error in chat_and_speak: {str(e)}")
+            print(f"Full error details: {str(e.__class__.__name__)}: {str(e)}")
+            return None, None
+
+    def summarize(self, summary, turns):
+        """把移出上下文窗口的轮次合并进已有摘要"""
+        dialogue = '\n'.join(f"候选人：{user_text}\n面试官：{ai_text}" for user_text, ai_text in turns)
+        response = get_policy('llm').call(
+            _generate,
+            model='qwen-plus',
+            messages=[
+                {'role': 'system', 'content': '你负责整理面试记录。请把已有摘要和新增对话合并成一段简洁的要点摘要，'
+                                              f'保留候选人的背景、回答要点和面试官已问过的问题，不超过{Config.SESSION_SUMMARY_TOKENS}字。'},
+                {'role': 'user', 'content': f"已有摘要：{summary or '无'}\n新增对话：\n{dialogue}"}
+            ]
+        )
+        if response.status_code != HTTPStatus.OK:
+            raise RuntimeError(f"Summarize failed with status {response.status_code}: {response.message}")
+        return response.output.text
+
+    def open_recognizer(self, sample_rate=Config.AUDIO_SAMPLE_RATE, on_partial=None):
+        """开始一次实时语音识别（PCM16单声道）"""
+        from realtime import StreamingRecognizer
+        return StreamingRecognizer(sample_rate, on_partial)
+
+    def recognize_pcm(self, pcm, sample_rate=Config.AUDIO_SAMPLE_RATE):
+        """直接识别内存中的PCM16音频，不需要先上传OSS"""
+        try:
+            text = get_policy('asr_realtime').call(self._recognize, pcm, sample_rate)
+            print(f"Direct recognition result: {text}")
+            return text
+        except Exception as e:
+            print(f"Error in recognize_pcm: {str(e)}")
+            return None
+
+    def _recognize(self, pcm, sample_rate):
+        recognizer = self.open_recognizer(sample_rate)
+        try:
+            frame = sample_rate * 2 // 5  # 每次发送200ms
+            for offset in range(0, len(pcm), frame):
+                recognizer.feed(pcm[offset:offset + frame])
+            return recognizer.finish()
+        finally:
+            # 出错或超时被放弃时结束识别会话；已经finish过时close什么也不做
+            recognizer.close()
+
+    def stream_chat(self, user_input, messages=None):
+        """与AI模型对话（流式），逐段产出增量文本；回复缓存命中时一次产出完整回复"""
+        if self.reply_cache is not None:
+            cached = self.reply_cache.get(user_input, messages)
+            if cached:
+                print(f"AI response (cached): {cached}")
+                yield cached
+                return
+
+        print(f"Streaming message to AI: {user_input}")
+        start = time.perf_counter()
+        parts = []
+        # 第一段文本到达之前失败会重试，之后的失败直接抛出
+        deltas = get_policy('llm').stream(
+            _stream_generate,
+            model='qwen-plus',
+            messages=messages or [
+                {'role': 'system', 'content': SYSTEM_PROMPT},
+                {'role': 'user', 'content': user_input}
+            ]
+        )
+        for text in deltas:
+            parts.append(text)
+            yield text
+        if self.reply_cache is not None:
+            self.reply_cache.put(user_input, ''.join(parts), messages, time.perf_counter() - start)
+
+    def stream_speech(self, text, on_data):
+        """文本转语音（流式），PCM16单声道分片（采样率Config.TTS_SAMPLE_RATE）到达时调用on_data"""
+        variant = get_speech_format().pcm_variant
+        if self.tts_cache is not None:
+            audio = self.tts_cache.get(text, variant)
+            if audio:
+                on_data(audio)
+                return
+
+        chunks = []
+
+        def collect(data):
+            chunks.append(data)
+            on_data(data)
+
+        get_policy('tts').hedged_stream(self._stream_synthesize, collect, text)
+        if self.tts_cache is not None:
+            self.tts_cache.put(text, b''.join(chunks), variant)
+
+    def _stream_synthesize(self, on_data, text):
+        from realtime import AudioDataCallback
+        with self.clients.synthesizer(callback=AudioDataCallback(on_data)) as synthesizer:
+            synthesizer.call(text)
+            _record_first_package(synthesizer)
+
+
+def _generate(**kwargs):
+    """调用qwen，可重试的错误状态抛出UpstreamError"""
+    return check_status(get_dashscope().Generation.call(**kwargs))
+
+
+def _stream_generate(**kwargs):
+    """流式调用qwen，逐段产出增量文本"""
+    responses = get_dashscope().Generation.call(stream=True, incremental_output=True, **kwargs)
+    for response in responses:
+        check_status(response)
+        if response.status_code != HTTPStatus.OK:
+            raise RuntimeError(f"Chat failed with status {response.status_code}: {response.message}")
+        if response.output and response.output.text:
+            yield response.output.text
+
+
+def _record_first_package(synthesizer):
+    """记录语音合成的首包时延"""
+    delay = synthesizer.get_first_package_delay()
+    if delay is not None and delay >= 0:
+        TTS_FIRST_PACKAGE.observe(delay / 1000)
+    log_event('tts', tts_request_id=synthesizer.get_last_request_id(), first_package_ms=delay)
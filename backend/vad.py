@@ -0,0 +1,140 @@
+"""基于帧能量和过零率的语音活动检测（VAD）
+
+按20ms分帧，计算每帧能量（dB）和过零率：
+    能量阈值 = 背景噪声（低分位能量）+ 余量，且不低于绝对下限、不高于峰值附近；
+    峰值比背景噪声高不出余量时整段视为没有语音；
+    能量略低于阈值但过零率高的帧（擦音、气音，如s/sh/f）也算语音；
+再做平滑：间隔小于hangover的语音段合并，过短的段丢弃，每段前后留少量余量。
+据此可以去掉首尾静音、压缩回答中间过长的停顿、在停顿处切分长回答，
+并在上传和识别之前拒绝没有语音的录音。
+"""
+import numpy as np
+from config import Config
+
+
+class VADResult:
+    """检测结果：语音段列表[(起始样本, 结束样本)]"""
+
+    def __init__(self, segments, sample_rate, threshold_db):
+        self.segments = segments
+        self.sample_rate = sample_rate
+        self.threshold_db = threshold_db
+
+    @property
+    def speech_duration(self):
+        return sum(end - start for start, end in self.segments) / float(self.sample_rate)
+
+    @property
+    def has_speech(self):
+        return bool(self.segments)
+
+
+def frame_features(samples, sample_rate, frame_ms=Config.VAD_FRAME_MS):
+    """返回(每帧能量dB, 每帧过零率, 帧长)"""
+    frame = max(1, sample_rate * frame_ms // 1000)
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(0), np.zeros(0), frame
+    frames = samples[:count * frame].reshape(count, frame)
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-12)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(frame - 1 or 1)
+    return energy_db, zcr, frame
+
+
+def _runs(mask):
+    """布尔数组中连续True的区间[(起, 止)]"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def _frames(ms, frame_ms):
+    return max(1, int(round(ms / float(frame_ms))))
+
+
+def detect(samples, sample_rate,
+           min_db=Config.AUDIO_SILENCE_THRESHOLD_DB,
+           margin_db=Config.VAD_MARGIN_DB,
+           zcr_threshold=Config.VAD_ZCR_THRESHOLD,
+           min_speech_ms=Config.VAD_MIN_SPEECH_MS,
+           hangover_ms=Config.VAD_HANGOVER_MS,
+           pad_ms=Config.VAD_PAD_MS,
+           frame_ms=Config.VAD_FRAME_MS):
+    """检测单声道float32音频中的语音段"""
+    energy_db, zcr, frame = frame_features(samples, sample_rate, frame_ms)
+    if len(energy_db) == 0:
+        return VADResult([], sample_rate, min_db)
+
+    noise_floor = np.percentile(energy_db, 10)
+    peak = np.percentile(energy_db, 95)
+    if peak - noise_floor < margin_db:
+        # 能量几乎没有起伏：整段都是静音或稳定的背景噪声
+        return VADResult([], sample_rate, float(peak))
+    # 整段都是语音时噪声估计偏高，阈值不超过峰值以下20dB
+    threshold = max(min_db, min(noise_floor + margin_db, peak - 20))
+    voiced = energy_db > threshold
+    fricative = (energy_db > threshold - 6) & (zcr > zcr_threshold) & (energy_db > min_db)
+    mask = voiced | fricative
+
+    hangover = _frames(hangover_ms, frame_ms)
+    min_speech = _frames(min_speech_ms, frame_ms)
+    pad = _frames(pad_ms, frame_ms)
+
+    merged = []
+    for start, end in _runs(mask):
+        if merged and start - merged[-1][1] < hangover:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    # 只有过零率条件成立的段（无浊音）多半是噪声
+    segments = []
+    for start, end in merged:
+        if end - start < min_speech or not voiced[start:end].any():
+            continue
+        start = max(0, start - pad)
+        end = min(len(energy_db), end + pad)
+        if segments and start <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    total = len(samples)
+    return VADResult([(start * frame, min(total, end * frame)) for start, end in segments],
+                     sample_rate, float(threshold))
+
+
+def compact(samples, result, max_pause_ms=Config.VAD_MAX_PAUSE_MS):
+    """去掉首尾静音，并把语音段之间超过max_pause_ms的停顿缩短为max_pause_ms"""
+    if not result.segments:
+        return samples[:0]
+    max_pause = result.sample_rate * max_pause_ms // 1000
+    pieces = []
+    for i, (start, end) in enumerate(result.segments):
+        if i:
+            gap_start = result.segments[i - 1][1]
+            gap = start - gap_start
+            if gap > max_pause:
+                # 保留停顿两端各一半，过渡更自然
+                half = max_pause // 2
+                pieces.append(samples[gap_start:gap_start + half])
+                pieces.append(samples[start - (max_pause - half):start])
+            else:
+                pieces.append(samples[gap_start:start])
+        pieces.append(samples[start:end])
+    return np.concatenate(pieces)
+
+
+def split(samples, result, max_seconds=Config.VAD_SPLIT_SECONDS):
+    """在停顿处把长音频切成不超过max_seconds的片段，找不到停顿时按上限硬切"""
+    limit = int(max_seconds * result.sample_rate)
+    # 可切分的位置：相邻语音段之间停顿的中点
+    cuts = [(end + start) // 2 for (_, end), (start, _) in zip(result.segments, result.segments[1:])]
+    chunks = []
+    chunk_start = 0
+    while len(samples) - chunk_start > limit:
+        candidates = [cut for cut in cuts if chunk_start < cut <= chunk_start + limit]
+        cut = candidates[-1] if candidates else chunk_start + limit
+        chunks.append(samples[chunk_start:cut])
+        chunk_start = cut
+    chunks.append(samples[chunk_start:])
+    return chunks
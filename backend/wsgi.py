@@ -0,0 +1,14 @@
+"""生产环境入口：用waitress提供/api/*服务
+
+任务队列、会话缓存和各客户端池都在进程内，因此使用单个进程、多个请求线程；需要扩容时增加实例。
+在backend目录下运行：python wsgi.py
+或：waitress-serve --host 0.0.0.0 --port 5000 --threads 32 wsgi:app
+"""
+from waitress import serve
+from app import app, startup
+from config import Config
+
+startup()
+
+if __name__ == '__main__':
+    serve(app, host=Config.SERVER_HOST, port=Config.SERVER_PORT, threads=Config.SERVER_THREADS)